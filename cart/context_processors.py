@@ -0,0 +1,15 @@
+# cart/context_processors.py
+from vendors.resolver import vendor_for_slug
+from .utils import cart_count as _cart_count
+
+
+def cart_count(request):
+    """Navbar cart badge for the store being viewed (subdomain or /<slug>/ path)."""
+    vendor = getattr(request, 'vendor', None)
+    if vendor is None:
+        match = getattr(request, 'resolver_match', None)
+        slug = match.kwargs.get('vendor_slug') if match else None
+        vendor = vendor_for_slug(slug) if slug else None
+    if vendor is None or not hasattr(request, 'session'):
+        return {}
+    return {'cart_count': _cart_count(request, vendor)}
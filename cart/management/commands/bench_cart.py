@@ -0,0 +1,242 @@
+# cart/management/commands/bench_cart.py
+"""
+Compare the cart AJAX endpoints under the WSGI and ASGI entry points.
+
+Both ``config.wsgi.application`` and ``config.asgi.application`` are driven
+in-process with the same load: ``--clients`` shoppers, each with its own
+session and CSRF cookie, firing ``--requests`` requests one after another.
+WSGI shoppers each get a thread, like a threaded server. ASGI shoppers
+are coroutines on one event loop. The numbers leave out the HTTP server
+and the network, so they compare the Django side of the two deployments.
+
+``--endpoint add`` writes carts to the configured database. The carts and
+sessions the benchmark creates are deleted afterwards.
+"""
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from cart.models import Cart
+from products.models import Product
+
+
+class Shopper:
+    """One benchmark client: its cookies and the request it keeps sending."""
+
+    def __init__(self, host, method, path, body=b''):
+        self.host = host
+        self.method = method
+        self.path = path
+        self.body = body
+        self.csrf_token = get_random_string(32)
+        self.cookies = {settings.CSRF_COOKIE_NAME: self.csrf_token}
+
+    def headers(self):
+        return {
+            'Host': self.host,
+            'Cookie': '; '.join(f'{k}={v}' for k, v in self.cookies.items()),
+            'X-Requested-With': 'XMLHttpRequest',
+            'X-CSRFToken': self.csrf_token,
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Content-Length': str(len(self.body)),
+        }
+
+    def remember(self, set_cookie_headers):
+        for header in set_cookie_headers:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+
+    # -------- WSGI --------
+    def wsgi_request(self, application):
+        path, _, query = self.path.partition('?')
+        environ = {
+            'REQUEST_METHOD': self.method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(self.body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in self.headers().items():
+            key = name.upper().replace('-', '_')
+            environ[key if key in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{key}'] = value
+
+        status = []
+
+        def start_response(line, headers, exc_info=None):
+            status.append(int(line.split()[0]))
+            self.remember(value for name, value in headers if name.lower() == 'set-cookie')
+
+        result = application(environ, start_response)
+        try:
+            for _ in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status[0]
+
+    # -------- ASGI --------
+    async def asgi_request(self, application):
+        path, _, query = self.path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': self.method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(k.lower().encode(), v.encode()) for k, v in self.headers().items()],
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+        }
+        sent_body = False
+        disconnect = asyncio.Event()
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {'type': 'http.request', 'body': self.body, 'more_body': False}
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        status = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+                self.remember(
+                    value.decode() for name, value in message['headers'] if name.lower() == b'set-cookie'
+                )
+
+        await application(scope, receive, send)
+        disconnect.set()
+        return status[0]
+
+
+def delete_sessions(shoppers):
+    """Delete the sessions and anonymous carts the shoppers created."""
+    session_keys = [
+        s.cookies[settings.SESSION_COOKIE_NAME] for s in shoppers
+        if settings.SESSION_COOKIE_NAME in s.cookies
+    ]
+    Cart.objects.filter(session_key__in=session_keys).delete()
+    Session.objects.filter(session_key__in=session_keys).delete()
+
+
+def summarize(label, latencies, errors, wall):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    p50 = latencies[count // 2] * 1000
+    p99 = latencies[min(count - 1, int(count * 0.99))] * 1000
+    return (
+        f"{label:<5} {count:>6} req  {count / wall:>8.1f} req/s  "
+        f"p50 {p50:>7.2f}ms  p99 {p99:>7.2f}ms  errors {errors}"
+    )
+
+
+class Command(BaseCommand):
+    help = "Benchmark the cart AJAX endpoints under WSGI vs ASGI (requests/sec and p99)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', help="Vendor slug (default: first vendor with an active product).")
+        parser.add_argument('--endpoint', choices=['count', 'add'], default='count')
+        parser.add_argument('--clients', type=int, default=32, help="Concurrent shoppers.")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per shopper.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.filter(is_active=True).select_related('vendor')
+        if options['vendor']:
+            products = products.filter(vendor__slug=options['vendor'])
+        product = products.first()
+        if product is None:
+            raise CommandError("No vendor with an active product to benchmark against.")
+        vendor = product.vendor
+
+        if options['endpoint'] == 'count':
+            method, path = 'GET', reverse('cart:cart_count_api', args=[vendor.slug])
+        else:
+            method, path = 'POST', reverse('cart:add_to_cart', args=[vendor.slug, product.id])
+        host = f"{vendor.slug}.{settings.VENDOR_BASE_DOMAINS[0]}"
+        self.stdout.write(
+            f"{method} {path} on {host}: {options['clients']} clients x {options['requests']} requests"
+        )
+
+        shoppers = []
+        try:
+            for label, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                batch = [Shopper(host, method, path) for _ in range(options['clients'])]
+                shoppers += batch
+                self.stdout.write(summarize(label, *run(batch, options['requests'])))
+        finally:
+            self.cleanup(shoppers)
+
+    def run_wsgi(self, shoppers, requests):
+        from config.wsgi import application
+
+        def client(shopper):
+            latencies, errors = [], 0
+            for _ in range(requests):
+                started = time.perf_counter()
+                status = shopper.wsgi_request(application)
+                latencies.append(time.perf_counter() - started)
+                errors += status >= 400
+            return latencies, errors
+
+        for shopper in shoppers:  # warm-up: creates each session
+            shopper.wsgi_request(application)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(shoppers)) as pool:
+            results = list(pool.map(client, shoppers))
+        return self.merge(results, time.perf_counter() - started)
+
+    def run_asgi(self, shoppers, requests):
+        from config.asgi import application
+
+        async def client(shopper):
+            latencies, errors = [], 0
+            for _ in range(requests):
+                started = time.perf_counter()
+                status = await shopper.asgi_request(application)
+                latencies.append(time.perf_counter() - started)
+                errors += status >= 400
+            return latencies, errors
+
+        async def main():
+            for shopper in shoppers:
+                await shopper.asgi_request(application)
+            started = time.perf_counter()
+            results = await asyncio.gather(*(client(shopper) for shopper in shoppers))
+            return results, time.perf_counter() - started
+
+        return self.merge(*asyncio.run(main()))
+
+    @staticmethod
+    def merge(results, wall):
+        latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+        return latencies, sum(errors for _, errors in results), wall
+
+    def cleanup(self, shoppers):
+        delete_sessions(shoppers)
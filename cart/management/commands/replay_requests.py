@@ -0,0 +1,296 @@
+# cart/management/commands/replay_requests.py
+"""
+Replay a JSONL request log against the app and measure every URL.
+
+Each line of the log is one request::
+
+    {"session": "s1", "vendor": "ada-styles", "path": "/ada-styles/"}
+    {"session": "s1", "vendor": "ada-styles", "method": "POST", "path": "/cart/ada-styles/add/12/", "ajax": true}
+    {"session": "s1", "vendor": "ada-styles", "method": "POST", "path": "/ada-styles/checkout/process/",
+     "data": {"name": "Ada", "phone": "08030000000", "address": "Lagos"}}
+
+- ``path`` (required) may carry a query string.
+- ``method`` defaults to GET.
+- The Host header comes from one of:
+  - ``host``, sent as given (custom domains);
+  - ``vendor``, sent as ``<slug>.<VENDOR_BASE_DOMAINS[0]>``;
+  - neither, which sends the main domain.
+- Requests with the same ``session`` are one visitor. They replay in log
+  order on one client, which keeps its session and CSRF cookies. A line
+  without a session is a visitor of its own.
+- ``data`` is sent as a form body and ``json`` as a JSON body.
+- ``ajax`` adds X-Requested-With.
+- ``headers`` adds any other headers.
+
+Lines without a ``path`` are skipped and counted.
+
+Visitors are shared out to ``--concurrency`` threads. The threads drive
+``config.wsgi.application`` in-process, as bench_cart's WSGI mode does.
+For every request the command records:
+
+- its URL name (the resolved ``namespace:name``);
+- the status;
+- the latency;
+- the SQL queries run for it.
+
+The per-URL-name throughput, p50/p95/p99 and query counts are printed.
+``--output`` writes them as JSON with sorted keys, one entry per URL name,
+so two runs can be diffed. ``--baseline`` prints the change against an
+earlier results file.
+
+The requests are real: a replayed checkout places an order and reserves
+stock. Replay against a scratch copy of the database. The sessions and
+anonymous carts the run creates are deleted afterwards.
+"""
+import hashlib
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import Resolver404, resolve
+
+from .bench_cart import Shopper, delete_sessions
+
+UNRESOLVED = '(unresolved)'
+
+
+class Visitor(Shopper):
+    """A replayed client: one log session's cookies, sent with each entry."""
+
+    def __init__(self):
+        super().__init__(settings.VENDOR_BASE_DOMAINS[0], 'GET', '/')
+        self.ajax = False
+        self.content_type = 'application/x-www-form-urlencoded'
+        self.extra_headers = {}
+
+    def load(self, entry):
+        self.method = entry.get('method', 'GET').upper()
+        self.path = entry['path']
+        if entry.get('host'):
+            self.host = entry['host']
+        elif entry.get('vendor'):
+            self.host = f"{entry['vendor']}.{settings.VENDOR_BASE_DOMAINS[0]}"
+        else:
+            self.host = settings.VENDOR_BASE_DOMAINS[0]
+        if 'json' in entry:
+            self.body = json.dumps(entry['json']).encode()
+            self.content_type = 'application/json'
+        else:
+            self.body = urlencode(entry.get('data') or {}, doseq=True).encode()
+            self.content_type = 'application/x-www-form-urlencoded'
+        self.ajax = bool(entry.get('ajax'))
+        self.extra_headers = entry.get('headers') or {}
+
+    def headers(self):
+        headers = super().headers()
+        if not self.ajax:
+            del headers['X-Requested-With']
+        headers['Content-Type'] = self.content_type
+        headers.update(self.extra_headers)
+        return headers
+
+
+class QueryCounter:
+    """``connection.execute_wrapper`` that counts the statements it sees."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+# ----------------------------------------------------------------------
+# Log and results
+# ----------------------------------------------------------------------
+def load_log(path):
+    """``(visitors, skipped)``: each visitor's entries in log order."""
+    visitors, skipped = {}, 0
+    with open(path, encoding='utf-8') as log:
+        for number, line in enumerate(log, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as exc:
+                raise CommandError(f"{path}:{number}: invalid JSON: {exc}")
+            if not isinstance(entry, dict) or not entry.get('path'):
+                skipped += 1
+                continue
+            key = entry.get('session') or f'line-{number}'
+            visitors.setdefault(key, []).append(entry)
+    return list(visitors.values()), skipped
+
+
+def url_name(path, cache={}):
+    path = path.partition('?')[0]
+    if path not in cache:
+        try:
+            cache[path] = resolve(path).view_name
+        except Resolver404:
+            cache[path] = UNRESOLVED
+    return cache[path]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted ``values``."""
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def stats(records, wall):
+    latencies = sorted(latency for _, _, latency, _ in records)
+    queries = sorted(count for _, _, _, count in records)
+    statuses = {}
+    for _, status, _, _ in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(records),
+        'errors': sum(status >= 500 for _, status, _, _ in records),
+        'statuses': statuses,
+        'throughput_rps': round(len(records) / wall, 2),
+        'latency_ms': {
+            'mean': round(sum(latencies) * 1000 / len(latencies), 3),
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p95': round(percentile(latencies, 95) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3),
+        },
+        'queries': {
+            'total': sum(queries),
+            'mean': round(sum(queries) / len(queries), 2),
+            'p95': percentile(queries, 95),
+            'max': queries[-1],
+        },
+    }
+
+
+def _change(new, old):
+    if not old:
+        return '    n/a'
+    return f"{(new - old) * 100 / old:+6.1f}%"
+
+
+class Command(BaseCommand):
+    help = "Replay a JSONL request log and report per-URL throughput, latency percentiles and SQL queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help="JSONL request log (see the module docstring for the format).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Visitors replayed at once.")
+        parser.add_argument('--repeat', type=int, default=1, help="Replay the whole log this many times.")
+        parser.add_argument('--warmup', action='store_true',
+                            help="Replay the log once, unmeasured, before the measured run.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Compare against an earlier --output file.")
+
+    def handle(self, *args, **options):
+        from config.wsgi import application
+
+        scripts, skipped = load_log(options['log'])
+        if not scripts:
+            raise CommandError(f"No replayable requests in {options['log']} ({skipped} lines without a path).")
+        if settings.DEBUG:
+            self.stderr.write("DEBUG is on: latencies include query logging and debug overhead.")
+        concurrency = max(1, options['concurrency'])
+
+        visitors = []
+        try:
+            if options['warmup']:
+                for script in scripts:
+                    visitors.append(Visitor())
+                    self.play(application, visitors[-1], script)
+
+            work = [(Visitor(), script) for _ in range(options['repeat']) for script in scripts]
+            visitors += [visitor for visitor, _ in work]
+            started = time.perf_counter()
+            if concurrency == 1:
+                results = [self.play(application, visitor, script) for visitor, script in work]
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    results = list(pool.map(lambda job: self.play(application, *job), work))
+            wall = time.perf_counter() - started
+        finally:
+            delete_sessions(visitors)
+
+        records = [record for visitor_records in results for record in visitor_records]
+        by_name = {}
+        for record in records:
+            by_name.setdefault(record[0], []).append(record)
+        with open(options['log'], 'rb') as log:
+            digest = hashlib.sha256(log.read()).hexdigest()
+        report = {
+            'run': {
+                'log': options['log'],
+                'log_sha256': digest,
+                'visitors': len(work),
+                'skipped_lines': skipped,
+                'concurrency': concurrency,
+                'repeat': options['repeat'],
+                'warmup': options['warmup'],
+                'wall_seconds': round(wall, 3),
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+                'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            },
+            'total': stats(records, wall),
+            'urls': {name: stats(name_records, wall) for name, name_records in by_name.items()},
+        }
+
+        self.print_report(report)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline:
+                self.print_comparison(report, json.load(baseline))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+                output.write('\n')
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def play(self, application, visitor, script):
+        """Replay one visitor's entries in order; ``[(url name, status, seconds, queries)]``."""
+        records = []
+        for entry in script:
+            visitor.load(entry)
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                status = visitor.wsgi_request(application)
+                elapsed = time.perf_counter() - started
+            records.append((url_name(visitor.path), status, elapsed, counter.count))
+        return records
+
+    def print_report(self, report):
+        run, total = report['run'], report['total']
+        self.stdout.write(
+            f"{total['requests']} requests from {run['visitors']} visitors in {run['wall_seconds']:.2f}s "
+            f"({total['throughput_rps']:.1f} req/s, concurrency {run['concurrency']})"
+        )
+        rows = sorted(report['urls'].items(), key=lambda item: -item[1]['requests'])
+        for name, row in rows + [('TOTAL', total)]:
+            latency, queries = row['latency_ms'], row['queries']
+            self.stdout.write(
+                f"{name:<34} {row['requests']:>6} {row['throughput_rps']:>8.1f}/s  "
+                f"p50 {latency['p50']:>7.2f}  p95 {latency['p95']:>7.2f}  p99 {latency['p99']:>7.2f}ms  "
+                f"queries {queries['mean']:>5.1f} (max {queries['max']})  errors {row['errors']}"
+            )
+
+    def print_comparison(self, report, baseline):
+        self.stdout.write("Change against the baseline (throughput, p95, mean queries):")
+        names = sorted(set(report['urls']) | set(baseline.get('urls', {})))
+        for name in names + ['TOTAL']:
+            new = report['total'] if name == 'TOTAL' else report['urls'].get(name)
+            old = baseline.get('total') if name == 'TOTAL' else baseline['urls'].get(name)
+            if new is None or old is None:
+                self.stdout.write(f"{name:<34} {'only in baseline' if new is None else 'new'}")
+                continue
+            self.stdout.write(
+                f"{name:<34} rps {_change(new['throughput_rps'], old['throughput_rps'])}  "
+                f"p95 {_change(new['latency_ms']['p95'], old['latency_ms']['p95'])}  "
+                f"queries {old['queries']['mean']:.1f} -> {new['queries']['mean']:.1f}"
+            )
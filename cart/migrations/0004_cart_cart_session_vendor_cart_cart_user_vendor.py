@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_alter_cart_created_at'),
+        ('vendors', '0004_vendordomain'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['session_key', 'vendor'], name='cart_session_vendor'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', 'vendor'], name='cart_user_vendor'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:26
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+    line_total = ExpressionWrapper(
+        F('product__price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    totals = (
+        CartItem.objects.values('cart_id')
+        .annotate(item_count=Sum('quantity'), total=Sum(line_total))
+    )
+    carts = []
+    for row in totals:
+        carts.append(Cart(id=row['cart_id'], item_count=row['item_count'], total=row['total']))
+    Cart.objects.bulk_update(carts, ['item_count', 'total'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0004_cart_cart_session_vendor_cart_cart_user_vendor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
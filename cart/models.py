@@ -1,18 +1,140 @@
 # cart/models.py
-from django.db import models
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from vendors.models import Vendor
 from products.models import Product
 from django.utils import timezone
 
+
+class CartSummary:
+    """Cart lines with their products, loaded in a single query."""
+
+    def __init__(self, cart, items):
+        self.cart = cart
+        self.items = items
+        self.item_count = sum(item.quantity for item in items)
+        self.total = sum((item.subtotal() for item in items), Decimal('0'))
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class CartQuerySet(models.QuerySet):
+
+    def refresh_totals(self):
+        """
+        Recompute item_count and total from the carts' lines at current
+        prices, in one UPDATE. cart.signals calls this when a Product is
+        saved or deleted. Writes that skip signals (``QuerySet.update`` of
+        ``price``, ``bulk_create``/``bulk_update``, raw SQL) must call it for
+        the carts they touch; products.bulk does for imports.
+        """
+        lines = CartItem.objects.filter(cart=OuterRef('pk')).values('cart')
+        money = DecimalField(max_digits=12, decimal_places=2)
+        count = lines.annotate(count=Sum('quantity')).values('count')
+        total = lines.annotate(total=Sum(F('quantity') * F('product__price'), output_field=money)).values('total')
+        return self.update(
+            item_count=Coalesce(Subquery(count), 0),
+            total=Coalesce(Subquery(total), Value(Decimal('0')), output_field=money),
+        )
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
     session_key = models.CharField(max_length=100, null=True, blank=True)
     vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
     created_at = models.DateTimeField(default=timezone.now)
 
+    # Denormalized from the cart's items so the navbar count and AJAX
+    # responses never have to load them. Maintained by the mutation
+    # methods below, and by cart.signals when a product in the cart is
+    # repriced or deleted; summary() re-syncs them as a backstop.
+    item_count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        # _get_cart / checkout look a cart up by (session_key|user, vendor)
+        indexes = [
+            models.Index(fields=['session_key', 'vendor'], name='cart_session_vendor'),
+            models.Index(fields=['user', 'vendor'], name='cart_user_vendor'),
+        ]
+
     def total_price(self):
-        return sum(item.subtotal() for item in self.items.all())
+        return self.total
+
+    # -------- totals --------
+    def _adjust_totals(self, quantity, amount):
+        Cart.objects.filter(pk=self.pk).update(
+            item_count=F('item_count') + quantity,
+            total=F('total') + amount,
+        )
+        self.item_count += quantity
+        self.total += amount
+
+    def summary(self):
+        summary = CartSummary(self, list(self.items.select_related('product').order_by('id')))
+        if (summary.item_count, summary.total) != (self.item_count, self.total):
+            Cart.objects.filter(pk=self.pk).update(item_count=summary.item_count, total=summary.total)
+            self.item_count, self.total = summary.item_count, summary.total
+        return summary
+
+    # -------- mutations --------
+    @transaction.atomic
+    def add_product(self, product, quantity=1):
+        item, created = CartItem.objects.get_or_create(
+            cart=self, product=product, defaults={'quantity': quantity},
+        )
+        if not created:
+            CartItem.objects.filter(pk=item.pk).update(quantity=F('quantity') + quantity)
+            item.quantity += quantity
+        item.product = product
+        self._adjust_totals(quantity, product.price * quantity)
+        return item
+
+    @transaction.atomic
+    def change_quantity(self, item, delta):
+        """Add ``delta`` (may be negative) to a line; returns False if it was removed."""
+        if item.quantity + delta <= 0:
+            self.remove_item(item)
+            return False
+        CartItem.objects.filter(pk=item.pk).update(quantity=F('quantity') + delta)
+        item.quantity += delta
+        self._adjust_totals(delta, item.product.price * delta)
+        return True
+
+    @transaction.atomic
+    def remove_item(self, item):
+        item.delete()
+        self._adjust_totals(-item.quantity, -item.subtotal())
+
+    @transaction.atomic
+    def clear(self):
+        self.items.all().delete()
+        Cart.objects.filter(pk=self.pk).update(item_count=0, total=0)
+        self.item_count, self.total = 0, Decimal('0')
+
+    # -------- async mutations --------
+    # Each mutation is a short transaction, which the async ORM can't
+    # express yet; like Django's own a* methods, run it in a worker thread.
+    async def aadd_product(self, product, quantity=1):
+        return await sync_to_async(self.add_product)(product, quantity)
+
+    async def achange_quantity(self, item, delta):
+        return await sync_to_async(self.change_quantity)(item, delta)
+
+    async def aremove_item(self, item):
+        return await sync_to_async(self.remove_item)(item)
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name="items", on_delete=models.CASCADE)
@@ -20,4 +142,4 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
 
     def subtotal(self):
-        return self.product.price * self.quantity
\ No newline at end of file
+        return self.product.price * self.quantity
@@ -0,0 +1,32 @@
+# cart/signals.py
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from products.models import Product
+from .models import Cart
+
+
+# ----------------------------------------------------------------------
+# Denormalized cart totals (Cart.item_count / Cart.total)
+# ----------------------------------------------------------------------
+@receiver(post_save, sender=Product)
+def reprice_carts(sender, instance, created, update_fields, using, **kwargs):
+    # Only the price moves a total; saves naming other fields are skipped
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    Cart.objects.using(using).filter(items__product=instance).refresh_totals()
+
+
+@receiver(pre_delete, sender=Product)
+def remember_product_carts(sender, instance, using, **kwargs):
+    # The product's cart lines are cascaded away before post_delete runs
+    instance._cart_ids = list(
+        Cart.objects.using(using).filter(items__product=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Product)
+def recount_carts(sender, instance, using, **kwargs):
+    cart_ids = getattr(instance, '_cart_ids', [])
+    if cart_ids:
+        Cart.objects.using(using).filter(pk__in=cart_ids).refresh_totals()
@@ -1,3 +1,229 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import AsyncClient, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from config.testing import QueryBudgetTestCase
+from orders.models import Order
+from products.models import Product
+from vendors.models import Vendor
+from .models import Cart
+from .utils import SESSION_COUNTS_KEY
+
 
 # Create your tests here.
+class AsyncCartEndpointTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        cls.shoe = Product.objects.create(vendor=cls.vendor, name='Shoe', price=10, stock=5)
+
+    def url(self, name, *args):
+        return reverse(f'cart:{name}', args=[self.vendor.slug, *args])
+
+    async def test_cart_round_trip(self):
+        client = AsyncClient()
+        ajax = {'X-Requested-With': 'XMLHttpRequest'}
+
+        data = (await client.post(self.url('add_to_cart', self.shoe.id), headers=ajax)).json()
+        self.assertEqual((data['cart_count'], data['subtotal']), (1, '10.00'))
+        data = (await client.post(self.url('add_to_cart', self.shoe.id), headers=ajax)).json()
+        self.assertEqual(data['cart_count'], 2)
+
+        item = await (await Cart.objects.aget(vendor=self.vendor)).items.aget()
+        data = (await client.post(self.url('update_cart', item.id), {'action': 'decrease'})).json()
+        self.assertEqual((data['quantity'], data['cart_count']), (1, 1))
+
+        self.assertEqual((await client.get(self.url('cart_count_api'))).json(), {'cart_count': 1})
+
+        data = (await client.post(self.url('remove_from_cart', item.id))).json()
+        self.assertEqual((data['cart_count'], data['cart_total']), (0, '0.00'))
+        self.assertEqual((await client.get(self.url('cart_count_api'))).json(), {'cart_count': 0})
+
+    async def test_other_carts_items_are_not_found(self):
+        owner = AsyncClient()
+        await owner.post(self.url('add_to_cart', self.shoe.id))
+        item = await (await Cart.objects.aget(vendor=self.vendor)).items.aget()
+
+        response = await AsyncClient().post(self.url('remove_from_cart', item.id))
+        self.assertEqual(response.status_code, 404)
+
+
+class ReplayRequestsTests(TestCase):
+
+    def setUp(self):
+        self.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        self.shoe = Product.objects.create(vendor=self.vendor, name='Shoe', price=10, stock=5)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        # Like django.test.Client: keep the test transaction's connection open
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    def replay(self, entries, **options):
+        log = os.path.join(self.dir.name, 'log.jsonl')
+        output = os.path.join(self.dir.name, 'results.json')
+        with open(log, 'w') as f:
+            f.writelines(json.dumps(entry) + '\n' for entry in entries)
+        call_command('replay_requests', log, output=output, concurrency=1, stdout=StringIO(), **options)
+        with open(output) as f:
+            return json.load(f)
+
+    def test_checkout_flow_keeps_session_and_csrf(self):
+        slug = self.vendor.slug
+        shopper = {'session': 'a', 'vendor': slug}
+        results = self.replay([
+            {**shopper, 'path': f'/{slug}/?q=sh'},
+            {**shopper, 'method': 'POST', 'path': f'/cart/{slug}/add/{self.shoe.pk}/', 'ajax': True},
+            {**shopper, 'method': 'POST', 'path': f'/{slug}/checkout/process/',
+             'data': {'name': 'Ada', 'phone': '08030000000', 'address': 'Lagos'}},
+            {'path': '/no/such/page/'},
+            {'title': 'not a request'},
+        ])
+
+        # The checkout found the cart the add created, through the session
+        self.assertEqual(Order.objects.get().customer_name, 'Ada')
+        urls = results['urls']
+        self.assertEqual(urls['cart:add_to_cart']['statuses'], {'200': 1})
+        self.assertGreater(urls['cart:add_to_cart']['queries']['total'], 0)
+        self.assertEqual(urls['vendors:process_checkout']['requests'], 1)
+        self.assertEqual(urls['(unresolved)']['statuses'], {'404': 1})
+        self.assertEqual(results['total']['requests'], 4)
+        self.assertEqual(results['run']['skipped_lines'], 1)
+        self.assertEqual(set(results['total']['latency_ms']), {'mean', 'p50', 'p95', 'p99', 'max'})
+        # Replayed sessions and carts are cleaned up
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse(Cart.objects.exists())
+
+
+class CartTotalsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        cls.shoe = Product.objects.create(vendor=cls.vendor, name='Shoe', price=10, stock=5)
+        cls.hat = Product.objects.create(vendor=cls.vendor, name='Hat', price=5, stock=5)
+
+    def url(self, name, *args):
+        return reverse(f'cart:{name}', args=[self.vendor.slug, *args])
+
+    def test_totals_follow_repricing_and_deletion(self):
+        ajax = {'X-Requested-With': 'XMLHttpRequest'}
+        self.client.post(self.url('add_to_cart', self.shoe.id))
+        self.client.post(self.url('add_to_cart', self.hat.id))
+
+        self.shoe.price = 12
+        self.shoe.save()
+        cart = Cart.objects.get(vendor=self.vendor)
+        self.assertEqual((cart.item_count, cart.total), (2, Decimal('17.00')))
+        data = self.client.post(self.url('add_to_cart', self.shoe.id), headers=ajax).json()
+        self.assertEqual((data['cart_count'], data['cart_total']), (3, '29.00'))
+
+        self.hat.delete()
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.total), (2, Decimal('24.00')))
+        # The shopper's session count catches up on their next cart request
+        self.client.get(self.url('view_cart'), HTTP_HOST=f'{self.vendor.slug}.lvh.me')
+        self.assertEqual(self.client.get(self.url('cart_count_api')).json(), {'cart_count': 2})
+
+
+class SessionCartCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        cls.shoe = Product.objects.create(vendor=cls.vendor, name='Shoe', price=10, stock=5)
+        cls.hat = Product.objects.create(vendor=cls.vendor, name='Hat', price=5, stock=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def url(self, name, *args):
+        return reverse(f'cart:{name}', args=[self.vendor.slug, *args])
+
+    def session_count(self):
+        return self.client.session[SESSION_COUNTS_KEY][str(self.vendor.pk)]
+
+    def assertNavbarCount(self, count):
+        """The storefront's badge shows ``count`` without touching the cart tables."""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse('vendors:vendor_store', args=[self.vendor.slug]),
+                HTTP_HOST=f'{self.vendor.slug}.lvh.me',
+            )
+        self.assertContains(response, f'<span id="cart-count" class="ml-1">({count})</span>')
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if 'cart_' in q['sql']], [])
+
+    def test_count_follows_every_cart_write(self):
+        self.client.post(self.url('add_to_cart', self.shoe.id))
+        self.client.post(self.url('add_to_cart', self.shoe.id))
+        self.client.post(self.url('add_to_cart', self.hat.id))
+        self.assertEqual(self.session_count(), 3)
+        self.assertNavbarCount(3)
+
+        cart = Cart.objects.get(vendor=self.vendor)
+        shoes = cart.items.get(product=self.shoe)
+        self.client.post(self.url('update_cart', shoes.id), {'action': 'decrease'})
+        self.assertEqual(self.session_count(), 2)
+        self.assertNavbarCount(2)
+
+        self.client.post(self.url('remove_from_cart', shoes.id))
+        self.assertEqual(self.session_count(), 1)
+        self.assertNavbarCount(1)
+
+    def test_checkout_clears_count(self):
+        for orders, path in enumerate((
+            reverse('vendors:process_checkout', args=[self.vendor.slug]),
+            reverse('checkout'),
+        ), start=1):
+            with self.subTest(path):
+                self.client.post(self.url('add_to_cart', self.shoe.id))
+                self.assertNavbarCount(1)
+                self.client.post(
+                    path, {'name': 'Ada', 'phone': '08030000000', 'address': 'Lagos'},
+                    HTTP_HOST=f'{self.vendor.slug}.lvh.me',
+                )
+                self.assertEqual(Order.objects.count(), orders)
+                self.assertEqual(self.session_count(), 0)
+                self.assertNavbarCount(0)
+
+
+class CartQueryBudgetTests(QueryBudgetTestCase):
+    """Cart pages and endpoints cost the same for 1, 10 or 100 cart lines."""
+
+    def test_cart_pages(self):
+        for name, queries in {'view_cart': 4, 'checkout': 3, 'cart_count_api': 1}.items():
+            with self.subTest(name):
+                self.assertBudget(queries, lambda shop: shop.shopper.get(reverse(f'cart:{name}', args=[shop.vendor.slug])))
+
+    def test_add_to_cart(self):
+        self.assertBudget(11, lambda shop: shop.shopper.post(
+            reverse('cart:add_to_cart', args=[shop.vendor.slug, shop.products[-1].pk]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'))
+
+    def test_update_and_remove(self):
+        self.assertBudget(10, lambda shop: shop.shopper.post(
+            reverse('cart:update_cart', args=[shop.vendor.slug, shop.item.pk]), {'action': 'increase'}))
+        self.assertBudget(10, lambda shop: shop.shopper.post(
+            reverse('cart:remove_from_cart', args=[shop.vendor.slug, shop.item.pk])))
@@ -1,7 +1,77 @@
-
 from .models import Cart
 from django.contrib.auth.models import User
 
+# Per-vendor cart counts cached in the session ({vendor_id: item_count}),
+# written through by every cart mutation so the navbar badge and the
+# cart-count endpoint don't need to query the cart tables.
+SESSION_COUNTS_KEY = 'cart_counts'
+
+
+def remember_cart(request, cart):
+    counts = request.session.get(SESSION_COUNTS_KEY, {})
+    vendor_key = str(cart.vendor_id)
+    if counts.get(vendor_key) != cart.item_count:
+        counts[vendor_key] = cart.item_count
+        request.session[SESSION_COUNTS_KEY] = counts
+    if request.session.get('cart_id') != cart.id:
+        request.session['cart_id'] = cart.id
+
+
+def cart_count(request, vendor):
+    """Item count of the shopper's cart at ``vendor``, from the session if known."""
+    if vendor is None:
+        return 0
+    counts = request.session.get(SESSION_COUNTS_KEY, {})
+    vendor_key = str(vendor.id)
+    if vendor_key in counts:
+        return counts[vendor_key]
+
+    # Cold session (e.g. first page after login): one lookup, then cached
+    if request.user.is_authenticated:
+        carts = Cart.objects.filter(user=request.user, vendor=vendor)
+    elif request.session.session_key:
+        carts = Cart.objects.filter(session_key=request.session.session_key, vendor=vendor)
+    else:
+        return 0
+    count = carts.values_list('item_count', flat=True).first() or 0
+    counts[vendor_key] = count
+    request.session[SESSION_COUNTS_KEY] = counts
+    return count
+
+
+async def aremember_cart(request, cart):
+    """Async remember_cart, through the session's async API."""
+    counts = await request.session.aget(SESSION_COUNTS_KEY, {})
+    vendor_key = str(cart.vendor_id)
+    if counts.get(vendor_key) != cart.item_count:
+        counts[vendor_key] = cart.item_count
+        await request.session.aset(SESSION_COUNTS_KEY, counts)
+    if await request.session.aget('cart_id') != cart.id:
+        await request.session.aset('cart_id', cart.id)
+
+
+async def acart_count(request, vendor):
+    """Async cart_count."""
+    if vendor is None:
+        return 0
+    counts = await request.session.aget(SESSION_COUNTS_KEY, {})
+    vendor_key = str(vendor.id)
+    if vendor_key in counts:
+        return counts[vendor_key]
+
+    user = await request.auser()
+    if user.is_authenticated:
+        carts = Cart.objects.filter(user=user, vendor=vendor)
+    elif request.session.session_key:
+        carts = Cart.objects.filter(session_key=request.session.session_key, vendor=vendor)
+    else:
+        return 0
+    count = await carts.values_list('item_count', flat=True).afirst() or 0
+    counts[vendor_key] = count
+    await request.session.aset(SESSION_COUNTS_KEY, counts)
+    return count
+
+
 def get_or_create_cart(request):
     if request.user.is_authenticated:
         cart, _ = Cart.objects.get_or_create(user=request.user)
@@ -11,4 +81,4 @@ def get_or_create_cart(request):
             request.session.create()
             session_key = request.session.session_key
         cart, _ = Cart.objects.get_or_create(session_key=session_key)
-    return cart
\ No newline at end of file
+    return cart
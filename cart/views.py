@@ -1,12 +1,14 @@
 # cart/views.py
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from .models import Cart, CartItem
+from .utils import acart_count, aremember_cart, remember_cart
 from products.models import Product
 from vendors.models import Vendor   # <-- make sure Vendor is imported
+from vendors.resolver import aget_vendor_or_404, get_vendor_or_404
 
 
 # ----------------------------------------------------------------------
@@ -19,23 +21,47 @@ def _get_cart(request, vendor):
         cart, _ = Cart.objects.get_or_create(user=request.user, vendor=vendor)
     else:
         cart, _ = Cart.objects.get_or_create(session_key=request.session.session_key, vendor=vendor)
-    request.session['cart_id'] = cart.id
+    remember_cart(request, cart)
     return cart
 
 
+# The AJAX endpoints below (add / update / remove / count) are async: under
+# config/asgi.py they wait on the database and session without holding a
+# worker thread. They work unchanged under WSGI too.
+async def _aget_cart(request, vendor):
+    if not request.session.session_key:
+        await request.session.acreate()
+    user = await request.auser()
+    if user.is_authenticated:
+        cart, _ = await Cart.objects.aget_or_create(user=user, vendor=vendor)
+    else:
+        cart, _ = await Cart.objects.aget_or_create(session_key=request.session.session_key, vendor=vendor)
+    await aremember_cart(request, cart)
+    return cart
+
+
+async def _aget_item(cart, item_id):
+    item = await cart.items.select_related('product').filter(id=item_id).afirst()
+    if item is None:
+        raise Http404("No CartItem matches the given query.")
+    return item
+
+
 # ----------------------------------------------------------------------
 # 1. View Cart
 # ----------------------------------------------------------------------
 def view_cart(request, vendor_slug):
-    vendor = get_object_or_404(Vendor, slug=vendor_slug)
+    vendor = get_vendor_or_404(vendor_slug)
     cart   = _get_cart(request, vendor)
+    summary = cart.summary()
 
     # Suggested products (exclude items already in cart)
-    suggested = Product.objects.filter(vendor=vendor)\
-                    .exclude(id__in=[i.product.id for i in cart.items.all()])[:4]
+    suggested = Product.objects.filter(vendor=vendor, is_active=True)\
+                    .exclude(id__in=[i.product_id for i in summary.items])[:4]
 
     context = {
         'cart': cart,
+        'summary': summary,
         'vendor': vendor,
         'suggested_products': suggested,
         'year': timezone.now().year,
@@ -47,22 +73,23 @@ def view_cart(request, vendor_slug):
 # 2. Add to Cart (AJAX + normal POST)
 # ----------------------------------------------------------------------
 @require_POST
-def add_to_cart(request, product_id, vendor_slug):
-    product = get_object_or_404(Product, id=product_id)
-    cart    = _get_cart(request, product.vendor)
+async def add_to_cart(request, product_id, vendor_slug):
+    try:
+        product = await Product.objects.select_related('vendor').aget(id=product_id)
+    except Product.DoesNotExist:
+        raise Http404("No Product matches the given query.")
+    cart    = await _aget_cart(request, product.vendor)
 
-    item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-    if not created:
-        item.quantity += 1
-        item.save()
+    item = await cart.aadd_product(product)
+    await aremember_cart(request, cart)
 
     # ----- AJAX response ------------------------------------------------
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        total_items = sum(i.quantity for i in cart.items.all())
         return JsonResponse({
             'success': True,
             'message': f'Added {product.name}',
-            'cart_count': total_items,
+            'cart_count': cart.item_count,
+            'cart_total': cart.total,
             'subtotal': item.subtotal(),
         })
 
@@ -74,23 +101,26 @@ def add_to_cart(request, product_id, vendor_slug):
 # 3. Update Cart (increase / decrease)
 # ----------------------------------------------------------------------
 @require_POST
-def update_cart(request, item_id, vendor_slug):
-    item = get_object_or_404(CartItem, id=item_id)
+async def update_cart(request, item_id, vendor_slug):
+    cart = await _aget_cart(request, await aget_vendor_or_404(vendor_slug))
+    item = await _aget_item(cart, item_id)
     action = request.POST.get('action')
 
-    if action == 'increase':
-        item.quantity += 1
-    elif action == 'decrease':
-        if item.quantity > 1:
-            item.quantity -= 1
-        else:
-            item.delete()
-            return JsonResponse({'removed': True})
+    delta = {'increase': 1, 'decrease': -1}.get(action, 0)
+    kept = not delta or await cart.achange_quantity(item, delta)
+    await aremember_cart(request, cart)
+    if not kept:
+        return JsonResponse({
+            'removed': True,
+            'cart_count': cart.item_count,
+            'cart_total': cart.total,
+        })
 
-    item.save()
     return JsonResponse({
         'quantity': item.quantity,
         'subtotal': item.subtotal(),
+        'cart_count': cart.item_count,
+        'cart_total': cart.total,
     })
 
 
@@ -98,26 +128,34 @@ def update_cart(request, item_id, vendor_slug):
 # 4. Remove from Cart
 # ----------------------------------------------------------------------
 @require_POST
-def remove_from_cart(request, item_id, vendor_slug):
-    item = get_object_or_404(CartItem, id=item_id)
-    item.delete()
-    return JsonResponse({'success': True})
+async def remove_from_cart(request, item_id, vendor_slug):
+    cart = await _aget_cart(request, await aget_vendor_or_404(vendor_slug))
+    item = await _aget_item(cart, item_id)
+    await cart.aremove_item(item)
+    await aremember_cart(request, cart)
+    return JsonResponse({
+        'success': True,
+        'cart_count': cart.item_count,
+        'cart_total': cart.total,
+    })
 
 
 # ----------------------------------------------------------------------
 # 5. **CHECKOUT PAGE** (the missing view)
 # ----------------------------------------------------------------------
 def checkout(request, vendor_slug):
-    vendor = get_object_or_404(Vendor, slug=vendor_slug)
+    vendor = get_vendor_or_404(vendor_slug)
     cart   = _get_cart(request, vendor)
+    summary = cart.summary()
 
     # If cart is empty → go back to cart
-    if not cart.items.exists():
+    if not summary:
         messages.info(request, "Your cart is empty.")
         return redirect('cart:view_cart', vendor_slug=vendor_slug)
 
     context = {
         'cart': cart,
+        'summary': summary,
         'vendor': vendor,
         'year': timezone.now().year,
     }
@@ -127,14 +165,11 @@ def checkout(request, vendor_slug):
 # ----------------------------------------------------------------------
 # 6. Cart-Count API (used by base.html for live count)
 # ----------------------------------------------------------------------
-def cart_count_api(request, vendor_slug):
-    """Return JSON with the current total quantity in the cart."""
-    if 'cart_id' not in request.session:
-        return JsonResponse({'cart_count': 0})
-
-    try:
-        cart = Cart.objects.get(id=request.session['cart_id'])
-        total = sum(i.quantity for i in cart.items.all())
-        return JsonResponse({'cart_count': total})
-    except Cart.DoesNotExist:
-        return JsonResponse({'cart_count': 0})
\ No newline at end of file
+async def cart_count_api(request, vendor_slug):
+    """Return JSON with the current total quantity in the cart.
+
+    Answered from the session (see cart.utils) — no cart query once the
+    session knows the count.
+    """
+    vendor = await aget_vendor_or_404(vendor_slug)
+    return JsonResponse({'cart_count': await acart_count(request, vendor)})
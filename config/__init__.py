@@ -0,0 +1,3 @@
+# Loaded with the settings, before any database connection is opened, so
+# every connection gets the per-request query observer (config/queries.py)
+from . import queries  # noqa: F401
@@ -0,0 +1,305 @@
+# config/metrics.py
+"""
+Process metrics in the Prometheus text exposition format.
+
+Counters and histograms are kept in memory, so recording one costs a lock
+and a dict update. ``config.middleware.metrics`` records every request and
+serves the exposition on ``METRICS['PATH']``. The app records:
+
+- ``http_request_duration_seconds``: latency by URL name and vendor tier;
+- ``http_requests_total``: responses by URL name, tier and status class;
+- ``http_request_db_queries``: SQL statements per request by URL name;
+- ``cache_requests_total``: hits and misses of the vendor host cache (local
+  and shared tiers), the catalog fragment cache and the image proxy's disk
+  cache;
+- ``checkouts_total``: ``place_order`` outcomes.
+
+The vendor tier comes from ``METRICS['VENDOR_TIER']``, a function of the
+request. The default, ``host_tier``, tells the main site, vendor subdomains
+and custom domains apart.
+
+With several worker processes, set ``METRICS['DIR']`` to a directory they
+share. Each process then writes its samples there every
+``FLUSH_INTERVAL`` seconds (and on exit), as ``<pid>-<token>.json``, and a
+scrape of any worker sums every file. A forked worker starts from zero, and
+the files of workers that have exited keep counting, so the sums never go
+backwards while the server runs; empty the directory when deploying.
+Without ``DIR`` each process only reports itself.
+"""
+import atexit
+import ipaddress
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+DEFAULTS = {
+    'ENABLED': False,
+    'PATH': '/-/metrics',
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],    # addresses or networks allowed to scrape
+    'DIR': None,                            # shared by the workers of one host
+    'FLUSH_INTERVAL': 5,                    # seconds between writes to DIR
+    'VENDOR_TIER': 'config.metrics.host_tier',
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_metrics = []       # registration order, for the exposition
+_store = None
+_store_lock = threading.Lock()
+_enabled = None
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+def enabled():
+    global _enabled
+    if _enabled is None:
+        _enabled = config()['ENABLED']
+    return _enabled
+
+
+def _reset(**kwargs):
+    global _store, _enabled
+    if kwargs.get('setting') == 'METRICS':
+        _store, _enabled = None, None
+
+
+setting_changed.connect(_reset)
+
+
+# ----------------------------------------------------------------------
+# Storage
+# ----------------------------------------------------------------------
+class Store:
+    """This process's samples, flushed to ``directory`` when there is one."""
+
+    def __init__(self, directory=None, interval=5):
+        self.pid = os.getpid()
+        self.interval = interval
+        self.path = directory and os.path.join(directory, f'{self.pid}-{uuid.uuid4().hex[:8]}.json')
+        self.counters = {}      # (name, label values) -> value
+        self.histograms = {}    # (name, label values) -> [bucket counts, sum]
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flusher = None
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self._touch()
+
+    def observe(self, key, index, size, value):
+        with self.lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [[0] * size, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            self._touch()
+
+    def _touch(self):
+        self.dirty = True
+        if self.path and self.flusher is None:
+            # Started on first use, so it runs in the worker, not a pre-fork parent
+            self.flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self.flusher.start()
+            atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def samples(self):
+        """``(counters, histograms)``, copied."""
+        with self.lock:
+            return (
+                dict(self.counters),
+                {key: [list(counts), total] for key, (counts, total) in self.histograms.items()},
+            )
+
+    def flush(self):
+        if not self.path:
+            return
+        with self.flush_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                self.dirty = False
+            counters, histograms = self.samples()
+            data = {
+                'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                'histograms': [
+                    [name, list(labels), counts, total] for (name, labels), (counts, total) in histograms.items()
+                ],
+            }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Readers only ever see a whole file
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as out:
+                json.dump(data, out)
+            os.replace(self.path + '.tmp', self.path)
+
+
+def store():
+    """The current process's Store (a new, empty one after a fork)."""
+    global _store
+    current = _store
+    if current is None or current.pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store.pid != os.getpid():
+                conf = config()
+                _store = Store(conf['DIR'], conf['FLUSH_INTERVAL'])
+            current = _store
+    return current
+
+
+def collect():
+    """``(counters, histograms)`` summed over every process sharing ``DIR``."""
+    current = store()
+    if not current.path:
+        return current.samples()
+    current.flush()
+    directory = os.path.dirname(current.path)
+    counters, histograms = {}, {}
+    for filename in sorted(os.listdir(directory) if os.path.isdir(directory) else []):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename), encoding='utf-8') as source:
+                data = json.load(source)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in data['histograms']:
+            key = (name, tuple(labels))
+            entry = histograms.get(key)
+            if entry is None:
+                histograms[key] = [counts, total]
+            elif len(entry[0]) == len(counts):  # skip a file written with other buckets
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+    return counters, histograms
+
+
+# ----------------------------------------------------------------------
+# Metrics
+# ----------------------------------------------------------------------
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        _metrics.append(self)
+
+    def key(self, labels):
+        return self.name, tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if enabled():
+            store().inc(self.key(labels), amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if enabled():
+            store().observe(self.key(labels), bisect_left(self.buckets, value), len(self.buckets) + 1, value)
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by URL name and vendor tier.', ['view', 'tier'],
+)
+REQUESTS = Counter(
+    'http_requests_total', 'Responses by URL name, vendor tier and status class.', ['view', 'tier', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL statements per request by URL name.', ['view'], buckets=QUERY_BUCKETS,
+)
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result.', ['cache', 'result'])
+CHECKOUTS = Counter('checkouts_total', 'Checkout attempts by outcome.', ['outcome'])
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def host_tier(request):
+    """``main``, ``subdomain`` or ``custom_domain``: how the storefront was reached."""
+    from vendors.resolver import subdomain_slug
+
+    if getattr(request, 'vendor', None) is None:
+        return 'main'
+    return 'subdomain' if subdomain_slug(request.get_host().split(':')[0].lower()) else 'custom_domain'
+
+
+def allowed_networks(addresses):
+    return [ipaddress.ip_network(address, strict=False) for address in addresses]
+
+
+# ----------------------------------------------------------------------
+# Exposition
+# ----------------------------------------------------------------------
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def exposition():
+    """Every metric's samples, summed over processes, as exposition text."""
+    counters, histograms = collect()
+    by_name = {}
+    for (name, values), sample in [*counters.items(), *histograms.items()]:
+        by_name.setdefault(name, []).append((values, sample))
+
+    lines = []
+    for metric in _metrics:
+        lines += [f'# HELP {metric.name} {metric.help}', f'# TYPE {metric.name} {metric.type}']
+        for values, sample in sorted(by_name.get(metric.name, [])):
+            if metric.type == 'counter':
+                lines.append(f'{metric.name}{_labels(metric.labels, values)} {_number(sample)}')
+                continue
+            counts, total = sample
+            if len(counts) != len(metric.buckets) + 1:
+                continue
+            cumulative = 0
+            for le, count in zip((*metric.buckets, float('inf')), counts):
+                cumulative += count
+                labels = _labels((*metric.labels, 'le'), (*values, _number(le)))
+                lines.append(f'{metric.name}_bucket{labels} {cumulative}')
+            labels = _labels(metric.labels, values)
+            lines.append(f'{metric.name}_sum{labels} {_number(total)}')
+            lines.append(f'{metric.name}_count{labels} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,100 @@
+# config/middleware/metrics.py
+"""
+Records every request in ``config.metrics`` and serves the exposition.
+
+For each request the middleware records:
+
+- its latency, labelled by the resolved URL name (``namespace:name``, or
+  ``(unresolved)``) and the vendor tier;
+- the response's status class (``2xx``, ``4xx``, ...);
+- how many SQL statements it ran, on any connection.
+
+``METRICS['PATH']`` answers with the exposition text for clients in
+``ALLOWED_IPS`` and 404s for everyone else. Scrape each worker host
+directly rather than through the load balancer, or the balancer's address
+has to be allowed. The path is answered here, before the session, vendor
+and URL resolution run, and isn't itself recorded.
+
+The middleware removes itself (MiddlewareNotUsed) unless
+``METRICS['ENABLED']`` is true. It is both sync and async capable, so
+under ASGI it doesn't push the async middleware and views behind it onto
+a thread. Time spent iterating a streaming response happens after it
+returns and isn't counted.
+"""
+import ipaddress
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseNotFound
+from django.utils.module_loading import import_string
+
+from config import metrics, queries
+
+UNRESOLVED = '(unresolved)'
+
+
+class QueryCounter:
+    """``execute_wrapper`` that counts statements."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        conf = metrics.config()
+        if not conf['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.path = conf['PATH']
+        self.networks = metrics.allowed_networks(conf['ALLOWED_IPS'])
+        self.tier = import_string(conf['VENDOR_TIER'])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.path == self.path:
+            return self.serve(request)
+        started = time.perf_counter()
+        with queries.observing(QueryCounter()) as counter:
+            response = self.get_response(request)
+        self.record(request, response, counter.count, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if request.path == self.path:
+            # Reads the other workers' files
+            return await sync_to_async(self.serve)(request)
+        started = time.perf_counter()
+        with queries.observing(QueryCounter()) as counter:
+            response = await self.get_response(request)
+        self.record(request, response, counter.count, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, query_count, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED
+        tier = self.tier(request)
+        metrics.REQUEST_LATENCY.observe(elapsed, view=view, tier=tier)
+        metrics.REQUESTS.inc(view=view, tier=tier, status=f'{response.status_code // 100}xx')
+        metrics.REQUEST_QUERIES.observe(query_count, view=view)
+
+    def serve(self, request):
+        try:
+            address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+        except ValueError:
+            return HttpResponseNotFound()
+        if not any(address in network for network in self.networks):
+            return HttpResponseNotFound()
+        return HttpResponse(metrics.exposition(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,159 @@
+# config/middleware/sql_budget.py
+"""
+Per-request SQL accounting, for staging: query count, SQL time and
+repeated statements. A statement run more than ``REPEAT_THRESHOLD``
+times in one request is flagged as a probable N+1.
+
+Opt-in: the middleware is listed in MIDDLEWARE but removes itself
+(MiddlewareNotUsed) unless ``SQL_BUDGET['ENABLED']`` is true.
+
+For each request it:
+- adds a ``Server-Timing`` header: ``sql`` (time and count), ``app``
+  (the whole request) and one ``n-plus-one`` entry per flagged statement;
+- logs one JSON line to the ``config.middleware.sql_budget`` logger, at
+  WARNING when something was flagged or ``MAX_QUERIES`` was exceeded and
+  at INFO otherwise. The record is also passed as ``extra={'sql_budget':
+  ...}`` for structured handlers.
+
+A statement's fingerprint is its SQL with parameters left out (Django
+passes them separately) and ``IN (%s, %s, ...)`` lists collapsed, so the
+same lookup with different ids counts as one statement. Transaction
+statements (BEGIN, SAVEPOINT, ...) are counted but never flagged.
+Queries made while a streaming response is iterated happen after the
+middleware has returned and aren't counted. Like MetricsMiddleware it is
+both sync and async capable.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from config import queries
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'REPEAT_THRESHOLD': 5,      # flag a fingerprint run more than this many times
+    'MAX_QUERIES': 50,          # log at WARNING past this many queries (None: never)
+    'HEADER': True,             # add Server-Timing
+    'LOG_ALL': True,            # False: only log requests that were flagged
+}
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_SPACE = re.compile(r'\s+')
+_TRANSACTION = re.compile(r'(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b', re.IGNORECASE)
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'SQL_BUDGET', {})}
+
+
+def fingerprint(sql):
+    return _SPACE.sub(' ', _IN_LIST.sub('IN (...)', sql)).strip()
+
+
+class QueryLog:
+    """``execute_wrapper`` that times and fingerprints every statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}    # fingerprint -> [count, seconds]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            entry = self.statements.setdefault(fingerprint(sql), [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def repeated(self, threshold):
+        """``[(fingerprint, count, seconds)]`` run more than ``threshold`` times, most first."""
+        rows = [
+            (sql, count, seconds) for sql, (count, seconds) in self.statements.items()
+            if count > threshold and not _TRANSACTION.match(sql)
+        ]
+        return sorted(rows, key=lambda row: -row[1])
+
+
+def short_id(sql):
+    return hashlib.sha1(sql.encode()).hexdigest()[:8]
+
+
+class SQLBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.config = config()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        log, started = QueryLog(), time.perf_counter()
+        with queries.observing(log):
+            response = self.get_response(request)
+        return self.report(request, response, log, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        log, started = QueryLog(), time.perf_counter()
+        with queries.observing(log):
+            response = await self.get_response(request)
+        return self.report(request, response, log, time.perf_counter() - started)
+
+    def report(self, request, response, log, duration):
+        repeated = log.repeated(self.config['REPEAT_THRESHOLD'])
+        if self.config['HEADER']:
+            self.add_header(response, log, repeated, duration)
+        over_budget = self.config['MAX_QUERIES'] is not None and log.count > self.config['MAX_QUERIES']
+        if repeated or over_budget or self.config['LOG_ALL']:
+            self.log(request, response, log, repeated, duration, over_budget)
+        return response
+
+    def add_header(self, response, log, repeated, duration):
+        timings = [
+            f'sql;dur={log.seconds * 1000:.2f};desc="{log.count} queries"',
+            f'app;dur={duration * 1000:.2f}',
+        ]
+        timings += [
+            f'n-plus-one;dur={seconds * 1000:.2f};desc="{short_id(sql)} x{count}"'
+            for sql, count, seconds in repeated
+        ]
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = ', '.join(([existing] if existing else []) + timings)
+
+    def log(self, request, response, log, repeated, duration, over_budget):
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': log.count,
+            'sql_ms': round(log.seconds * 1000, 2),
+            'duration_ms': round(duration * 1000, 2),
+            'over_budget': over_budget,
+            'repeated': [
+                {'id': short_id(sql), 'count': count, 'sql_ms': round(seconds * 1000, 2), 'sql': sql[:300]}
+                for sql, count, seconds in repeated
+            ],
+        }
+        level = logging.WARNING if repeated or over_budget else logging.INFO
+        logger.log(level, 'sql_budget %s', json.dumps(record, sort_keys=True), extra={'sql_budget': record})
@@ -1,44 +1,40 @@
-# middleware.py
-from django.http import Http404, HttpResponseRedirect
+from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.utils.deprecation import MiddlewareMixin
-from vendors.models import Vendor
+from vendors.resolver import aresolve_host, resolve_host
 
 
 class SubdomainVendorMiddleware(MiddlewareMixin):
     """
-    Detects vendor subdomains like:
+    Detects vendor subdomains and custom domains like:
         crescent.lvh.me:8000 → vendor.slug = 'crescent'
+        shop.crescent.com    → VendorDomain(domain='shop.crescent.com')
     Sets:
         request.vendor
         request.is_vendor_subdomain
     Auto-redirects "/" → vendor store
+
+    Lookups go through vendors.resolver, so a warm host costs no query.
     """
 
     def process_request(self, request):
         host = request.get_host().split(":")[0]  # remove port
-        parts = host.split(".")
-
-        # lvh.me or localhost
-        if len(parts) > 2 and parts[-2:] == ['lvh', 'me']:
-            slug = parts[0].lower()
-
-            try:
-                vendor = Vendor.objects.get(slug=slug)
-                request.vendor = vendor
-                request.is_vendor_subdomain = True
 
-                # Auto-route root "/" to vendor store
-                if request.path == "/" or request.path == "":
-                    return HttpResponseRedirect(
-                        reverse('vendors:vendor_store', kwargs={'vendor_slug': vendor.slug})
-                    )
+        request.vendor, request.is_vendor_subdomain = resolve_host(host)
+        return self.store_redirect(request)
 
-            except Vendor.DoesNotExist:
-                raise Http404("Vendor not found")
+    async def __acall__(self, request):
+        # Under ASGI, resolve on the event loop instead of hopping to a
+        # thread for process_request (a warm host needs no I/O).
+        host = request.get_host().split(":")[0]
+        request.vendor, request.is_vendor_subdomain = await aresolve_host(host)
+        return self.store_redirect(request) or await self.get_response(request)
 
-        else:
-            request.vendor = None
-            request.is_vendor_subdomain = False
+    def store_redirect(self, request):
+        # Auto-route root "/" to vendor store
+        if request.vendor and (request.path == "/" or request.path == ""):
+            return HttpResponseRedirect(
+                reverse('vendors:vendor_store', kwargs={'vendor_slug': request.vendor.slug})
+            )
 
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,57 @@
+# config/queries.py
+"""
+Per-request SQL observers that work under both WSGI and ASGI.
+
+``connection.execute_wrapper()`` only wraps the current thread's
+connection. Under ASGI an async middleware runs on the event loop while the
+request's queries run on a worker thread (``sync_to_async``), on that
+thread's own connection. The middleware can't reach that connection
+without hopping to the thread itself.
+
+So one wrapper is installed on every connection when it connects. It hands
+each statement to the observers registered with ``observing()`` in the
+current context, and ``sync_to_async`` carries that context over to the
+worker thread. Outside ``observing()`` the wrapper only does one contextvar
+lookup per statement.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_observers = ContextVar('query_observers', default=())
+
+
+def _observe(execute, sql, params, many, context):
+    for observer in _observers.get():
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    if _observe not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_observe)
+
+
+def _install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_install_on_connect)
+
+
+@contextmanager
+def observing(observer):
+    """
+    Pass every statement run in this context, including in the threads of
+    ``sync_to_async`` calls, to ``observer`` (an ``execute_wrapper``).
+    """
+    for connection in connections.all(initialized_only=True):
+        install(connection)     # opened before this module was imported
+    token = _observers.set(_observers.get() + (observer,))
+    try:
+        yield observer
+    finally:
+        _observers.reset(token)
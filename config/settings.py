@@ -45,6 +45,10 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # First, so it sees every query; inactive unless SQL_BUDGET['ENABLED']
+    'config.middleware.sql_budget.SQLBudgetMiddleware',
+    # Latency, query and status metrics; also serves METRICS['PATH']
+    'config.middleware.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'config.middleware.subdomain_middleware.SubdomainVendorMiddleware',
@@ -67,6 +71,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'cart.context_processors.cart_count',
             ],
         },
     },
@@ -82,6 +87,21 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent checkouts queue on
+            # the busy timeout instead of failing with "database is locked"
+            # when a read transaction tries to upgrade. Only atomic blocks
+            # BEGIN (autocommit reads take no write lock), every atomic
+            # block in the app writes, and SQLite has one writer at a time
+            # regardless.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # File-backed test database so threaded tests (checkout stress
+        # test) share it the same way production workers do.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -122,6 +142,31 @@ USE_I18N = True
 
 STATIC_URL = 'static/'
 
+# Uploads (vendor logos, product images) and their resized derivatives
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Sizes built by `manage.py build_image_derivatives` (products/images.py);
+# the responsive_image template tag serves them with srcset.
+IMAGE_DERIVATIVES = {
+    'WIDTHS': {
+        'products.Product.image': [240, 480, 960],
+        'vendors.Vendor.logo': [64, 160, 320],
+    },
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': 80,
+}
+
+# Remote Product.image_url images are fetched once, resized and served from
+# this size-bounded disk cache by the image_proxy view (products/proxy.py).
+IMAGE_PROXY = {
+    'ROOT': BASE_DIR / 'image_cache',
+    'MAX_BYTES': 512 * 1024 * 1024,
+    'WIDTHS': [240, 480, 960],
+    'TIMEOUT': 5,
+    'MAX_AGE': 30 * 24 * 3600,
+}
+
 
 # settings.py
 LOGIN_URL = '/login/'
@@ -132,6 +177,82 @@ LOGOUT_REDIRECT_URL = '/login/'
 CSRF_COOKIE_DOMAIN = ".lvh.me"
 SESSION_COOKIE_DOMAIN = ".lvh.me"
 
+# Sessions are read on every storefront request (cart id, cached cart
+# counts); serve them from the cache and only write through to the DB.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Host → vendor resolution (vendors/resolver.py).
+# <slug>.<base domain> maps to Vendor.slug; any other host is looked up in
+# VendorDomain. Set SHARED_CACHE to a CACHES alias to share entries between
+# worker processes.
+VENDOR_BASE_DOMAINS = ['lvh.me']
+VENDOR_HOST_CACHE = {
+    'MAX_ENTRIES': 1024,
+    'TTL': 60,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+}
+
+# Rendered storefront fragments (product grid, category filter), keyed by
+# a per-vendor catalog version; see products/catalog.py. ALIAS must be a
+# cache shared by all workers in production.
+CATALOG_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 3600,
+}
+
+# Unpaid (pending) orders hold their stock this long before
+# release_expired_reservations cancels them and puts it back. None: no
+# limit. Orders stay pending until the vendor confirms them by hand, so
+# only set this when checkout waits on a payment.
+ORDER_RESERVATION_MINUTES = None
+
+# Order notification outbox (orders/notifications.py), delivered by
+# `manage.py send_notifications --loop 5`. Map each channel to a transport
+# class; StubTransport only records messages, for offline development.
+ORDER_NOTIFICATIONS = {
+    'TRANSPORTS': {
+        'email': 'orders.notifications.EmailTransport',
+        'whatsapp': 'orders.notifications.StubTransport',
+        'webhook': 'orders.notifications.StubTransport',
+    },
+    'BATCH_SIZE': 50,
+    'CONCURRENCY': 8,
+    'MAX_ATTEMPTS': 5,
+}
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Per-request query counts, SQL time and N+1 detection
+# (config/middleware/sql_budget.py): Server-Timing headers plus one JSON
+# log line per request. Turn on in staging, not in production.
+SQL_BUDGET = {
+    'ENABLED': False,
+    'REPEAT_THRESHOLD': 5,
+    'MAX_QUERIES': 50,
+}
+
+# Prometheus-style metrics (config/metrics.py), served on PATH to
+# ALLOWED_IPS. With several workers per host set DIR to a directory they
+# share, so a scrape of any worker reports them all.
+METRICS = {
+    'ENABLED': True,
+    'PATH': '/-/metrics',
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+    'DIR': None,
+    'FLUSH_INTERVAL': 5,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'config.middleware.sql_budget': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
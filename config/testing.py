@@ -0,0 +1,101 @@
+# config/testing.py
+"""
+Test support shared by the apps' test modules: the query budget fixture
+(``Shop``) and ``QueryBudgetTestCase``.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from vendors.models import Vendor
+
+SIZES = (1, 10, 100)
+
+
+class Shop:
+    """
+    A vendor with ``size`` products (in a three-level category tree), a
+    shopper whose cart has ``size`` lines, and ``size`` two-item orders.
+    ``client`` is logged in as the vendor; ``shopper`` browses the store.
+    """
+    created = 0
+
+    def __init__(self, size):
+        Shop.created += 1
+        self.size, self.key = size, Shop.created
+        self.owner = User.objects.create_user(username=f'owner{self.key}', password='pw')
+        self.vendor = Vendor.objects.create(user=self.owner, store_name=f'Shop {self.key}')
+        self.host = f'{self.vendor.slug}.lvh.me'
+        root = Category.objects.create(name=f'Root {self.key}')
+        self.category = Category.objects.create(name=f'Leaf {self.key}', parent=Category.objects.create(name='Mid', parent=root))
+        Product.objects.bulk_create([
+            Product(vendor=self.vendor, category=self.category, sku=f'S{i}', name=f'Product {i}', price=10, stock=50)
+            for i in range(size)
+        ])
+        self.products = list(self.vendor.products.order_by('pk'))
+        self.product = self.products[0]
+
+        self.client = Client()
+        self.client.force_login(self.owner)
+
+        # The shopper's cart holds ``size`` lines; the first through the
+        # real endpoint, so the session knows the cart
+        self.shopper = Client(HTTP_HOST=self.host)
+        self.shopper.post(reverse('cart:add_to_cart', args=[self.vendor.slug, self.product.pk]))
+        self.cart = Cart.objects.get(vendor=self.vendor)
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, product=p) for p in self.products[1:]])
+        Cart.objects.filter(pk=self.cart.pk).update(item_count=size, total=10 * size)
+        session = self.shopper.session
+        session['cart_counts'] = {str(self.vendor.pk): size}
+        session.save()
+        self.item = self.cart.items.order_by('pk').first()
+
+        orders = Order.objects.bulk_create([
+            Order(vendor=self.vendor, customer_name=f'Customer {i}', customer_phone=f'0803{i:07d}', total_cents=2000)
+            for i in range(size)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, product_name=product.name, unit_price_cents=1000, quantity=1)
+            for order in orders for product in self.products[:2]
+        ])
+
+
+@override_settings(VENDOR_HOST_CACHE={'TTL': 3600})
+class QueryBudgetTestCase(TestCase):
+    """
+    Exact query counts per URL. ``assertBudget`` seeds a shop of each of
+    SIZES (products, cart lines and orders), clears the caches and runs
+    ``request(shop)``. The count must be ``queries`` at every size, so a
+    view or template that queries per row fails here. A first, unmeasured
+    run warms the per-process caches (content types, URL resolvers, host
+    lookups, whose TTL is raised so none expires mid-test).
+
+    ``queries`` may instead be a function of the size, for the few views
+    whose statement count grows by design (bulk INSERT batches).
+    """
+
+    def assertBudget(self, queries, request, status=200):
+        budget = queries if callable(queries) else lambda size: queries
+        self.run_request(Shop(1), request)
+        counts = []
+        for size in SIZES:
+            shop = Shop(size)
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.run_request(shop, request)
+            self.assertEqual(response.status_code, status, f'size {size}')
+            counts.append(len(captured))
+        self.assertEqual(counts, [budget(size) for size in SIZES])
+
+    @staticmethod
+    def run_request(shop, request):
+        response = request(shop)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
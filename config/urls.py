@@ -1,4 +1,6 @@
 # config/urls.py
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from vendors.views import home_view, vendor_store
@@ -6,15 +8,20 @@ from vendors.views import home_view, vendor_store
 urlpatterns = [
     path("admin/", admin.site.urls),
 
-    # Vendor management — runs on main domain (lvh.me/vendor/...)
-    path("", include("vendors.urls")),
-
     # Product & cart base paths — on main domain they behave as public pages,
     # on subdomains middleware attaches request.vendor and views will enforce.
+    # Listed before vendors.urls, whose "<vendor_slug>/" would take /products/.
     path("products/", include("products.urls")),
     path("cart/", include("cart.urls")),
     path("orders/", include("orders.urls")),
 
+    # Vendor management — runs on main domain (lvh.me/vendor/...)
+    path("", include("vendors.urls")),
+
     # Root homepage for main domain
     path("", home_view, name="home"),
-]
\ No newline at end of file
+]
+
+# Uploaded media in development; production serves MEDIA_ROOT from the web
+# server (derivative names are content-hashed, so cache them forever).
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
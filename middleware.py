@@ -1,5 +1,4 @@
-from django.http import Http404
-from vendors.models import Vendor
+from vendors.resolver import resolve_host
 
 class SubdomainVendorMiddleware:
     def __init__(self, get_response):
@@ -7,18 +6,9 @@ class SubdomainVendorMiddleware:
 
     def __call__(self, request):
         host = request.get_host().split(':')[0]
-        parts = host.split('.')
-        request.vendor = None
-        request.is_vendor_subdomain = False
 
-        # vendor.domain.tld => treat first part as vendor slug
-        if len(parts) >= 3:
-            subdomain = parts[0]
-            try:
-                vendor = Vendor.objects.get(slug=subdomain)
-            except Vendor.DoesNotExist:
-                raise Http404('Vendor not found')
-            request.vendor = vendor
-            request.is_vendor_subdomain = True
+        # vendor.lvh.me => vendor slug, shop.example.com => VendorDomain;
+        # both answered from the vendors.resolver cache
+        request.vendor, request.is_vendor_subdomain = resolve_host(host)
 
         return self.get_response(request)
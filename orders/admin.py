@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Notification, Order, OrderItem
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -11,3 +11,11 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('id','vendor','customer_name','customer_phone','total_cents','status','created_at')
     list_filter = ('status','created_at','vendor')
     inlines = [OrderItemInline]
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('id','order','channel','recipient','status','attempts','next_attempt_at','sent_at')
+    list_filter = ('status','channel')
+    list_select_related = ('order',)
+    readonly_fields = ('claim_token','claimed_until','last_error','sent_at')
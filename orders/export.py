@@ -0,0 +1,126 @@
+# orders/export.py
+"""
+Streaming export of a vendor's orders with their items.
+
+Orders and items come from one LEFT JOIN query (ordered by created_at, id),
+read with ``.iterator(chunk_size=...)``. Memory stays flat and the first
+rows are written while the database is still producing the rest.
+
+- **CSV** has one row per order item, with the order's columns repeated.
+  An order without items gets a single row with blank item columns.
+- **JSONL** has one line per order with its ``items`` nested. Consecutive
+  rows of the same order are folded together as they arrive.
+
+Money is written as decimal strings, and times as ISO 8601 in the
+current time zone. Text that a spreadsheet would evaluate as a formula is
+prefixed with an apostrophe.
+"""
+import json
+import re
+from decimal import Decimal
+
+from django.utils import timezone
+
+from config import streaming
+from .models import Order
+
+FORMATS = ('csv', 'jsonl')
+CHUNK_SIZE = 2000
+LINES_PER_CHUNK = 100   # rows joined into one yielded string
+
+ORDER_FIELDS = [
+    'id', 'created_at', 'status', 'customer_name', 'customer_phone',
+    'customer_email', 'customer_address', 'total_cents', 'notes',
+]
+ITEM_FIELDS = ['items__product_id', 'items__product_name', 'items__unit_price_cents', 'items__quantity']
+
+CSV_COLUMNS = [
+    'order_id', 'created_at', 'status', 'customer_name', 'customer_phone',
+    'customer_email', 'customer_address', 'order_total', 'notes',
+    'product_id', 'product_name', 'unit_price', 'quantity', 'subtotal',
+]
+
+_NUMBER = re.compile(r'^[+-]?[\d\s().-]*$')
+
+
+def _money(cents):
+    return None if cents is None else str(Decimal(cents) / 100)
+
+
+def _cell(value):
+    """Keep spreadsheets from running user text as a formula (phone numbers pass)."""
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r') and not _NUMBER.match(value):
+        return "'" + value
+    return value
+
+
+def order_rows(orders, chunk_size=CHUNK_SIZE):
+    """Yield ``(order dict, item dict or None)`` per joined row of ``orders``."""
+    rows = (
+        orders.order_by('created_at', 'id', 'items__id')
+        .values_list(*ORDER_FIELDS, *ITEM_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        order = dict(zip(ORDER_FIELDS, row))
+        order['created_at'] = timezone.localtime(order['created_at']).isoformat()
+        order['total'] = _money(order.pop('total_cents'))
+        product_id, name, unit_cents, quantity = row[len(ORDER_FIELDS):]
+        item = None
+        if name is not None:
+            item = {
+                'product_id': product_id,
+                'product_name': name,
+                'unit_price': _money(unit_cents),
+                'quantity': quantity,
+                'subtotal': _money(unit_cents * quantity),
+            }
+        yield order, item
+
+
+def _joined(lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= LINES_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _csv_lines(orders):
+    writer = streaming.csv_writer()
+    yield writer.writerow(CSV_COLUMNS)
+    for order, item in order_rows(orders):
+        item = item or {}
+        yield writer.writerow([_cell(value) for value in (
+            order['id'], order['created_at'], order['status'], order['customer_name'],
+            order['customer_phone'], order['customer_email'], order['customer_address'],
+            order['total'], order['notes'],
+            item.get('product_id'), item.get('product_name'), item.get('unit_price'),
+            item.get('quantity'), item.get('subtotal'),
+        )])
+
+
+def _jsonl_lines(orders):
+    current = None
+    for order, item in order_rows(orders):
+        if current is None or current['id'] != order['id']:
+            if current is not None:
+                yield json.dumps(current, ensure_ascii=False) + '\n'
+            current = {**order, 'items': []}
+        if item:
+            current['items'].append(item)
+    if current is not None:
+        yield json.dumps(current, ensure_ascii=False) + '\n'
+
+
+def export_orders(vendor, fmt='csv', **filters):
+    """
+    Yield ``vendor``'s orders as CSV or JSONL text chunks. ``filters`` are
+    passed to ``Order.objects.filter_by`` (status, dates, customer).
+    """
+    orders = Order.objects.filter(vendor=vendor).filter_by(**filters)
+    lines = _csv_lines(orders) if fmt == 'csv' else _jsonl_lines(orders)
+    return _joined(lines)
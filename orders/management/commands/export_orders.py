@@ -0,0 +1,37 @@
+# orders/management/commands/export_orders.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import export
+from orders.models import Order
+from vendors.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Stream a vendor's orders and order items as CSV (one row per item) or JSONL (one line per order)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', required=True, help="Vendor slug.")
+        parser.add_argument('--format', choices=export.FORMATS, default='csv')
+        parser.add_argument('--status', choices=[value for value, _ in Order.STATUS_CHOICES])
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, metavar='YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, metavar='YYYY-MM-DD')
+        parser.add_argument('--customer', help="Customer phone or name prefix.")
+        parser.add_argument('-o', '--output', default='-', help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        vendor = Vendor.objects.filter(slug=options['vendor']).first()
+        if vendor is None:
+            raise CommandError(f"No vendor with slug {options['vendor']!r}.")
+        chunks = export.export_orders(
+            vendor, options['format'],
+            status=options['status'], date_from=options['date_from'], date_to=options['date_to'],
+            customer=options['customer'],
+        )
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            f.writelines(chunks)
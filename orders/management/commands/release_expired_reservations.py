@@ -0,0 +1,31 @@
+# orders/management/commands/release_expired_reservations.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.services import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancel unpaid orders whose stock reservation has expired and restock their items. "
+        "Only orders placed while ORDER_RESERVATION_MINUTES was set have a reservation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--loop', type=int, default=0, metavar='SECONDS',
+            help="Keep running, sweeping every SECONDS (default: run once).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            released = release_expired_reservations(batch_size=batch_size)
+            self.stdout.write(f"Released {released} expired reservation(s)")
+            if released == batch_size:
+                continue  # more may be waiting
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,31 @@
+# orders/management/commands/send_notifications.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.notifications import config, process_batch
+
+
+class Command(BaseCommand):
+    help = "Deliver queued order notifications from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Notifications sent at once (default: ORDER_NOTIFICATIONS['CONCURRENCY']).")
+        parser.add_argument(
+            '--loop', type=float, default=0, metavar='SECONDS',
+            help="Keep running, polling every SECONDS when idle (default: drain once).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or config()['BATCH_SIZE']
+        while True:
+            claimed, sent, failed = process_batch(batch_size, options['concurrency'])
+            if claimed:
+                self.stdout.write(f"Sent {sent}, failed {failed} of {claimed} notification(s)")
+            if claimed == batch_size:
+                continue  # more may be waiting
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_alter_order_status'),
+        ('vendors', '0004_vendordomain'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['vendor', 'created_at'], name='order_vendor_created'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_notification'),
+        ('vendors', '0005_vendor_logo_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue_cents', models.BigIntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('confirmed', models.IntegerField(default=0)),
+                ('shipped', models.IntegerField(default=0)),
+                ('delivered', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='vendors.vendor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('vendor', 'day'), name='dailysales_vendor_day')],
+            },
+        ),
+    ]
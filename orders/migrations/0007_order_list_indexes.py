@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:04
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_dailysales'),
+        ('vendors', '0005_vendor_logo_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['vendor', 'status', 'created_at'], name='order_vendor_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['vendor', 'customer_phone'], name='order_vendor_phone'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(models.F('vendor'), django.db.models.functions.text.Lower('customer_name'), name='order_vendor_name'),
+        ),
+    ]
@@ -1,9 +1,53 @@
 # orders/models.py
+import re
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.functions import Lower
 from vendors.models import Vendor
 from products.models import Product
 from django.utils import timezone
 
+
+def day_start(day):
+    """Aware midnight starting ``day`` in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def prefix_range(expression, prefix):
+    """``expression`` starts with ``prefix``, as a range an index can serve (unlike LIKE)."""
+    return {f'{expression}__gte': prefix, f'{expression}__lt': prefix + '\U0010ffff'}
+
+
+PHONE_CHARS = re.compile(r'^[+\d][\d\s()-]*$')
+
+
+class OrderQuerySet(models.QuerySet):
+    def filter_by(self, status=None, date_from=None, date_to=None, customer=None):
+        """
+        Orders with ``status``, placed between the dates (inclusive, local
+        time), whose customer phone or name (case-insensitive) starts with
+        ``customer``. Each filter is a range on one of the vendor's
+        indexes: dates on created_at, phone on customer_phone and name on
+        LOWER(customer_name).
+        """
+        orders = self
+        if status:
+            orders = orders.filter(status=status)
+        customer = (customer or '').strip()
+        if PHONE_CHARS.match(customer):
+            orders = orders.filter(**prefix_range('customer_phone', customer))
+        elif customer:
+            orders = orders.alias(customer_key=Lower('customer_name'))\
+                           .filter(**prefix_range('customer_key', customer.lower()))
+        if date_from:
+            orders = orders.filter(created_at__gte=day_start(date_from))
+        if date_to:
+            orders = orders.filter(created_at__lt=day_start(date_to + timedelta(days=1)))
+        return orders
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("pending","Pending"),
@@ -21,10 +65,103 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(default=timezone.now)
     notes = models.TextField(blank=True, null=True)
+    # Stock held for an unpaid (pending) order is released after this
+    # (orders.services.release_expired_reservations)
+    reserved_until = models.DateTimeField(blank=True, null=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['vendor', 'created_at'], name='order_vendor_created'),
+            models.Index(fields=['status', 'reserved_until'], name='order_status_reserved'),
+            # Vendor order list filters (OrderQuerySet.filter_by)
+            models.Index(fields=['vendor', 'status', 'created_at'], name='order_vendor_status_created'),
+            models.Index(fields=['vendor', 'customer_phone'], name='order_vendor_phone'),
+            models.Index('vendor', Lower('customer_name'), name='order_vendor_name'),
+        ]
+
+    def total(self):
+        return Decimal(self.total_cents) / 100
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, null=True, on_delete=models.SET_NULL)
     product_name = models.CharField(max_length=255)
     unit_price_cents = models.PositiveIntegerField()
-    quantity = models.PositiveIntegerField(default=1)
\ No newline at end of file
+    quantity = models.PositiveIntegerField(default=1)
+
+    def subtotal(self):
+        return Decimal(self.unit_price_cents * self.quantity) / 100
+
+
+class DailySales(models.Model):
+    """
+    Per-vendor, per-day sales totals for the dashboard, maintained
+    incrementally (orders/rollups.py) so the dashboard never aggregates
+    Order rows. ``day`` is the order's local creation date; an order stays
+    in its day's row when its status later changes. Cancelled orders count
+    in ``orders`` and ``cancelled`` but not in revenue or units.
+    """
+    vendor = models.ForeignKey(Vendor, related_name="daily_sales", on_delete=models.CASCADE)
+    day = models.DateField()
+    orders = models.IntegerField(default=0)
+    revenue_cents = models.BigIntegerField(default=0)
+    units = models.IntegerField(default=0)
+    # Orders placed that day, by current status
+    pending = models.IntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    shipped = models.IntegerField(default=0)
+    delivered = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'day'], name='dailysales_vendor_day'),
+        ]
+
+    def revenue(self):
+        return Decimal(self.revenue_cents) / 100
+
+
+class Notification(models.Model):
+    """
+    Transactional outbox: one message to send about an order. Rows are
+    written in the checkout transaction and delivered later by the
+    send_notifications worker (orders/notifications.py), so checkout never
+    waits on an email server or messaging API.
+    """
+    CHANNEL_CHOICES = [
+        ("email","Email"),
+        ("whatsapp","WhatsApp"),
+        ("webhook","Webhook"),
+    ]
+    STATUS_CHOICES = [
+        ("pending","Pending"),
+        ("sending","Sending"),
+        ("sent","Sent"),
+        ("failed","Failed"),
+    ]
+    order = models.ForeignKey(Order, related_name="notifications", on_delete=models.CASCADE)
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set when a worker claims the row; a row still "sending" after
+    # claimed_until belongs to a worker that died and is claimable again.
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_status_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} to {self.recipient} (order #{self.order_id})"
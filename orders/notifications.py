@@ -0,0 +1,190 @@
+# orders/notifications.py
+"""
+Order notifications through a transactional outbox.
+
+``place_order`` calls ``enqueue_order_notifications`` inside the checkout
+transaction, so an order and its Notification rows commit (or roll back)
+together, and checkout costs one extra INSERT no matter how slow the
+channels are. The ``send_notifications`` worker then:
+
+1. claims a batch of due rows with one conditional UPDATE that stamps them
+   with its own token and a lease (``claimed_until``), so concurrent
+   workers never send the same row, and rows held by a crashed worker are
+   picked up again once the lease runs out;
+2. sends the batch through the channel transports on a bounded thread
+   pool;
+3. records the outcome. Sent rows are marked in one UPDATE. A failed row
+   is retried with exponential backoff until ``MAX_ATTEMPTS``, then marked
+   "failed" with its last error.
+
+Transports are configured per channel in ``ORDER_NOTIFICATIONS['TRANSPORTS']``
+as dotted paths to classes with a ``send(notification)`` method that
+raises on failure. ``StubTransport`` delivers nothing and keeps what it was
+given in ``StubTransport.outbox``, for offline development and tests.
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Notification
+
+DEFAULTS = {
+    'TRANSPORTS': {
+        'email': 'orders.notifications.EmailTransport',
+        'whatsapp': 'orders.notifications.StubTransport',
+        'webhook': 'orders.notifications.StubTransport',
+    },
+    'BATCH_SIZE': 50,
+    'CONCURRENCY': 8,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 30,       # seconds before the first retry, doubled each time
+    'MAX_RETRY_DELAY': 3600,
+    'LEASE': 300,            # seconds a claimed batch stays reserved to its worker
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'ORDER_NOTIFICATIONS', {})}
+
+
+# ----------------------------------------------------------------------
+# Transports
+# ----------------------------------------------------------------------
+class StubTransport:
+    """Sends nothing; appends each notification to ``outbox`` (like mail.outbox)."""
+    outbox = []
+
+    def send(self, notification):
+        self.outbox.append(notification)
+
+
+class EmailTransport:
+    """Sends through Django's EMAIL_BACKEND."""
+
+    def send(self, notification):
+        send_mail(notification.subject, notification.body, None, [notification.recipient])
+
+
+def get_transports():
+    return {channel: import_string(path)() for channel, path in config()['TRANSPORTS'].items()}
+
+
+# ----------------------------------------------------------------------
+# Enqueue (inside the checkout transaction)
+# ----------------------------------------------------------------------
+def _order_lines(order, items):
+    lines = [f"- {item.quantity} x {item.product_name} = ₦{item.subtotal()}" for item in items]
+    lines.append(f"Total: ₦{order.total()}")
+    return "\n".join(lines)
+
+
+def enqueue_order_notifications(order, items, vendor):
+    """Queue the messages about a new order. Returns the created rows."""
+    notifications = []
+    if order.customer_email:
+        notifications.append(Notification(
+            order=order,
+            channel='email',
+            recipient=order.customer_email,
+            subject=f"Your order #{order.id} at {vendor.store_name}",
+            body=(
+                f"Hi {order.customer_name},\n\n"
+                f"Thanks for your order at {vendor.store_name}.\n\n"
+                f"{_order_lines(order, items)}\n"
+            ),
+        ))
+    if vendor.whatsapp_number:
+        notifications.append(Notification(
+            order=order,
+            channel='whatsapp',
+            recipient=vendor.whatsapp_number,
+            body=(
+                f"New order #{order.id} from {order.customer_name} ({order.customer_phone})\n"
+                f"{_order_lines(order, items)}"
+            ),
+        ))
+    return Notification.objects.bulk_create(notifications)
+
+
+# ----------------------------------------------------------------------
+# Worker
+# ----------------------------------------------------------------------
+def claim_batch(batch_size, now=None):
+    """Reserve up to ``batch_size`` due notifications for this worker."""
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    due = Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', claimed_until__lt=now)
+    ids = list(
+        Notification.objects.filter(due).order_by('next_attempt_at')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    Notification.objects.filter(due, pk__in=ids).update(
+        status='sending',
+        claim_token=token,
+        claimed_until=now + timedelta(seconds=config()['LEASE']),
+        attempts=F('attempts') + 1,
+    )
+    return list(Notification.objects.filter(claim_token=token).select_related('order'))
+
+
+def retry_delay(attempts):
+    conf = config()
+    return timedelta(seconds=min(conf['RETRY_DELAY'] * 2 ** (attempts - 1), conf['MAX_RETRY_DELAY']))
+
+
+def deliver(notifications, concurrency=None, transports=None):
+    """
+    Send claimed ``notifications`` on at most ``concurrency`` threads and
+    record the outcome. Returns ``(sent, failed)`` counts.
+    """
+    conf = config()
+    transports = transports or get_transports()
+
+    def send(notification):
+        try:
+            transports[notification.channel].send(notification)
+        except Exception as exc:
+            return notification, exc
+        return notification, None
+
+    with ThreadPoolExecutor(max_workers=concurrency or conf['CONCURRENCY']) as pool:
+        results = list(pool.map(send, notifications))
+
+    # Outcomes are written from this thread, after all sends returned
+    now = timezone.now()
+    sent = [n.pk for n, error in results if error is None]
+    tokens = {n.claim_token for n in notifications}
+    Notification.objects.filter(pk__in=sent, claim_token__in=tokens).update(
+        status='sent', sent_at=now, claim_token='', claimed_until=None, last_error='',
+    )
+    failed = 0
+    for notification, error in results:
+        if error is None:
+            continue
+        failed += 1
+        gave_up = notification.attempts >= conf['MAX_ATTEMPTS']
+        Notification.objects.filter(pk=notification.pk, claim_token=notification.claim_token).update(
+            status='failed' if gave_up else 'pending',
+            next_attempt_at=now + retry_delay(notification.attempts),
+            claim_token='',
+            claimed_until=None,
+            last_error=f"{type(error).__name__}: {error}",
+        )
+    return len(sent), failed
+
+
+def process_batch(batch_size=None, concurrency=None, now=None):
+    """Claim and deliver one batch. Returns ``(claimed, sent, failed)``."""
+    batch = claim_batch(batch_size or config()['BATCH_SIZE'], now=now)
+    if not batch:
+        return 0, 0, 0
+    sent, failed = deliver(batch, concurrency)
+    return len(batch), sent, failed
@@ -0,0 +1,235 @@
+# orders/rollups.py
+"""
+Daily sales rollups (``DailySales``) for the vendor dashboard.
+
+Each order event adds a delta to its vendor's row for the day the order
+was placed (local date). The delta is one ``UPDATE ... SET col = col + n``,
+or an INSERT if the row doesn't exist yet, and it runs in the same
+transaction as the order change:
+
+- ``order_placed``: ``place_order``
+- ``status_changed``:
+  - ``release_expired_reservations``
+  - ``Order.save()`` with a new status (admin, vendor pages), through
+    ``orders.signals``
+- ``order_deleted``: ``Order.delete()`` and queryset deletes, through
+  ``orders.signals``
+
+Nothing else updates the rows. Orders created or edited any other way
+(raw SQL, ``QuerySet.update``, data imports) aren't counted until
+``manage.py backfill_sales_rollups`` recomputes the rows from
+Order/OrderItem.
+
+``dashboard_summary`` reads the last 60 days of rows plus one aggregate
+over the vendor's rollup rows, which grow by one row per trading day.
+The dashboard's cost doesn't depend on how many orders the vendor has.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Order, OrderItem, day_start
+
+STATUSES = [value for value, _ in Order.STATUS_CHOICES]
+OPEN_STATUSES = ['pending', 'confirmed', 'shipped']
+CHART_DAYS = 14
+
+
+def order_day(order_created_at):
+    return timezone.localdate(order_created_at)
+
+
+# ----------------------------------------------------------------------
+# Incremental updates
+# ----------------------------------------------------------------------
+def apply_delta(vendor_id, day, **deltas):
+    """Add ``deltas`` (column -> amount) to the vendor's row for ``day``."""
+    deltas = {column: amount for column, amount in deltas.items() if amount}
+    if not deltas:
+        return
+    rows = DailySales.objects.filter(vendor_id=vendor_id, day=day)
+    increments = {column: F(column) + amount for column, amount in deltas.items()}
+    if rows.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            DailySales.objects.create(vendor_id=vendor_id, day=day, **deltas)
+    except IntegrityError:
+        # Another transaction created the row first
+        rows.update(**increments)
+
+
+def _counted(status):
+    """Do orders in ``status`` count towards revenue and units?"""
+    return status != 'cancelled'
+
+
+def order_placed(order, items):
+    units = sum(item.quantity for item in items)
+    counted = _counted(order.status)
+    apply_delta(
+        order.vendor_id, order_day(order.created_at),
+        orders=1,
+        revenue_cents=order.total_cents if counted else 0,
+        units=units if counted else 0,
+        **{order.status: 1},
+    )
+
+
+def status_changed(vendor_id, created_at, total_cents, old, new, units=0):
+    """
+    Move an order from ``old`` to ``new`` status in its day's row.
+    ``units`` (the order's item count) only matters when the change
+    cancels or un-cancels the order; it may be a callable so the items
+    are only counted then.
+    """
+    if old == new:
+        return
+    deltas = {old: -1, new: 1}
+    sign = _counted(new) - _counted(old)
+    if sign:
+        deltas['revenue_cents'] = sign * total_cents
+        deltas['units'] = sign * (units() if callable(units) else units)
+    apply_delta(vendor_id, order_day(created_at), **deltas)
+
+
+def order_deleted(vendor_id, created_at, total_cents, status, units):
+    """
+    Take a deleted order out of its day's row. Only an existing row is
+    updated: without one there is nothing to undo, and when the vendor is
+    being deleted too a new row would point at a deleted vendor.
+    """
+    counted = _counted(status)
+    deltas = {
+        'orders': -1, status: -1,
+        'revenue_cents': -total_cents if counted else 0,
+        'units': -units if counted else 0,
+    }
+    DailySales.objects.filter(vendor_id=vendor_id, day=order_day(created_at)).update(
+        **{column: F(column) + amount for column, amount in deltas.items() if amount}
+    )
+
+
+def order_units(order_id):
+    return OrderItem.objects.filter(order_id=order_id).aggregate(units=Sum('quantity'))['units'] or 0
+
+
+# ----------------------------------------------------------------------
+# Backfill
+# ----------------------------------------------------------------------
+def compute(orders):
+    """``{(vendor_id, day): {column: value}}`` recomputed from ``orders``."""
+    tz = timezone.get_current_timezone()
+    counted = ~Q(status='cancelled')
+    rows = {}
+    per_day = (
+        orders.annotate(day=TruncDate('created_at', tzinfo=tz))
+        .values('vendor_id', 'day')
+        .annotate(
+            orders=Count('id'),
+            revenue_cents=Sum('total_cents', filter=counted, default=0),
+            **{status: Count('id', filter=Q(status=status)) for status in STATUSES},
+        )
+        .order_by()
+    )
+    for row in per_day:
+        key = row.pop('vendor_id'), row.pop('day')
+        rows[key] = {**row, 'units': 0}
+    units = (
+        OrderItem.objects.filter(order__in=orders.filter(counted))
+        .annotate(day=TruncDate('order__created_at', tzinfo=tz))
+        .values('order__vendor_id', 'day')
+        .annotate(units=Sum('quantity'))
+        .order_by()
+    )
+    for row in units:
+        rows[row['order__vendor_id'], row['day']]['units'] = row['units']
+    return rows
+
+
+def backfill(vendor=None, since=None):
+    """
+    Recompute the rollup rows of ``vendor`` (all vendors if None) from
+    ``since`` (a date; all history if None). Returns the number of rows written.
+    """
+    orders = Order.objects.all()
+    existing = DailySales.objects.all()
+    if vendor is not None:
+        orders = orders.filter(vendor=vendor)
+        existing = existing.filter(vendor=vendor)
+    if since is not None:
+        orders = orders.filter(created_at__gte=day_start(since))
+        existing = existing.filter(day__gte=since)
+    with transaction.atomic():
+        rows = compute(orders)
+        existing.delete()
+        DailySales.objects.bulk_create(
+            [DailySales(vendor_id=vendor_id, day=day, **values) for (vendor_id, day), values in rows.items()],
+            batch_size=1000,
+        )
+    return len(rows)
+
+
+# ----------------------------------------------------------------------
+# Dashboard
+# ----------------------------------------------------------------------
+def _change(current, previous):
+    if not previous:
+        return None
+    return round((current - previous) * 100 / previous)
+
+
+def dashboard_summary(vendor, today=None):
+    """
+    Everything the dashboard widgets show, from the rollup table only:
+    two small reads whatever the vendor's order history.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=59)
+    recent = {
+        row.day: row
+        for row in DailySales.objects.filter(vendor=vendor, day__gte=start, day__lte=today)
+    }
+    lifetime = DailySales.objects.filter(vendor=vendor).aggregate(
+        orders=Sum('orders', default=0),
+        revenue_cents=Sum('revenue_cents', default=0),
+        units=Sum('units', default=0),
+        **{status: Sum(status, default=0) for status in STATUSES},
+    )
+
+    def window(first, last):
+        rows = [recent[day] for day in recent if first <= day <= last]
+        return {
+            'orders': sum(r.orders for r in rows),
+            'revenue_cents': sum(r.revenue_cents for r in rows),
+            'units': sum(r.units for r in rows),
+        }
+
+    last_30 = window(today - timedelta(days=29), today)
+    previous_30 = window(start, today - timedelta(days=30))
+    chart = []
+    for offset in range(CHART_DAYS - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        row = recent.get(day)
+        chart.append({'day': day, 'revenue_cents': row.revenue_cents if row else 0, 'orders': row.orders if row else 0})
+    peak = max((point['revenue_cents'] for point in chart), default=0)
+    for point in chart:
+        point['revenue'] = Decimal(point['revenue_cents']) / 100
+        point['height'] = round(point['revenue_cents'] * 100 / peak) if peak else 0
+
+    return {
+        'today': window(today, today),
+        'last_7': window(today - timedelta(days=6), today),
+        'last_30': last_30,
+        'revenue_change': _change(last_30['revenue_cents'], previous_30['revenue_cents']),
+        'lifetime': lifetime,
+        'lifetime_revenue': Decimal(lifetime['revenue_cents']) / 100,
+        'last_30_revenue': Decimal(last_30['revenue_cents']) / 100,
+        'open_orders': sum(lifetime[status] for status in OPEN_STATUSES),
+        'by_status': [(label, lifetime[value]) for value, label in Order.STATUS_CHOICES],
+        'chart': chart,
+    }
@@ -0,0 +1,216 @@
+# orders/services.py
+"""
+Checkout: turn a Cart into an Order.
+
+Both checkout views (orders.views.checkout_page and
+vendors.views.process_checkout) go through ``place_order`` so an order is
+always written the same way: cart lines loaded with their products in one
+query, the Order plus every OrderItem inserted in one ``bulk_create``, and
+the cart emptied in one statement — all inside a single transaction, so
+its cost (and on SQLite the write-lock hold time) doesn't grow with the
+number of lines.
+
+Stock is reserved in the same transaction with one conditional UPDATE for
+all the lines (``stock = stock - CASE id ... WHERE stock >= CASE id ...``),
+so two shoppers can never both take the last unit; if any line can't be
+covered the whole order is rolled back and ``OutOfStockError`` lists the
+short lines.
+
+A new order is "pending" until the vendor confirms it. There is no payment
+step, so by default it keeps its stock until the vendor acts on it. If
+checkout is gated on payment, set ``ORDER_RESERVATION_MINUTES``. Orders
+then get a ``reserved_until``, and once it passes,
+``release_expired_reservations`` cancels the still-pending order and puts
+the stock back. Orders placed without a TTL are never released.
+
+Every ``place_order`` call is counted in ``config.metrics`` by outcome:
+placed, empty_cart, out_of_stock or error.
+
+Customer and vendor notifications are only queued here (see
+``orders.notifications``); sending them never happens in the request.
+Both functions also update the vendor's daily sales rollup
+(``orders.rollups``) in their transaction.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from config import metrics
+from products import catalog
+from products.models import Product
+from . import rollups
+from .models import Order, OrderItem
+from .notifications import enqueue_order_notifications
+
+
+class CheckoutError(Exception):
+    outcome = 'error'
+
+
+class EmptyCartError(CheckoutError):
+    outcome = 'empty_cart'
+
+
+class OutOfStockError(CheckoutError):
+    outcome = 'out_of_stock'
+
+    def __init__(self, lines):
+        self.lines = lines  # [(product, requested, available), ...]
+        names = ", ".join(
+            f"{product.name} (only {available} left)" for product, _, available in lines
+        )
+        super().__init__(f"Not enough stock for: {names}")
+
+
+RESERVE_BATCH = 150     # lines per stock UPDATE (SQLite's 999-parameter limit)
+
+
+class _Shortfall(Exception):
+    pass
+
+
+def reservation_ttl():
+    """How long an unpaid order holds its stock; None (the default) for no limit."""
+    minutes = getattr(settings, 'ORDER_RESERVATION_MINUTES', None)
+    return None if minutes is None else timedelta(minutes=minutes)
+
+
+def reserve_stock(lines):
+    """
+    Atomically take ``quantity`` off each product's stock. Must run inside
+    a transaction; raises OutOfStockError (rolling everything back) if any
+    product can't cover its line. Lines for the same product are added up.
+    """
+    totals = {}
+    for product, quantity in lines:
+        product, total = totals.get(product.pk, (product, 0))
+        totals[product.pk] = (product, total + quantity)
+    lines = list(totals.values())
+    short = []
+    for start in range(0, len(lines), RESERVE_BATCH):
+        short += _reserve_batch(lines[start:start + RESERVE_BATCH])
+    if short:
+        raise OutOfStockError(short)
+
+
+def _reserve_batch(lines):
+    """Reserve ``lines`` in one UPDATE; ``[(product, requested, available)]`` if any fell short."""
+    quantities = {product.pk: quantity for product, quantity in lines}
+    wanted = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    try:
+        # Savepoint: a partial update is undone before the shortfall is read
+        with transaction.atomic():
+            taken = Product.objects.filter(pk__in=quantities, stock__gte=wanted)\
+                        .update(stock=F('stock') - wanted)
+            if taken != len(quantities):
+                raise _Shortfall
+    except _Shortfall:
+        available = dict(Product.objects.filter(pk__in=quantities).values_list('pk', 'stock'))
+        return [
+            (product, quantity, available.get(product.pk, 0))
+            for product, quantity in lines if available.get(product.pk, 0) < quantity
+        ]
+    return []
+
+
+def release_stock(order_items):
+    for item in order_items:
+        if item.product_id:
+            Product.objects.filter(pk=item.product_id).update(stock=F('stock') + item.quantity)
+
+
+def to_cents(amount):
+    return int(amount * 100)
+
+
+def place_order(cart, *, customer_name, customer_phone, customer_address=None,
+                customer_email=None, notes=None):
+    """Create an Order from ``cart`` and empty the cart. Returns ``(order, items)``."""
+    try:
+        order, items = _place_order(
+            cart, customer_name=customer_name, customer_phone=customer_phone,
+            customer_address=customer_address, customer_email=customer_email, notes=notes,
+        )
+    except Exception as exc:
+        metrics.CHECKOUTS.inc(outcome=getattr(exc, 'outcome', 'error'))
+        raise
+    metrics.CHECKOUTS.inc(outcome='placed')
+    return order, items
+
+
+def _place_order(cart, *, customer_name, customer_phone, customer_address, customer_email, notes):
+    with transaction.atomic():
+        summary = cart.summary()
+        if not summary:
+            raise EmptyCartError("Your cart is empty.")
+        ttl = reservation_ttl()
+
+        # Fixed (pk) order so concurrent checkouts take row locks consistently
+        reserve_stock(sorted(
+            ((item.product, item.quantity) for item in summary.items),
+            key=lambda line: line[0].pk,
+        ))
+
+        order = Order.objects.create(
+            vendor_id=cart.vendor_id,
+            customer_name=customer_name,
+            customer_phone=customer_phone,
+            customer_address=customer_address,
+            customer_email=customer_email or None,
+            notes=notes,
+            reserved_until=timezone.now() + ttl if ttl else None,
+            total_cents=sum(to_cents(item.product.price) * item.quantity for item in summary.items),
+        )
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                product_name=item.product.name,
+                unit_price_cents=to_cents(item.product.price),
+                quantity=item.quantity,
+            )
+            for item in summary.items
+        ])
+        # Outbox rows and the dashboard's daily totals commit with the order
+        enqueue_order_notifications(order, items, cart.vendor)
+        rollups.order_placed(order, items)
+        cart.clear()
+        # Stock moved under the storefront grid's "Low Stock" badges
+        catalog.bump(cart.vendor_id)
+
+    return order, items
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """
+    Cancel pending orders whose reservation has lapsed and return their
+    stock. Only orders placed with ``ORDER_RESERVATION_MINUTES`` set have
+    a reservation. Each order is claimed with a conditional UPDATE, so concurrent
+    runs never release the same order twice. Returns the number released.
+    """
+    now = now or timezone.now()
+    expired = list(
+        Order.objects.filter(status='pending', reserved_until__lt=now)
+        .values_list('id', 'vendor_id', 'created_at', 'total_cents')[:batch_size]
+    )
+    released = 0
+    for order_id, vendor_id, created_at, total_cents in expired:
+        with transaction.atomic():
+            claimed = Order.objects.filter(pk=order_id, status='pending', reserved_until__lt=now)\
+                          .update(status='cancelled', reserved_until=None)
+            if claimed:
+                items = list(OrderItem.objects.filter(order_id=order_id))
+                release_stock(items)
+                rollups.status_changed(
+                    vendor_id, created_at, total_cents, 'pending', 'cancelled',
+                    units=sum(item.quantity for item in items),
+                )
+                catalog.bump(vendor_id)
+                released += 1
+    return released
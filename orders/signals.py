@@ -0,0 +1,49 @@
+# orders/signals.py
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import rollups
+from .models import Order
+
+
+# ----------------------------------------------------------------------
+# Daily sales rollups (orders/rollups.py)
+# ----------------------------------------------------------------------
+@receiver(pre_save, sender=Order)
+def remember_status(sender, instance, using, **kwargs):
+    # Read from the table, not the instance: it may be stale or refreshed
+    instance._saved_status = None
+    if instance.pk:
+        instance._saved_status = Order.objects.using(using).filter(pk=instance.pk)\
+                                     .values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def roll_up_status_change(sender, instance, created, **kwargs):
+    # New orders are counted by place_order, which knows their items
+    old = instance._saved_status
+    if not created and old is not None and old != instance.status:
+        rollups.status_changed(
+            instance.vendor_id, instance.created_at, instance.total_cents, old, instance.status,
+            units=lambda: rollups.order_units(instance.pk),
+        )
+
+
+@receiver(pre_delete, sender=Order)
+def remember_rollup_state(sender, instance, using, **kwargs):
+    # Before the cascade removes the items
+    instance._saved_status, instance._saved_units = None, 0
+    if instance.pk:
+        instance._saved_status = Order.objects.using(using).filter(pk=instance.pk)\
+                                     .values_list('status', flat=True).first()
+        if instance._saved_status not in (None, 'cancelled'):
+            instance._saved_units = rollups.order_units(instance.pk)
+
+
+@receiver(post_delete, sender=Order)
+def roll_up_deletion(sender, instance, **kwargs):
+    if instance._saved_status is not None:
+        rollups.order_deleted(
+            instance.vendor_id, instance.created_at, instance.total_cents,
+            instance._saved_status, instance._saved_units,
+        )
@@ -1,3 +1,381 @@
-from django.test import TestCase
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cart.models import Cart
+from config.testing import QueryBudgetTestCase
+from products.models import Product
+from vendors.models import Vendor
+from .export import export_orders
+from .models import DailySales, Notification, Order, OrderItem
+from .rollups import backfill
+from .notifications import StubTransport, process_batch
+from .services import OutOfStockError, place_order, release_expired_reservations, reserve_stock
+
 
 # Create your tests here.
+class StockReservationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        cls.shoe = Product.objects.create(vendor=cls.vendor, name='Shoe', price=10, stock=3)
+        cls.hat = Product.objects.create(vendor=cls.vendor, name='Hat', price=5, stock=1)
+
+    def make_cart(self, *lines):
+        cart = Cart.objects.create(vendor=self.vendor, session_key='s')
+        for product, quantity in lines:
+            cart.add_product(product, quantity)
+        return cart
+
+    def checkout(self, cart):
+        return place_order(cart, customer_name='Ada', customer_phone='123')
+
+    def test_checkout_decrements_stock(self):
+        self.checkout(self.make_cart((self.shoe, 2), (self.hat, 1)))
+        self.shoe.refresh_from_db()
+        self.hat.refresh_from_db()
+        self.assertEqual((self.shoe.stock, self.hat.stock), (1, 0))
+
+    def test_short_line_rolls_back_whole_order(self):
+        cart = self.make_cart((self.shoe, 2), (self.hat, 2))
+        with self.assertRaises(OutOfStockError) as ctx:
+            self.checkout(cart)
+        self.assertEqual([(p.pk, want, have) for p, want, have in ctx.exception.lines],
+                         [(self.hat.pk, 2, 1)])
+        self.shoe.refresh_from_db()
+        self.assertEqual(self.shoe.stock, 3)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(cart.items.count(), 2)
+
+    def test_checkout_page_renders_form_and_thank_you(self):
+        shopper = Client(HTTP_HOST=f'{self.vendor.slug}.lvh.me')
+        shopper.post(reverse('cart:add_to_cart', args=[self.vendor.slug, self.shoe.pk]))
+        response = shopper.get(reverse('checkout'))
+        self.assertContains(response, 'Shoe × 1')
+        self.assertContains(response, 'Place Order')
+        response = shopper.post(reverse('checkout'), {'name': 'Ada', 'phone': '123', 'address': 'Lagos'})
+        self.assertContains(response, 'Thank you, Ada!')
+        self.assertContains(response, f'Order #{Order.objects.get().pk} has been placed')
+
+    def test_reservation_is_one_update_for_any_number_of_lines(self):
+        products = [Product.objects.create(vendor=self.vendor, name=f'P{i}', price=1, stock=5) for i in range(6)]
+        for lines in ([(products[0], 1)], [(product, 2) for product in products]):
+            with CaptureQueriesContext(connection) as captured, transaction.atomic():
+                reserve_stock(lines)
+            self.assertEqual(len([q for q in captured if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual([p.stock for p in Product.objects.filter(pk__in=[p.pk for p in products]).order_by('pk')],
+                         [2, 3, 3, 3, 3, 3])
+
+    def test_reservation_adds_up_lines_for_the_same_product(self):
+        with self.assertRaises(OutOfStockError) as raised, transaction.atomic():
+            reserve_stock([(self.shoe, 2), (self.shoe, 2)])
+        self.assertEqual(raised.exception.lines, [(self.shoe, 4, 3)])
+
+        with transaction.atomic():
+            reserve_stock([(self.shoe, 1), (self.shoe, 2)])
+        self.shoe.refresh_from_db()
+        self.assertEqual(self.shoe.stock, 0)
+
+    def test_orders_are_not_released_by_default(self):
+        order, _ = self.checkout(self.make_cart((self.shoe, 2)))
+        self.assertIsNone(order.reserved_until)
+        self.assertEqual(release_expired_reservations(now=timezone.now() + timedelta(days=30)), 0)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+
+    @override_settings(ORDER_RESERVATION_MINUTES=30)
+    def test_expired_reservation_is_released_once(self):
+        order, _ = self.checkout(self.make_cart((self.shoe, 2)))
+        self.assertEqual(release_expired_reservations(), 0)
+
+        later = timezone.now() + timedelta(days=1)
+        self.assertEqual(release_expired_reservations(now=later), 1)
+        self.assertEqual(release_expired_reservations(now=later), 0)
+
+        order.refresh_from_db()
+        self.shoe.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertEqual(self.shoe.stock, 3)
+
+
+class FailingTransport:
+    def send(self, notification):
+        raise ConnectionError("gateway down")
+
+
+STUB = 'orders.notifications.StubTransport'
+
+
+@override_settings(ORDER_NOTIFICATIONS={
+    'TRANSPORTS': {'email': STUB, 'whatsapp': STUB},
+    'MAX_ATTEMPTS': 2,
+})
+class NotificationOutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+            whatsapp_number='2340000000',
+        )
+        cls.shoe = Product.objects.create(vendor=cls.vendor, name='Shoe', price=10, stock=3)
+
+    def setUp(self):
+        StubTransport.outbox.clear()
+
+    def checkout(self, quantity=1):
+        cart = Cart.objects.create(vendor=self.vendor, session_key='s')
+        cart.add_product(self.shoe, quantity)
+        return place_order(cart, customer_name='Ada', customer_phone='123',
+                           customer_email='ada@example.com')
+
+    def test_checkout_queues_notifications_in_its_transaction(self):
+        order, _ = self.checkout()
+        self.assertEqual(
+            sorted(order.notifications.values_list('channel', 'recipient', 'status')),
+            [('email', 'ada@example.com', 'pending'), ('whatsapp', '2340000000', 'pending')],
+        )
+        with self.assertRaises(OutOfStockError):
+            self.checkout(quantity=10)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertFalse(StubTransport.outbox)
+
+    def test_worker_delivers_each_notification_once(self):
+        self.checkout()
+        self.assertEqual(process_batch(), (2, 2, 0))
+        self.assertEqual(process_batch(), (0, 0, 0))
+        self.assertEqual(len(StubTransport.outbox), 2)
+        self.assertEqual(Notification.objects.filter(status='sent').count(), 2)
+
+    def test_failed_sends_are_retried_then_given_up(self):
+        self.checkout()
+        with self.settings(ORDER_NOTIFICATIONS={
+            'TRANSPORTS': {'email': f'{__name__}.FailingTransport', 'whatsapp': STUB},
+            'MAX_ATTEMPTS': 2,
+        }):
+            self.assertEqual(process_batch(), (2, 1, 1))
+            email = Notification.objects.get(channel='email')
+            self.assertEqual((email.status, email.attempts), ('pending', 1))
+            self.assertIn('gateway down', email.last_error)
+
+            # Not due until its backoff has passed
+            self.assertEqual(process_batch(), (0, 0, 0))
+            later = timezone.now() + timedelta(hours=2)
+            self.assertEqual(process_batch(now=later), (1, 0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 2))
+
+    def test_abandoned_claim_is_picked_up_after_its_lease(self):
+        self.checkout()
+        Notification.objects.update(status='sending', claim_token='dead',
+                                    claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(process_batch(), (2, 2, 0))
+
+@tag('slow')
+@skipUnless(os.environ.get('RUN_SLOW_TESTS'), "set RUN_SLOW_TESTS=1 to run")
+class CheckoutStressTest(TransactionTestCase):
+    """
+    Many shoppers check out the same product at once through the real
+    checkout view. Every unit must be sold at most once.
+
+    Slow (a minute or more on SQLite), so skipped unless RUN_SLOW_TESTS is
+    set: ``RUN_SLOW_TESTS=1 python manage.py test --tag slow``.
+    """
+    STOCK = 40
+    THREADS = 8
+    CHECKOUTS_PER_THREAD = 8
+
+    def setUp(self):
+        self.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='flash'), store_name='Flash Sale',
+            whatsapp_number='2340000000',
+        )
+        self.product = Product.objects.create(
+            vendor=self.vendor, name='Hot item', price=10, stock=self.STOCK,
+        )
+
+    def shopper(self, results):
+        host = {'HTTP_HOST': f'{self.vendor.slug}.lvh.me'}
+        add_url = f'/cart/{self.vendor.slug}/add/{self.product.id}/'
+        checkout_url = f'/{self.vendor.slug}/checkout/process/'
+        try:
+            for _ in range(self.CHECKOUTS_PER_THREAD):
+                client = Client()
+                client.post(add_url, **host)
+                response = client.post(
+                    checkout_url, {'name': 'A', 'phone': '1', 'address': 'x'}, **host,
+                )
+                results.append(response.status_code == 302 and response['Location'].startswith('https://wa.me/'))
+        finally:
+            connection.close()
+
+    def test_no_oversell_under_concurrent_checkout(self):
+        results = []
+        threads = [threading.Thread(target=self.shopper, args=(results,)) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sold = sum(results)
+        self.product.refresh_from_db()
+        self.assertEqual(len(results), self.THREADS * self.CHECKOUTS_PER_THREAD)
+        self.assertEqual(sold, self.STOCK)
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(Order.objects.count(), sold)
+
+
+class OrderExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='crescent')
+        cls.vendor = Vendor.objects.create(user=cls.user, store_name='Crescent')
+        other = Vendor.objects.create(user=User.objects.create_user(username='other'), store_name='Other')
+
+        def at(day):
+            return timezone.make_aware(datetime(2026, 3, day, 12, 0))
+
+        cls.first = Order.objects.create(
+            vendor=cls.vendor, customer_name='Ada', customer_phone='+2348000000000',
+            total_cents=2500, created_at=at(1),
+        )
+        OrderItem.objects.create(order=cls.first, product_name='Shoe', unit_price_cents=1000, quantity=2)
+        OrderItem.objects.create(order=cls.first, product_name='Sock', unit_price_cents=500, quantity=1)
+        cls.second = Order.objects.create(
+            vendor=cls.vendor, customer_name='=HYPERLINK("x")', customer_phone='1',
+            status='cancelled', created_at=at(2),
+        )
+        Order.objects.create(vendor=other, customer_name='Bob', customer_phone='2', created_at=at(1))
+
+    def export(self, fmt, **filters):
+        return ''.join(export_orders(self.vendor, fmt, **filters))
+
+    def test_csv_has_a_row_per_item(self):
+        with self.assertNumQueries(1):
+            lines = self.export('csv').splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith(f'{self.first.id},2026-03-01T12:00:00-06:00,pending,Ada,+2348000000000,'))
+        self.assertTrue(lines[1].endswith(',25,,,Shoe,10,2,20'))
+        self.assertIn('Sock,5,1,5', lines[2])
+        # Itemless order; formula-like text is defused for spreadsheets
+        self.assertIn('"\'=HYPERLINK(""x"")"', lines[3])
+        self.assertTrue(lines[3].endswith(',,,,,'))
+
+    def test_jsonl_nests_items_and_filters(self):
+        orders = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        self.assertEqual([o['id'] for o in orders], [self.first.id, self.second.id])
+        self.assertEqual([i['product_name'] for i in orders[0]['items']], ['Shoe', 'Sock'])
+        self.assertEqual(orders[1]['items'], [])
+
+        only = self.export('jsonl', status='cancelled').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in only], [self.second.id])
+        day = self.export('jsonl', date_from=date(2026, 3, 2), date_to=date(2026, 3, 2)).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in day], [self.second.id])
+
+    def test_dashboard_endpoint_streams(self):
+        self.client.force_login(self.user)
+        url = reverse('vendors:vendor_orders_export')
+        response = self.client.get(url, {'format': 'csv', 'date_to': '2026-03-01'})
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(body.splitlines()), 3)
+        self.assertEqual(self.client.get(url, {'date_from': 'yesterday'}).status_code, 400)
+
+
+class DailySalesRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='crescent')
+        cls.vendor = Vendor.objects.create(user=cls.user, store_name='Crescent')
+        cls.shoe = Product.objects.create(vendor=cls.vendor, name='Shoe', price=10, stock=100)
+
+    def checkout(self, quantity):
+        cart = Cart.objects.create(vendor=self.vendor, session_key='s')
+        cart.add_product(self.shoe, quantity)
+        return place_order(cart, customer_name='Ada', customer_phone='123')[0]
+
+    def rollup(self):
+        row = DailySales.objects.get(vendor=self.vendor, day=timezone.localdate())
+        return (row.orders, row.revenue_cents, row.units, row.pending, row.confirmed, row.cancelled)
+
+    def rows(self):
+        return list(DailySales.objects.order_by('vendor', 'day').values())
+
+    @override_settings(ORDER_RESERVATION_MINUTES=30)
+    def test_updated_by_every_order_event(self):
+        first = self.checkout(2)
+        second = self.checkout(1)
+        self.assertEqual(self.rollup(), (2, 3000, 3, 2, 0, 0))
+
+        first.status = 'confirmed'
+        first.save()
+        self.assertEqual(self.rollup(), (2, 3000, 3, 1, 1, 0))
+        first.status = 'cancelled'
+        first.save()
+        self.assertEqual(self.rollup(), (2, 1000, 1, 1, 0, 1))
+
+        release_expired_reservations(now=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.rollup(), (2, 0, 0, 0, 0, 2))
+
+        second.refresh_from_db()
+        second.status = 'delivered'
+        second.save()
+        self.assertEqual(self.rollup(), (2, 1000, 1, 0, 0, 1))
+
+        # The incremental rows match a recomputation from the orders
+        incremental = self.rows()
+        self.assertEqual(backfill(), 1)
+        self.assertEqual(self.rows()[0] | {'id': None}, incremental[0] | {'id': None})
+
+    def test_deleted_orders_leave_the_rollup(self):
+        first = self.checkout(2)
+        second = self.checkout(1)
+        second.status = 'cancelled'
+        second.save()
+        first.delete()
+        self.assertEqual(self.rollup(), (1, 0, 0, 0, 0, 1))
+        Order.objects.filter(pk=second.pk).delete()
+        self.assertEqual(self.rollup(), (0, 0, 0, 0, 0, 0))
+
+        self.checkout(3)
+        self.vendor.delete()
+        self.assertEqual(self.rows(), [])
+
+    def test_dashboard_reads_rollups_only(self):
+        self.client.force_login(self.user)
+        self.checkout(1)
+        self.client.get(reverse('vendors:vendor_dashboard'))
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('vendors:vendor_dashboard'))
+        for _ in range(20):
+            self.checkout(1)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('vendors:vendor_dashboard'))
+        self.assertEqual(len(many), len(few))
+        self.assertFalse([q for q in many.captured_queries if '"orders_order"' in q['sql']])
+        self.assertEqual(response.context['sales']['lifetime']['orders'], 21)
+        self.assertContains(response, '₦210.00')
+
+
+class CheckoutQueryBudgetTests(QueryBudgetTestCase):
+    """The checkout form and placing the order cost the same for 1, 10 or 100 lines."""
+
+    def test_checkout(self):
+        self.assertBudget(3, lambda shop: shop.shopper.get(reverse('checkout')))
+        self.assertBudget(22, lambda shop: shop.shopper.post(reverse('checkout'), {
+            'name': 'Ada', 'phone': '08030000000', 'address': 'Lagos',
+        }))
@@ -2,7 +2,10 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import Http404
 from .models import Order, OrderItem
+from django.contrib import messages
+from .services import EmptyCartError, OutOfStockError, place_order
 from cart.models import Cart
+from cart.utils import remember_cart
 from django.views.decorators.http import require_POST
 
 def checkout_page(request):
@@ -15,21 +18,23 @@ def checkout_page(request):
     else:
         session_key = request.session.session_key
         cart = Cart.objects.filter(session_key=session_key, vendor=vendor).first()
-    if not cart or not cart.items.exists():
-        return redirect("view_cart")
+    if not cart or not cart.item_count:
+        return redirect("cart:view_cart", vendor_slug=vendor.slug)
     if request.method == "POST":
         # gather customer details
-        name = request.POST.get("name")
-        phone = request.POST.get("phone")
-        address = request.POST.get("address")
-        email = request.POST.get("email")
-        total_cents = int(cart.total_price() * 100)
-        order = Order.objects.create(vendor=vendor, customer_name=name, customer_phone=phone,
-                                     customer_address=address, customer_email=email, total_cents=total_cents)
-        for item in cart.items.all():
-            OrderItem.objects.create(order=order, product=item.product, product_name=item.product.name,
-                                     unit_price_cents=int(item.product.price * 100), quantity=item.quantity)
-        # clear cart
-        cart.delete()
-        return render(request, "orders/thankyou.html", {"order": order})
-    return render(request, "orders/checkout.html", {"cart": cart, "vendor": vendor})
\ No newline at end of file
+        try:
+            order, items = place_order(
+                cart,
+                customer_name=request.POST.get("name"),
+                customer_phone=request.POST.get("phone"),
+                customer_address=request.POST.get("address"),
+                customer_email=request.POST.get("email"),
+            )
+        except EmptyCartError:
+            return redirect("cart:view_cart", vendor_slug=vendor.slug)
+        except OutOfStockError as exc:
+            messages.error(request, str(exc))
+            return redirect("cart:view_cart", vendor_slug=vendor.slug)
+        remember_cart(request, cart)
+        return render(request, "orders/thankyou.html", {"order": order, "items": items})
+    return render(request, "orders/checkout.html", {"cart": cart, "summary": cart.summary(), "vendor": vendor})
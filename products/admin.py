@@ -3,7 +3,15 @@ from .models import Category, Product
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'parent')
+    list_display = ('get_indented_name', 'parent', 'depth')
+    list_select_related = ('parent',)
+    ordering = ('path',)
+    search_fields = ('name',)
+
+    def get_field_queryset(self, db, db_field, request):
+        if db_field.name == 'parent':
+            return Category.objects.tree()
+        return super().get_field_queryset(db, db_field, request)
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -0,0 +1,320 @@
+# products/bulk.py
+"""
+Streaming bulk import and export of a vendor's products.
+
+Formats are CSV (with a header row) and JSON Lines, one product per row
+or line::
+
+    sku,name,description,price,stock,category,image_url,order_via_whatsapp,is_active
+    TS-001,Tee,Cotton tee,4500.00,12,Clothing > Men > Shirts,,false,true
+
+``import_products`` reads its input lazily, a batch of ``BATCH_SIZE`` rows
+at a time, so memory stays flat however long the file is. Each row is
+validated by ``ProductImportForm``, which has ProductForm's field rules.
+``category`` is a full path ("Clothing > Men") or a unique category name,
+resolved against one in-memory map of the category tree. Blank or missing
+optional columns take the model defaults.
+
+Rows are upserted on ``(vendor, sku)``. Each batch runs in its own
+transaction:
+
+1. one SELECT finds the SKUs that already exist;
+2. SKU-less products claim the ``ID-<pk>`` SKUs an export generated for
+   them (one UPDATE, only when the batch has such SKUs);
+3. one ``bulk_create(update_conflicts=True)`` upserts the batch;
+4. the batch is re-indexed for search;
+5. carts holding an updated product get their totals recomputed
+   (``CartQuerySet.refresh_totals``), in one UPDATE.
+
+The catalog version is bumped once at the end. Bulk writes skip model
+signals, so this module does the signals' work itself. A row that fails
+validation is reported and skipped; it doesn't stop the import.
+
+``export_products`` yields the same format back, read with
+``.iterator()``, so an export can be edited and re-imported. The export
+doesn't write anything. A product added without a SKU is exported with
+one made from its id ("ID-42"), unless the vendor already uses that SKU.
+On re-import, step 2 above gives the product that SKU, so the row updates
+it instead of creating a copy.
+"""
+import csv
+import io
+import json
+import re
+import time
+
+from django.db import transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+from cart.models import Cart
+from config import streaming
+from vendors.forms import ProductImportForm
+from . import catalog, search
+from .models import Category, Product
+
+BATCH_SIZE = 1000
+MAX_ERRORS = 100    # row errors kept for the report; the rest are only counted
+
+COLUMNS = [
+    'sku', 'name', 'description', 'price', 'stock', 'category',
+    'image_url', 'order_via_whatsapp', 'is_active',
+]
+FORMATS = ('csv', 'jsonl')
+CATEGORY_SEPARATOR = ' > '
+
+UPDATE_FIELDS = [
+    'name', 'description', 'price', 'stock', 'category',
+    'image_url', 'order_via_whatsapp', 'is_active',
+]
+TRUE = {'1', 'true', 'yes', 'y', 'on'}
+GENERATED_SKU_PREFIX = 'ID-'
+GENERATED_SKU = re.compile(re.escape(GENERATED_SKU_PREFIX) + r'([0-9]+)')
+
+
+def guess_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+# ----------------------------------------------------------------------
+# Categories
+# ----------------------------------------------------------------------
+def category_paths():
+    """``{category id: "Parent > Child"}`` for the whole tree, in one query."""
+    paths = {}
+    for pk, name, parent_id in Category.objects.tree().values_list('id', 'name', 'parent_id'):
+        # tree() is parent-first, so the parent's path is already known
+        paths[pk] = f"{paths[parent_id]}{CATEGORY_SEPARATOR}{name}" if parent_id in paths else name
+    return paths
+
+
+class CategoryResolver:
+    """Category ids by full path or, when unambiguous, by bare name (case-insensitive)."""
+
+    def __init__(self):
+        self.by_path = {}
+        by_name = {}
+        for pk, path in category_paths().items():
+            self.by_path[self._key(path)] = pk
+            by_name.setdefault(self._key(path.split(CATEGORY_SEPARATOR)[-1]), []).append(pk)
+        self.by_name = {name: ids[0] for name, ids in by_name.items() if len(ids) == 1}
+
+    @staticmethod
+    def _key(text):
+        return CATEGORY_SEPARATOR.join(part.strip().lower() for part in text.split('>'))
+
+    def resolve(self, text):
+        """Category id for ``text`` (None if blank); raises KeyError if unknown."""
+        if text is None or not str(text).strip():
+            return None
+        key = self._key(str(text))
+        if key in self.by_path:
+            return self.by_path[key]
+        return self.by_name[key]
+
+
+# ----------------------------------------------------------------------
+# Reading
+# ----------------------------------------------------------------------
+def read_rows(stream, fmt):
+    """Yield ``(line number, row dict)`` from a binary or text stream."""
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(text, start=1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    row = exc
+                yield number, row
+
+
+def _form_data(row):
+    data = {}
+    for field in ['sku', 'name', 'description', 'price', 'stock', 'image_url']:
+        value = row.get(field)
+        if value is not None and value != '':
+            data[field] = value
+    # Blank optional columns take the model defaults
+    data.setdefault('stock', Product._meta.get_field('stock').default)
+    for field in ('order_via_whatsapp', 'is_active'):
+        value = row.get(field)
+        if value is None or value == '':
+            value = Product._meta.get_field(field).default
+        elif not isinstance(value, bool):
+            value = str(value).strip().lower() in TRUE
+        if value:
+            # Checkbox semantics: present means True, absent means False
+            data[field] = 'on'
+    return data
+
+
+# ----------------------------------------------------------------------
+# Import
+# ----------------------------------------------------------------------
+class ImportResult:
+    def __init__(self):
+        self.rows = self.created = self.updated = self.failed = 0
+        self.errors = []        # [(line, message)], at most MAX_ERRORS
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.rows} rows in {self.elapsed:.1f}s ({self.rate:.0f} rows/s): "
+            f"{self.created} created, {self.updated} updated, {self.failed} failed"
+        )
+
+
+def _validate(vendor, categories, line, row, result):
+    if isinstance(row, Exception):
+        result.error(line, f"invalid JSON: {row}")
+        return None
+    if not isinstance(row, dict):
+        result.error(line, "expected an object")
+        return None
+    form = ProductImportForm(_form_data(row))
+    if not form.is_valid():
+        messages = [f"{field}: {' '.join(errors)}" for field, errors in form.errors.items()]
+        result.error(line, '; '.join(messages))
+        return None
+    product = form.instance
+    product.vendor_id = vendor.pk
+    try:
+        product.category_id = categories.resolve(row.get('category'))
+    except KeyError:
+        result.error(line, f"category: unknown or ambiguous category {row.get('category')!r}")
+        return None
+    return product
+
+
+def _generated_sku(pk):
+    return Concat(Value(GENERATED_SKU_PREFIX), Cast(pk, output_field=CharField()))
+
+
+def _claim_generated_skus(vendor, skus):
+    """
+    Give SKU-less products the ``ID-<pk>`` SKUs in ``skus`` (ones not in use),
+    so their exported rows update them. Returns how many were claimed.
+    """
+    ids = [int(match[1]) for match in map(GENERATED_SKU.fullmatch, skus) if match]
+    if not ids:
+        return 0
+    return vendor.products.filter(pk__in=ids, sku=None).update(sku=_generated_sku('pk'))
+
+
+def _write_batch(vendor, products, result):
+    """Upsert one batch of validated products (unique SKUs) in one transaction."""
+    with transaction.atomic():
+        existing = set(
+            Product.objects.filter(vendor=vendor, sku__in=products).values_list('sku', flat=True)
+        )
+        claimed = _claim_generated_skus(vendor, [sku for sku in products if sku not in existing])
+        # INSERT ... ON CONFLICT (vendor, sku) DO UPDATE: one statement, and
+        # unlike bulk_update's CASE per field, linear in the batch size
+        Product.objects.bulk_create(
+            products.values(),
+            update_conflicts=True,
+            unique_fields=['vendor', 'sku'],
+            update_fields=UPDATE_FIELDS,
+        )
+        # Not every backend returns the ids of upserted rows
+        search.index_products(
+            Product.objects.filter(vendor=vendor, sku__in=products).values_list('id', flat=True)
+        )
+        if existing or claimed:
+            # New products can't be in a cart yet
+            Cart.objects.filter(items__product__vendor=vendor, items__product__sku__in=products)\
+                .distinct().refresh_totals()
+    result.updated += len(existing) + claimed
+    result.created += len(products) - len(existing) - claimed
+
+
+def import_products(vendor, stream, fmt='csv', batch_size=None):
+    """
+    Upsert the products in ``stream`` (CSV or JSONL) into ``vendor``'s
+    catalog, ``batch_size`` rows per transaction. Returns an ImportResult.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    result = ImportResult()
+    categories = CategoryResolver()
+    batch = {}
+    try:
+        for line, row in read_rows(stream, fmt):
+            result.rows += 1
+            product = _validate(vendor, categories, line, row, result)
+            if product is None:
+                continue
+            batch[product.sku] = product   # a repeated SKU: the last row wins
+            if len(batch) >= batch_size:
+                _write_batch(vendor, batch, result)
+                batch = {}
+        if batch:
+            _write_batch(vendor, batch, result)
+    finally:
+        if result.created or result.updated:
+            catalog.bump(vendor.pk)
+        result.elapsed = time.monotonic() - result.started
+    return result
+
+
+# ----------------------------------------------------------------------
+# Export
+# ----------------------------------------------------------------------
+def export_rows(vendor, chunk_size=2000):
+    """Yield the vendor's products as row dicts in COLUMNS order."""
+    paths = category_paths()
+    # Generated SKUs a vendor typed in themselves can't be handed out again
+    taken = set(
+        vendor.products.filter(sku__startswith=GENERATED_SKU_PREFIX).values_list('sku', flat=True)
+    )
+    products = vendor.products.order_by('pk').values_list(
+        'pk', 'sku', 'name', 'description', 'price', 'stock', 'category_id',
+        'image_url', 'order_via_whatsapp', 'is_active',
+    )
+    for pk, sku, name, description, price, stock, category_id, image_url, whatsapp, active in \
+            products.iterator(chunk_size=chunk_size):
+        if not sku:
+            sku = f'{GENERATED_SKU_PREFIX}{pk}'
+            sku = '' if sku in taken else sku
+        yield {
+            'sku': sku,
+            'name': name,
+            'description': description,
+            'price': str(price),
+            'stock': stock,
+            'category': paths.get(category_id, ''),
+            'image_url': image_url or '',
+            'order_via_whatsapp': whatsapp,
+            'is_active': active,
+        }
+
+
+def export_products(vendor, fmt='csv'):
+    """Yield the vendor's catalog as text chunks of CSV or JSONL."""
+    if fmt == 'csv':
+        writer = streaming.csv_writer()
+        yield writer.writerow(COLUMNS)
+        for row in export_rows(vendor):
+            row['order_via_whatsapp'] = str(row['order_via_whatsapp']).lower()
+            row['is_active'] = str(row['is_active']).lower()
+            yield writer.writerow([row[column] for column in COLUMNS])
+    else:
+        for row in export_rows(vendor):
+            yield json.dumps(row, ensure_ascii=False) + '\n'
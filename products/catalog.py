@@ -0,0 +1,128 @@
+# products/catalog.py
+"""
+Catalog versions for cache keys.
+
+Every vendor has a catalog version that ``products.signals`` bumps whenever
+one of its products is saved or deleted, and ``vendors.signals`` bumps when
+the vendor itself changes. Categories are shared by all
+vendors, so they have a single global version. Anything rendered from a
+vendor's catalog (the storefront product grid, its category filter) is
+cached under a key that includes both versions. A bump makes the old entries
+unreachable: nothing is deleted or scanned, and the stale entries simply
+age out of the cache.
+
+Each scope also records when it last changed, which is the Last-Modified
+time of conditional GETs (``products.conditional``). Pages that span every
+store use the ``ALL`` scope, which is bumped along with each vendor.
+
+Versions start at the current time in nanoseconds rather than 1, so a
+version that was evicted and re-created can't land on an old key that is
+still cached. With several worker processes, ``CATALOG_CACHE['ALIAS']`` must
+name a shared backend (memcached, Redis, database) or workers won't see
+each other's bumps.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from config import metrics
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 3600,
+}
+
+CATEGORIES = 'categories'
+ALL = 'all'  # bumped with every vendor, for pages spanning all stores
+
+
+def _settings():
+    return {**DEFAULTS, **getattr(settings, 'CATALOG_CACHE', {})}
+
+
+def get_cache():
+    return caches[_settings()['ALIAS']]
+
+
+def _keys(scope):
+    return f'catalog-version:{scope}', f'catalog-modified:{scope}'
+
+
+def scopes(vendor_id=None):
+    """The scopes a page depends on: its vendor (or every vendor) plus categories."""
+    return (ALL if vendor_id is None else vendor_id), CATEGORIES
+
+
+def state(*scopes):
+    """
+    ``(versions, last_modified)`` for ``scopes``, in one cache round trip:
+    a tuple of each scope's version, and the latest time (epoch seconds)
+    any of them changed.
+    """
+    cache = get_cache()
+    keys = [key for scope in scopes for key in _keys(scope)]
+    found = cache.get_many(keys)
+    now = time.time_ns()
+    for key in keys:
+        if key not in found:
+            # A forgotten modification time restarts at "now", which can
+            # only cost a full response, never a wrong 304
+            initial = now if key.startswith('catalog-version:') else now / 1e9
+            # add() so a concurrent first request doesn't overwrite a bump
+            if not cache.add(key, initial, timeout=None):
+                initial = cache.get(key, initial)
+            found[key] = initial
+    versions = tuple(found[_keys(scope)[0]] for scope in scopes)
+    last_modified = max(found[_keys(scope)[1]] for scope in scopes)
+    return versions, last_modified
+
+
+def versions(vendor_id):
+    """``(vendor version, category version)``."""
+    return state(*scopes(vendor_id))[0]
+
+
+def _bump(*scopes):
+    cache = get_cache()
+    for scope in scopes:
+        version_key, modified_key = _keys(scope)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            cache.set(version_key, time.time_ns(), timeout=None)
+        cache.set(modified_key, time.time(), timeout=None)
+
+
+def bump(vendor_id, using='default'):
+    """
+    Invalidate everything cached for ``vendor_id``'s catalog. Runs after
+    commit so a request can't re-cache the old rows under the new version.
+    """
+    transaction.on_commit(lambda: _bump(vendor_id, ALL), using=using)
+
+
+def bump_categories(using='default'):
+    transaction.on_commit(lambda: _bump(CATEGORIES), using=using)
+
+
+def cache_key(name, vendor_id, params=()):
+    """
+    Key for a fragment of ``vendor_id``'s catalog, varying by ``params``
+    (an iterable of ``(name, value)`` pairs).
+    """
+    vendor_version, category_version = versions(vendor_id)
+    digest = hashlib.sha1(repr(sorted(params)).encode()).hexdigest()
+    return f'catalog:{name}:{vendor_id}:{vendor_version}:{category_version}:{digest}'
+
+
+def get_cached(key):
+    value = get_cache().get(key)
+    metrics.cache_lookup('catalog_fragment', value is not None)
+    return value
+
+
+def set_cached(key, value):
+    get_cache().set(key, value, _settings()['TIMEOUT'])
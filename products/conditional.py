@@ -0,0 +1,92 @@
+# products/conditional.py
+"""
+Conditional GET for catalog pages.
+
+``catalog_condition`` wraps Django's ``condition`` decorator with validators
+that cost a cache lookup, not a query. The catalog scopes a page depends on
+(see ``products.catalog``) provide the versions and the Last-Modified time.
+The ETag hashes those versions together with everything else the page
+shows: the path and query string, who is logged in, the navbar cart count
+and the CSRF cookie that the page's forms post with. A revalidation whose
+catalog hasn't changed gets a 304 before the view runs any query or
+renders any template.
+
+A view whose object can disappear without a catalog bump (a product
+deactivated by a raw update, or moved to another vendor) passes an
+``exists`` check. It repeats the view's 404 conditions as one query before
+any 304, so a stale ETag can't hide the 404.
+
+Pages that will show flash messages are never answered with a 304, so the
+messages are rendered and consumed. Last-Modified is only sent to
+visitors with no per-visitor state (anonymous, empty cart). The timestamp
+can't see a cart or login change, so those visitors revalidate by ETag
+only.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import partial
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.views.decorators.http import condition
+
+from cart.utils import cart_count
+from vendors.resolver import vendor_for_slug
+from . import catalog
+
+
+def request_vendor(request, vendor_slug=None, **kwargs):
+    """The storefront being viewed: the subdomain/custom domain, else the URL slug."""
+    vendor = getattr(request, 'vendor', None)
+    if vendor is None and vendor_slug:
+        vendor = vendor_for_slug(vendor_slug)
+    return vendor
+
+
+def _has_messages(request):
+    # len() doesn't mark the messages as read
+    return bool(len(get_messages(request)))
+
+
+def _validators(request, kwargs, exists=None):
+    """``(etag, last_modified)`` for this request, or ``(None, None)`` to skip."""
+    cached = getattr(request, '_catalog_validators', None)
+    if cached is not None:
+        return cached
+
+    validators = (None, None)
+    if not _has_messages(request) and (exists is None or exists(request, **kwargs)):
+        vendor = request_vendor(request, **kwargs)
+        versions, modified = catalog.state(*catalog.scopes(vendor.pk if vendor else None))
+        user_id = request.user.pk if request.user.is_authenticated else None
+        count = cart_count(request, vendor) if vendor else 0
+        parts = (
+            versions,
+            request.path,
+            sorted(request.GET.lists()),
+            user_id,
+            count,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        )
+        etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+        last_modified = None
+        if user_id is None and not count:
+            last_modified = datetime.fromtimestamp(modified, tz=timezone.utc)
+        validators = (etag, last_modified)
+
+    request._catalog_validators = validators
+    return validators
+
+
+def catalog_condition(view=None, *, exists=None):
+    """
+    Decorate a catalog view so revalidations are answered with a 304.
+    ``exists(request, **kwargs)``, if given, must be true for a 304; when
+    it's false the view runs and raises its 404.
+    """
+    if view is None:
+        return partial(catalog_condition, exists=exists)
+    return condition(
+        etag_func=lambda request, *args, **kwargs: _validators(request, kwargs, exists)[0],
+        last_modified_func=lambda request, *args, **kwargs: _validators(request, kwargs, exists)[1],
+    )(view)
@@ -0,0 +1,126 @@
+# products/images.py
+"""
+Resized derivatives of uploaded images (product photos, vendor logos).
+
+Pages used to send each original upload, often several megapixels, into
+slots a few hundred CSS pixels wide. ``build_derivatives`` writes
+fixed-width WebP and JPEG copies of an upload under ``derivatives/`` in the
+same storage. It records them in the model's ``<field>_derivatives`` JSON
+manifest::
+
+    {"source": "product_images/shoe.jpg", "width": 3024, "height": 4032,
+     "webp": {"240": "derivatives/product_images/9f2c…-240.webp", …},
+     "jpeg": {"240": "derivatives/product_images/9f2c…-240.jpg", …}}
+
+File names start with a hash of the original's bytes, so they never change
+for the same upload and can be cached forever. A manifest whose
+``source`` isn't the current file name is stale; the ``responsive_image``
+template tag then falls back to the original. Derivatives are built by
+``manage.py build_image_derivatives``, never while serving a request.
+"""
+import hashlib
+import io
+import posixpath
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+DEFAULTS = {
+    # "<app_label>.<Model>.<field>": widths in pixels
+    'WIDTHS': {
+        'products.Product.image': [240, 480, 960],
+        'vendors.Vendor.logo': [64, 160, 320],
+    },
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': 80,
+}
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'IMAGE_DERIVATIVES', {})}
+
+
+def image_fields():
+    """``[(model, field_name, widths)]`` for every field that gets derivatives."""
+    fields = []
+    for path, widths in config()['WIDTHS'].items():
+        app_label, model_name, field_name = path.split('.')
+        fields.append((apps.get_model(app_label, model_name), field_name, widths))
+    return fields
+
+
+def encode(image, fmt, quality):
+    """``image`` as ``fmt`` ('jpeg' or 'webp') bytes; JPEG gets a white background."""
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # JPEG has no alpha: flatten onto white
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    options = {'optimize': True} if fmt == 'jpeg' else {'method': 4}
+    buffer = io.BytesIO()
+    image.save(buffer, fmt.upper(), quality=quality, **options)
+    return buffer.getvalue()
+
+
+def build_derivatives(fieldfile, widths):
+    """Write the derivatives of ``fieldfile`` (skipping existing ones); returns the manifest."""
+    conf = config()
+    storage = fieldfile.storage
+    with fieldfile.open('rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    manifest = {'source': fieldfile.name, 'width': image.width, 'height': image.height}
+    folder = posixpath.join('derivatives', posixpath.dirname(fieldfile.name))
+    # Never upscale: widths above the original collapse into the original width
+    targets = sorted({min(width, image.width) for width in widths})
+
+    for fmt in conf['FORMATS']:
+        variants = {}
+        for width in targets:
+            name = posixpath.join(folder, f'{digest}-{width}.{EXTENSIONS[fmt]}')
+            if not storage.exists(name):
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+                storage.save(name, ContentFile(encode(resized, fmt, conf['QUALITY'])))
+            variants[str(width)] = name
+        manifest[fmt] = variants
+    return manifest
+
+
+def is_current(fieldfile, manifest):
+    return bool(fieldfile) and bool(manifest) and manifest.get('source') == fieldfile.name
+
+
+def update_derivatives(model, field_name, widths, force=False):
+    """
+    Build derivatives for every row whose manifest is missing or stale.
+    Yields ``(instance, manifest)`` for each row it wrote.
+    """
+    manifest_field = f'{field_name}_derivatives'
+    # Collected up front: SQLite shouldn't UPDATE a table mid-iteration
+    rows = list(
+        model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        .order_by('pk').values_list('pk', field_name, manifest_field)
+    )
+    for pk, name, manifest in rows:
+        if not force and (manifest or {}).get('source') == name:
+            continue
+        instance = model(pk=pk, **{field_name: name})
+        fieldfile = getattr(instance, field_name)
+        try:
+            manifest = build_derivatives(fieldfile, widths)
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            # Unreadable upload: remember it so it isn't retried every run
+            manifest = {'source': name, 'error': f'{type(exc).__name__}: {exc}'}
+        # Only if the upload wasn't replaced while we were working
+        model.objects.filter(pk=pk, **{field_name: name}).update(**{manifest_field: manifest})
+        setattr(instance, manifest_field, manifest)
+        yield instance, manifest
@@ -0,0 +1,57 @@
+# products/management/commands/build_image_derivatives.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import catalog
+from products.images import image_fields, update_derivatives
+from products.models import Product
+from vendors import resolver
+from vendors.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Build resized WebP/JPEG derivatives for uploaded product images and vendor logos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild manifests that look current.")
+        parser.add_argument(
+            '--loop', type=float, default=0, metavar='SECONDS',
+            help="Keep running, checking for new uploads every SECONDS (default: run once).",
+        )
+
+    def handle(self, *args, **options):
+        force = options['force']
+        while True:
+            for model, field_name, widths in image_fields():
+                started = time.monotonic()
+                done = [
+                    instance.pk
+                    for instance, manifest in update_derivatives(model, field_name, widths, force=force)
+                    if not self.report_error(instance, field_name, manifest)
+                ]
+                if done:
+                    self.invalidate(model, done)
+                    self.stdout.write(
+                        f"{model._meta.label}.{field_name}: {len(done)} image(s) "
+                        f"in {time.monotonic() - started:.2f}s"
+                    )
+            if not options['loop']:
+                break
+            force = False
+            time.sleep(options['loop'])
+
+    def report_error(self, instance, field_name, manifest):
+        if 'error' in manifest:
+            self.stderr.write(f"{instance._meta.label} #{instance.pk} {field_name}: {manifest['error']}")
+            return True
+        return False
+
+    def invalidate(self, model, pks):
+        # Manifests are written with update(), so refresh what signals would have
+        if model is Product:
+            for vendor_id in set(Product.objects.filter(pk__in=pks).values_list('vendor_id', flat=True)):
+                catalog.bump(vendor_id)
+        elif model is Vendor:
+            for vendor in Vendor.objects.filter(pk__in=pks):
+                resolver.invalidate_vendor(vendor)
@@ -0,0 +1,26 @@
+# products/management/commands/export_products.py
+from django.core.management.base import BaseCommand, CommandError
+
+from products import bulk
+from vendors.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Stream a vendor's products as CSV or JSONL (the import_products format)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', required=True, help="Vendor slug.")
+        parser.add_argument('--format', choices=bulk.FORMATS, default='csv')
+        parser.add_argument('-o', '--output', default='-', help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        vendor = Vendor.objects.filter(slug=options['vendor']).first()
+        if vendor is None:
+            raise CommandError(f"No vendor with slug {options['vendor']!r}.")
+        chunks = bulk.export_products(vendor, options['format'])
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            f.writelines(chunks)
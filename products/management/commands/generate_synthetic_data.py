@@ -0,0 +1,39 @@
+# products/management/commands/generate_synthetic_data.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products import synthetic
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic synthetic marketplace (vendors, categories, products, carts, orders)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=sorted(synthetic.PRESETS), default='small')
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--vendors', type=int)
+        parser.add_argument('--products', type=int)
+        parser.add_argument('--depth', type=int, help="Category levels below the root.")
+        parser.add_argument('--fanout', type=int, help="Children per category below the departments.")
+        parser.add_argument('--months', type=int, help="Months of order history.")
+        parser.add_argument('--orders-per-day', type=int)
+        parser.add_argument('--carts', type=int)
+        parser.add_argument('--batch-size', type=int, help="Rows per INSERT.")
+        parser.add_argument('--end', type=date.fromisoformat,
+                            help="Last day of order history, YYYY-MM-DD (default: today).")
+
+    def handle(self, *args, **options):
+        spec = synthetic.spec_for(
+            options['preset'],
+            **{field: options[field] for field in (
+                'seed', 'vendors', 'products', 'depth', 'fanout', 'months',
+                'orders_per_day', 'carts', 'batch_size',
+            )},
+        )
+        self.stdout.write(f"Generating {options['preset']!r}: {spec}")
+        try:
+            result = synthetic.generate(spec, end=options['end'], log=self.stdout.write)
+        except synthetic.AlreadyGenerated as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(str(result)))
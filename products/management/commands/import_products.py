@@ -0,0 +1,40 @@
+# products/management/commands/import_products.py
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products import bulk
+from vendors.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Upsert a vendor's products (by SKU) from a CSV or JSONL file, streaming in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin.")
+        parser.add_argument('--vendor', required=True, help="Vendor slug.")
+        parser.add_argument('--format', choices=bulk.FORMATS, help="Default: from the file extension (csv).")
+        parser.add_argument('--batch-size', type=int, default=bulk.BATCH_SIZE, help="Rows per transaction.")
+
+    def handle(self, *args, **options):
+        vendor = Vendor.objects.filter(slug=options['vendor']).first()
+        if vendor is None:
+            raise CommandError(f"No vendor with slug {options['vendor']!r}.")
+        fmt = options['format'] or bulk.guess_format(options['path'])
+
+        if options['path'] == '-':
+            result = bulk.import_products(vendor, sys.stdin.buffer, fmt, options['batch_size'])
+        else:
+            try:
+                stream = open(options['path'], 'rb')
+            except OSError as exc:
+                raise CommandError(exc)
+            with stream:
+                result = bulk.import_products(vendor, stream, fmt, options['batch_size'])
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more errors")
+        style = self.style.SUCCESS if not result.failed else self.style.WARNING
+        self.stdout.write(style(str(result)))
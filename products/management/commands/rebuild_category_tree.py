@@ -0,0 +1,24 @@
+# products/management/commands/rebuild_category_tree.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute every category's materialized path and depth from its parent links."
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                changed = Category.objects.rebuild()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt category tree: {changed} of {Category.objects.count()} paths changed "
+            f"in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from products import search
+
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    search.create_index(schema_editor.connection)
+    search.rebuild_index(schema_editor.connection.alias)
+
+
+def drop_search_index(apps, schema_editor):
+    from products import search
+
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    search.drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_alter_category_options_alter_category_parent'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_for(pk):
+        if pk not in paths:
+            parent = parents[pk]
+            paths[pk] = (path_for(parent) if parent else '') + f"{pk:07d}/"
+        return paths[pk]
+
+    categories = [
+        Category(id=pk, path=path_for(pk), depth=path_for(pk).count('/') - 1)
+        for pk in parents
+    ]
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_product_vendor_active_created_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_image_derivatives'),
+        ('vendors', '0005_vendor_logo_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('vendor', 'sku'), name='product_vendor_sku'),
+        ),
+    ]
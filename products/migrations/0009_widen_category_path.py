@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def rebuild_paths(width):
+    def rebuild(apps, schema_editor):
+        Category = apps.get_model('products', 'Category')
+        parents = dict(Category.objects.values_list('id', 'parent_id'))
+        paths = {}
+
+        def path_for(pk):
+            if pk not in paths:
+                parent = parents[pk]
+                paths[pk] = (path_for(parent) if parent else '') + f"{pk:0{width}d}/"
+            return paths[pk]
+
+        categories = [Category(id=pk, path=path_for(pk)) for pk in parents]
+        Category.objects.bulk_update(categories, ['path'], batch_size=500)
+    return rebuild
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_sku'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_paths(10), rebuild_paths(7)),
+    ]
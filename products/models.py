@@ -1,45 +1,200 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Q, Subquery, Value
+from django.db.models.functions import Concat, Length, Substr
 from vendors.models import Vendor
 
 # products/models.py
+# Ten digits hold any 32-bit id. A wider id would sort out of place, so
+# path_segment() refuses it rather than break tree() silently.
+PATH_SEGMENT_WIDTH = 10
+
+
+def path_segment(pk):
+    """Fixed-width segment so paths sort parent-first, then siblings by id."""
+    segment = f"{pk:0{PATH_SEGMENT_WIDTH}d}/"
+    if len(segment) > PATH_SEGMENT_WIDTH + 1:
+        raise ValueError(f"Category id {pk} doesn't fit a {PATH_SEGMENT_WIDTH}-digit path segment.")
+    return segment
+
+
+class CategoryQuerySet(models.QuerySet):
+    def tree(self):
+        """Whole tree in depth-first order, in one query (ORDER BY path)."""
+        return self.order_by('path')
+
+    def subtree(self, category):
+        """
+        ``category`` and all of its descendants, as one range read on the
+        path index. ``category`` may be a Category or a pk; for a pk the
+        bounds are scalar subqueries, so it still costs a single query.
+        """
+        if isinstance(category, Category):
+            return self.filter(path__gte=category.path, path__lt=subtree_upper_bound(category.path))
+        root = Category.objects.filter(pk=category)
+        upper = Concat(Substr('path', 1, Length('path') - 1), Value('0'))
+        return self.filter(
+            path__gte=Subquery(root.values('path')),
+            path__lt=Subquery(root.annotate(upper=upper).values('upper')),
+        )
+
+    def with_ancestors(self):
+        """These categories plus every ancestor, so a filter list can offer the parents too."""
+        ids = {
+            int(segment)
+            for path in self.values_list('path', flat=True)
+            for segment in path.split('/') if segment
+        }
+        return Category.objects.filter(pk__in=ids)
+
+    def rebuild(self):
+        """
+        Recompute every path and depth from the parent links, e.g. after a
+        raw ``update(parent=...)`` that bypassed save(). Returns the number
+        of rows that changed; raises ValueError if the parents form a cycle.
+        """
+        rows = {pk: (parent_id, path, depth)
+                for pk, parent_id, path, depth in Category.objects.values_list('id', 'parent_id', 'path', 'depth')}
+        paths = {}
+
+        def path_for(pk):
+            chain = []
+            while pk is not None and pk not in paths:
+                if pk in chain:
+                    raise ValueError(f"Category parents form a cycle: {chain[chain.index(pk):]}")
+                chain.append(pk)
+                pk = rows[pk][0]
+            prefix = paths.get(pk, '')
+            for node in reversed(chain):
+                prefix = paths[node] = prefix + path_segment(node)
+            return paths[chain[0]] if chain else paths[pk]
+
+        changed = []
+        for pk, (_, old_path, old_depth) in rows.items():
+            path = path_for(pk)
+            depth = path.count('/') - 1
+            if (path, depth) != (old_path, old_depth):
+                changed.append(Category(pk=pk, path=path, depth=depth))
+        Category.objects.bulk_update(changed, ['path', 'depth'], batch_size=500)
+        return len(changed)
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE)
 
+    # Materialized path: "0000000001/0000000004/" for category 4 under category 1.
+    # Maintained by save(); depth is the number of ancestors.
+    path = models.CharField(max_length=255, db_index=True, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     @property
     def get_indented_name(self):
-        level = 0
-        p = self.parent
-        while p:
-            level += 1
-            p = p.parent
-        return "└" + "─" * level + " " + self.name
+        return "└" + "─" * self.depth + " " + self.name
 
     def get_depth(self):
-        level = 0
-        p = self.parent
-        while p:
-            level += 1
-            p = p.parent
-        return level
-    
+        return self.depth
+
+    def get_descendants(self, include_self=True):
+        categories = Category.objects.subtree(self)
+        return categories if include_self else categories.exclude(pk=self.pk)
+
+    def clean(self):
+        if self.pk and self.parent_id:
+            if self.parent_id == self.pk or self.parent.path.startswith(self.path):
+                raise ValidationError({'parent': "A category can't be moved under itself."})
+
+    def save(self, *args, **kwargs):
+        # Read the parent's path from the table: a cached self.parent may
+        # predate a move of the parent itself.
+        parent_path = ''
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id)\
+                              .values_list('path', flat=True).first() or ''
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'path', 'depth'}
+
+        if self.pk is None:
+            # The path ends with our own id, which we only get on insert
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self.path = parent_path + path_segment(self.pk)
+                self.depth = self.path.count('/') - 1
+                Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            return
+
+        old_path, old_depth = Category.objects.filter(pk=self.pk)\
+                                  .values_list('path', 'depth').first() or ('', 0)
+        if old_path and parent_path.startswith(old_path):
+            raise ValueError("A category can't be moved under itself.")
+
+        self.path = parent_path + path_segment(self.pk)
+        self.depth = self.path.count('/') - 1
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                # Reparented: rewrite the whole subtree in one UPDATE
+                Category.objects.filter(path__gt=old_path, path__lt=subtree_upper_bound(old_path)).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (self.depth - old_depth),
+                )
+
+
+def subtree_upper_bound(path):
+    # Paths are digits and "/"; "0" sorts right after "/", so every
+    # descendant of "…/" falls in [path, path[:-1] + "0").
+    return path[:-1] + '0'
+
+
+class ProductQuerySet(models.QuerySet):
+    def in_category(self, category):
+        """Products in ``category`` (a Category or pk) or any of its subcategories."""
+        return self.filter(category__in=Category.objects.subtree(category).values('pk'))
 
 
 class Product(models.Model):
     vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='products')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    # The vendor's own product code; bulk imports upsert on (vendor, sku).
+    # NULL when unset, so the unique constraint needs no condition and can
+    # be an INSERT ... ON CONFLICT target.
+    sku = models.CharField(max_length=64, blank=True, null=True)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    image = models.ImageField(upload_to='product_images/', blank=True)
+    # Resized WebP/JPEG copies of ``image`` (products/images.py), built by
+    # `manage.py build_image_derivatives`, not in the request
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     image_url = models.URLField(blank=True, null=True)
     order_via_whatsapp = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # Storefront access paths: vendor_store lists a vendor's active
+        # products sorted by created_at/price/name, and the category filter
+        # narrows by vendor + category. The sort indexes are partial on
+        # is_active because SQLite compares booleans as a bare column, which
+        # can't serve as the middle key of a composite index.
+        indexes = [
+            models.Index(fields=['vendor', 'created_at'], condition=Q(is_active=True), name='product_vendor_active_created'),
+            models.Index(fields=['vendor', 'price'], condition=Q(is_active=True), name='product_vendor_active_price'),
+            models.Index(fields=['vendor', 'name'], condition=Q(is_active=True), name='product_vendor_active_name'),
+            models.Index(fields=['vendor', 'category'], name='product_vendor_category'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'sku'], name='product_vendor_sku'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -0,0 +1,332 @@
+# products/proxy.py
+"""
+Local copies of remote product images (``Product.image_url``).
+
+``image_url`` points at whatever host the vendor pasted. Without a proxy,
+every storefront view makes the browser fetch the full-size original from
+that host, and a slow host stalls the page. ``proxy_url`` instead gives
+a signed URL on our ``image_proxy`` view. The view:
+
+1. fetches the remote image once, with a timeout and a size cap;
+2. resizes it to the requested width as WebP or JPEG, whichever the
+   browser accepts;
+3. keeps the result in ``IMAGE_PROXY['ROOT']`` on local disk.
+
+Later requests are served from disk with long-lived Cache-Control and an
+ETag.
+
+- **Size bound.** The cache directory stays under ``MAX_BYTES``. File
+  mtimes record recency (touched at most once per ``TOUCH_INTERVAL``).
+  When the directory grows past the limit, the least recently used files
+  are removed until it is back under ``LOW_WATER``.
+- **Coalescing.** Concurrent misses for the same image in one process
+  share one fetch. Files are written to a temp name and renamed into
+  place, so two processes racing on the same image just do the work
+  twice.
+- **Signing.** Only URLs signed with SECRET_KEY are served, so the view
+  isn't an open proxy.
+- **Private hosts.** A host that resolves to any private, loopback or
+  link-local address is refused. ``ALLOW_PRIVATE_HOSTS`` lifts this for
+  every host (True) or for the hostnames it lists. The check runs again
+  on every redirect (at most ``MAX_REDIRECTS``), and the connection goes
+  to the address that was checked. So neither a redirect nor a second,
+  different DNS answer can reach an internal address.
+- **Failures.** A failed fetch is remembered for ``FAILURE_TTL`` seconds,
+  and the browser is redirected to the original URL.
+"""
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import ssl
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from urllib.parse import urlencode, urljoin, urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signing import Signer
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from PIL import Image, ImageOps
+
+from config import metrics
+from .images import EXTENSIONS, encode
+
+DEFAULTS = {
+    'ROOT': Path(settings.BASE_DIR) / 'image_cache',
+    'MAX_BYTES': 512 * 1024 * 1024,
+    'LOW_WATER': 0.9,               # evict down to this fraction of MAX_BYTES
+    'WIDTHS': [240, 480, 960],
+    'QUALITY': 80,
+    'TIMEOUT': 5,                   # seconds per remote fetch
+    'MAX_SOURCE_BYTES': 15 * 1024 * 1024,
+    'MAX_AGE': 30 * 24 * 3600,      # browser/CDN cache lifetime
+    'TOUCH_INTERVAL': 3600,         # don't rewrite an mtime more often than this
+    'FAILURE_TTL': 300,
+    'ALLOW_PRIVATE_HOSTS': False,   # True, or a list of hostnames
+    'MAX_REDIRECTS': 3,
+}
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+_signer = Signer(salt='products.proxy')
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'IMAGE_PROXY', {})}
+
+
+class ProxyError(Exception):
+    """The remote image couldn't be fetched or decoded."""
+
+
+# ----------------------------------------------------------------------
+# URLs
+# ----------------------------------------------------------------------
+def _signature(url, width):
+    return _signer.signature(f'{width}:{url}')
+
+
+def proxy_url(url, width):
+    """Signed path of ``url`` resized to ``width`` through the proxy."""
+    query = urlencode({'url': url, 'w': width, 's': _signature(url, width)})
+    return f"{reverse('image_proxy')}?{query}"
+
+
+def verify(url, width, signature):
+    return (
+        width in config()['WIDTHS']
+        and urlsplit(url).scheme in ('http', 'https')
+        and constant_time_compare(signature, _signature(url, width))
+    )
+
+
+# ----------------------------------------------------------------------
+# Disk cache
+# ----------------------------------------------------------------------
+class DiskLRU:
+    """Files under ``root`` bounded to ``max_bytes``, least recently used evicted first."""
+
+    def __init__(self, root, max_bytes, low_water=0.9, touch_interval=3600):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._size = None           # this process's running estimate
+
+    def path(self, key):
+        return self.root / key[:2] / key
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+            if time.time() - path.stat().st_mtime > self.touch_interval:
+                os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, key, data):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._size = self.evict()
+
+    def _scan(self):
+        entries, total = [], 0
+        for path in self.root.glob('*/*'):
+            if path.name.startswith('.tmp-'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        return entries, total
+
+    def evict(self):
+        """Remove the oldest files until under the low-water mark; returns the new size."""
+        entries, total = self._scan()
+        target = self.max_bytes * self.low_water
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+
+_stores = {}
+
+
+def get_store():
+    conf = config()
+    args = (str(conf['ROOT']), conf['MAX_BYTES'], conf['LOW_WATER'], conf['TOUCH_INTERVAL'])
+    if args not in _stores:
+        _stores[args] = DiskLRU(*args)
+    return _stores[args]
+
+
+# ----------------------------------------------------------------------
+# Fetch + resize
+# ----------------------------------------------------------------------
+def _address(host, conf):
+    """
+    The address to connect to for ``host``. Unless the host is allowed,
+    every address it resolves to must be public.
+    """
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as exc:
+        raise ProxyError(f"can't resolve {host}") from exc
+    addresses = [info[4][0] for info in infos]
+    allowed = conf['ALLOW_PRIVATE_HOSTS']
+    if allowed is not True and host not in (allowed or ()):
+        for address in addresses:
+            if not ipaddress.ip_address(address.split('%')[0]).is_global:
+                raise ProxyError(f"{host} resolves to a private address")
+    return addresses[0]
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """Connects to an already checked ``address``; Host is still the URL's host."""
+
+    def __init__(self, host, address, **kwargs):
+        super().__init__(host, **kwargs)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """As _PinnedHTTPConnection, with SNI and certificate checks against the host."""
+
+    def __init__(self, host, address, **kwargs):
+        self.ssl_context = ssl.create_default_context()
+        super().__init__(host, context=self.ssl_context, **kwargs)
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self.ssl_context.wrap_socket(sock, server_hostname=self.host)
+
+
+def _get(url, conf):
+    """``(status, location, body)`` for one GET of ``url``, without following redirects."""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ProxyError(f"refusing to fetch {url!r}")
+    connection_class = _PinnedHTTPSConnection if parts.scheme == 'https' else _PinnedHTTPConnection
+    connection = connection_class(
+        parts.hostname, _address(parts.hostname, conf), port=parts.port, timeout=conf['TIMEOUT'],
+    )
+    path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+    try:
+        connection.request('GET', path, headers={'User-Agent': 'onlinestore-image-proxy'})
+        response = connection.getresponse()
+        if response.status in REDIRECT_STATUSES:
+            return response.status, response.getheader('Location'), b''
+        return response.status, None, response.read(conf['MAX_SOURCE_BYTES'] + 1)
+    except (OSError, http.client.HTTPException) as exc:  # timeouts are OSErrors
+        raise ProxyError(f"{type(exc).__name__}: {exc}") from exc
+    finally:
+        connection.close()
+
+
+def fetch(url):
+    conf = config()
+    for _ in range(conf['MAX_REDIRECTS'] + 1):
+        status, location, data = _get(url, conf)
+        if location:
+            url = urljoin(url, location)
+            continue
+        if status != 200:
+            raise ProxyError(f"HTTP {status} from {url}")
+        if len(data) > conf['MAX_SOURCE_BYTES']:
+            raise ProxyError("source image too large")
+        return data
+    raise ProxyError(f"more than {conf['MAX_REDIRECTS']} redirects")
+
+
+def render(data, width, fmt):
+    """``data`` resized to ``width`` (never upscaled) and encoded as ``fmt``."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        # JPEGs can decode straight at a fraction of full size
+        image.draft('RGB', (width, max(1, image.height * width // image.width)))
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        return encode(image, fmt, config()['QUALITY'])
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise ProxyError(f"{type(exc).__name__}: {exc}") from exc
+
+
+# ----------------------------------------------------------------------
+# Lookup with per-key coalescing
+# ----------------------------------------------------------------------
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def cache_key(url, width, fmt):
+    return f"{hashlib.sha256(f'{url}|{width}'.encode()).hexdigest()}.{EXTENSIONS[fmt]}"
+
+
+def get_image(url, width, fmt):
+    """Bytes of ``url`` at ``width`` in ``fmt``, from disk or fetched once. Raises ProxyError."""
+    store = get_store()
+    key = cache_key(url, width, fmt)
+    data = store.get(key)
+    metrics.cache_lookup('image_proxy', data is not None)
+    if data is not None:
+        return data
+
+    failure_key = f'image_proxy:failed:{key}'
+    if cache.get(failure_key):
+        raise ProxyError("recently failed")
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        return future.result()
+
+    try:
+        data = render(fetch(url), width, fmt)
+        store.set(key, data)
+        future.set_result(data)
+        return data
+    except BaseException as exc:
+        if isinstance(exc, ProxyError):
+            cache.set(failure_key, True, config()['FAILURE_TTL'])
+        future.set_exception(exc)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
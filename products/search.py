@@ -0,0 +1,153 @@
+# products/search.py
+"""
+Full-text product search backed by an SQLite FTS5 index.
+
+``products_product_fts`` holds one row per Product (rowid = product id) with
+the product name, description, category name and a ``v<vendor id>`` token so
+a vendor-scoped search is resolved inside the index instead of filtering
+every match afterwards. Rows are kept in sync by ``products.signals`` and can
+be rebuilt with ``manage.py rebuild_search_index``.
+
+On databases without FTS5 ``search()`` falls back to the old icontains
+filter.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+
+FTS_TABLE = 'products_product_fts'
+
+# bm25() weights, in column order: name, description, category, vendor
+RANK_WEIGHTS = (10.0, 1.0, 4.0, 0.0)
+
+_available = {}
+
+
+def create_index(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, description, category, vendor, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('rank', %s)",
+            [f'bm25({weights})'],
+        )
+    _available[connection.alias] = True
+
+
+def drop_index(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _available[connection.alias] = False
+
+
+def is_available(using='default'):
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor != 'sqlite':
+            _available[using] = False
+        else:
+            _available[using] = FTS_TABLE in connection.introspection.table_names()
+    return _available[using]
+
+
+def match_expression(q, vendor_id=None):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix,
+    in any column. Quoting each token keeps user input from being parsed as
+    FTS syntax.
+    """
+    terms = ' '.join(f'"{token}"*' for token in re.findall(r'\w+', q or ''))
+    if not terms:
+        return None
+    if vendor_id is not None:
+        terms = f'vendor : "v{vendor_id}" AND ({terms})'
+    return terms
+
+
+def search(queryset, q, vendor_id=None):
+    """
+    Restrict a Product queryset to rows matching ``q``.
+
+    The result always carries a ``search_rank`` column (lower is better)
+    that the caller can ``order_by``: BM25 from the index, or a constant 0
+    when ``q`` has no words (nothing is filtered) or FTS5 is unavailable
+    (icontains fallback). Other filters, ordering and Paginator slicing
+    keep working as usual.
+    """
+    unranked = Value(0.0, output_field=FloatField())
+    match = match_expression(q, vendor_id)
+    if match is None:
+        return queryset.annotate(search_rank=unranked)
+    if not is_available(queryset.db):
+        return queryset.filter(Q(name__icontains=q) | Q(description__icontains=q)).annotate(search_rank=unranked)
+
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        select={'search_rank': f'{FTS_TABLE}.rank'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+    )
+
+
+# ----------------------------------------------------------------------
+# Index maintenance
+# ----------------------------------------------------------------------
+_SELECT_ROWS = (
+    "SELECT p.id, p.name, p.description, COALESCE(c.name, ''), 'v' || p.vendor_id "
+    "FROM products_product p LEFT JOIN products_category c ON c.id = p.category_id"
+)
+
+
+def _execute(using, *statements):
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        for sql, params in statements:
+            cursor.execute(sql, params)
+
+
+def index_products(product_ids, using='default'):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    _execute(
+        using,
+        (f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", product_ids),
+        (f"INSERT INTO {FTS_TABLE} (rowid, name, description, category, vendor) "
+         f"{_SELECT_ROWS} WHERE p.id IN ({placeholders})", product_ids),
+    )
+
+
+def index_category(category_id, using='default'):
+    _execute(
+        using,
+        (f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+         "(SELECT id FROM products_product WHERE category_id = %s)", [category_id]),
+        (f"INSERT INTO {FTS_TABLE} (rowid, name, description, category, vendor) "
+         f"{_SELECT_ROWS} WHERE p.category_id = %s", [category_id]),
+    )
+
+
+def unindex_products(product_ids, using='default'):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    _execute(using, (f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", product_ids))
+
+
+def rebuild_index(using='default'):
+    """Repopulate the whole index in two statements and merge its segments."""
+    _execute(
+        using,
+        (f"DELETE FROM {FTS_TABLE}", []),
+        (f"INSERT INTO {FTS_TABLE} (rowid, name, description, category, vendor) {_SELECT_ROWS}", []),
+        (f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')", []),
+    )
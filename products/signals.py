@@ -0,0 +1,53 @@
+# products/signals.py
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import catalog, search
+from .models import Category, Product
+
+
+# ----------------------------------------------------------------------
+# Full-text search index (products/search.py)
+# ----------------------------------------------------------------------
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, using, **kwargs):
+    search.index_products([instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, using, **kwargs):
+    search.unindex_products([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, using, **kwargs):
+    if not created:
+        search.index_category(instance.pk, using=using)
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_products(sender, instance, using, **kwargs):
+    # Products are detached (SET_NULL) after this runs, so collect them now
+    instance._product_ids = list(instance.product_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_detached_products(sender, instance, using, **kwargs):
+    search.index_products(getattr(instance, '_product_ids', []), using=using)
+
+
+# ----------------------------------------------------------------------
+# Catalog versions for cached storefront fragments (products/catalog.py)
+# ----------------------------------------------------------------------
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_vendor_catalog(sender, instance, using, **kwargs):
+    catalog.bump(instance.vendor_id, using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_catalog(sender, instance, using, **kwargs):
+    # Categories are shared, and a move changes which products every
+    # vendor's subtree filter returns
+    catalog.bump_categories(using=using)
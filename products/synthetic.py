@@ -0,0 +1,427 @@
+# products/synthetic.py
+"""
+Deterministic synthetic marketplace data, for scaling benchmarks.
+
+``generate(Spec(...))`` writes, in this order:
+
+1. vendors (and their users);
+2. a category tree ``depth`` levels deep under one "Synthetic" root;
+3. products, spread over vendors by a Zipf-like weight, with names and
+   lognormal prices drawn per department;
+4. anonymous carts;
+5. ``months`` of orders and order items up to ``end``.
+
+Then it recomputes the sales rollups, rebuilds the search index, and
+bumps the catalog versions.
+
+Rows go in through ``bulk_create``: ``batch_size`` rows per INSERT and
+``TRANSACTION_ROWS`` rows per transaction. Nothing is held in memory
+beyond one transaction's rows and a sample of each vendor's products.
+Bulk inserts skip ``save()`` and the model signals, so the derived data
+(category paths, rollups, search index) is rebuilt at the end, as
+products/bulk.py does for imports.
+
+The same spec, seed and ``end`` date give the same rows, with the same
+ids on an empty database. ``Product.created_at`` is the exception: it is
+``auto_now_add``. Synthetic users are named ``synth-…`` and categories
+live under the "Synthetic" root. ``generate`` refuses to run a second
+time on a database that already holds them.
+"""
+import math
+import random
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from cart.models import Cart, CartItem
+from orders import rollups
+from orders.models import Order, OrderItem
+from vendors.models import Vendor
+from . import catalog, search
+from .models import Category, Product
+
+USERNAME_PREFIX = 'synth-'
+ROOT_CATEGORY = 'Synthetic'
+TRANSACTION_ROWS = 50_000
+SAMPLE_PER_VENDOR = 100     # products per vendor that orders and carts draw from
+
+
+@dataclass(frozen=True)
+class Spec:
+    vendors: int
+    products: int
+    depth: int = 3              # category levels below the root
+    fanout: int = 4             # children per category below the departments
+    months: int = 3
+    orders_per_day: int = 50    # across the marketplace, before seasonality
+    carts: int = 100
+    skew: float = 1.0           # Zipf exponent of vendor size
+    lead_share: float = 0.0     # share of products/orders of vendor 0, if set
+    seed: int = 1
+    batch_size: int = 2000
+
+
+PRESETS = {
+    'small': Spec(vendors=5, products=2_000, depth=3, fanout=3, months=3, orders_per_day=20, carts=200),
+    'busy-vendor': Spec(
+        vendors=10, products=250_000, depth=4, fanout=4, months=12, orders_per_day=400,
+        carts=5_000, lead_share=0.9,
+    ),
+    'marketplace-wide': Spec(
+        vendors=5_000, products=1_000_000, depth=5, fanout=4, months=6, orders_per_day=3_000,
+        carts=50_000, skew=1.0,
+    ),
+}
+
+# name: (median price in naira, subcategories, product nouns)
+DEPARTMENTS = {
+    'Fashion': (12_000, ['Tops', 'Dresses', 'Trousers', 'Shoes', 'Bags', 'Jewellery'],
+                ['Shirt', 'Ankara Dress', 'Kaftan', 'Chinos', 'Sneakers', 'Sandals', 'Handbag', 'Cap', 'Bead Necklace', 'Belt']),
+    'Electronics': (85_000, ['Phones', 'Audio', 'Computers', 'Accessories', 'Power', 'Wearables'],
+                    ['Smartphone', 'Earbuds', 'Bluetooth Speaker', 'Laptop', 'Tablet', 'Power Bank', 'Charger', 'Smartwatch', 'Router', 'Headphones']),
+    'Home & Kitchen': (15_000, ['Cookware', 'Appliances', 'Bedding', 'Decor', 'Lighting', 'Storage'],
+                       ['Blender', 'Pot Set', 'Electric Kettle', 'Duvet', 'Curtain', 'Table Lamp', 'Rug', 'Cooler', 'Plate Set', 'Standing Fan']),
+    'Beauty': (6_000, ['Skincare', 'Haircare', 'Fragrance', 'Makeup', 'Bath', 'Wigs'],
+               ['Shea Butter', 'Body Lotion', 'Perfume', 'Lipstick', 'Hair Oil', 'Face Wash', 'Serum', 'Black Soap', 'Wig', 'Body Scrub']),
+    'Groceries': (2_500, ['Grains', 'Oils', 'Spices', 'Snacks', 'Drinks', 'Pantry'],
+                  ['Rice', 'Garri', 'Palm Oil', 'Beans', 'Pepper Mix', 'Spaghetti', 'Noodles', 'Honey', 'Plantain Chips', 'Zobo Mix']),
+    'Baby & Kids': (8_000, ['Diapering', 'Feeding', 'Toys', 'Clothing', 'Nursery', 'School'],
+                    ['Diapers', 'Feeding Bottle', 'Toy Car', 'Onesie', 'Baby Carrier', 'School Bag', 'Puzzle', 'Baby Wipes', 'Bib Set', 'Crib Sheet']),
+    'Sports': (20_000, ['Fitness', 'Football', 'Cycling', 'Outdoor', 'Wear', 'Recovery'],
+               ['Football', 'Jersey', 'Dumbbell', 'Yoga Mat', 'Skipping Rope', 'Bicycle Helmet', 'Water Bottle', 'Gym Gloves', 'Tracksuit', 'Massage Ball']),
+    'Books & Stationery': (4_000, ['Fiction', 'Textbooks', 'Notebooks', 'Art', 'Office', 'Children'],
+                           ['Novel', 'Notebook', 'Pen Set', 'Textbook', 'Planner', 'Sketchbook', 'Colour Pencils', 'Calculator', 'File Folder', 'Storybook']),
+}
+LEVEL_NAMES = [
+    ['Men', 'Women', 'Kids', 'Unisex'],
+    ['Everyday', 'Premium', 'Occasion', 'Value'],
+    ['Classic', 'New Season', 'Local', 'Imported'],
+    ['Small', 'Medium', 'Large', 'Bulk'],
+]
+ADJECTIVES = ['Classic', 'Premium', 'Everyday', 'Slim', 'Vintage', 'Deluxe', 'Compact', 'Organic',
+              'Handmade', 'Pro', 'Lightweight', 'Royal', 'Eko', 'Naija', 'Signature', 'Essential']
+VARIANTS = ['Black', 'White', 'Red', 'Navy', 'Gold', 'Green', 'Brown', 'Small', 'Medium', 'Large',
+            '500g', '1kg', '1L', 'Pack of 3', 'Pack of 6', '2024 Edition']
+FIRST_NAMES = ['Ada', 'Chidi', 'Ngozi', 'Emeka', 'Funke', 'Tunde', 'Aisha', 'Musa', 'Bola', 'Ifeoma',
+               'Segun', 'Zainab', 'Kelechi', 'Yemi', 'Halima', 'Obinna', 'Tola', 'Amaka', 'Ibrahim', 'Nkechi']
+LAST_NAMES = ['Okafor', 'Adeyemi', 'Bello', 'Eze', 'Ogunleye', 'Abubakar', 'Nwosu', 'Balogun', 'Usman',
+              'Okonkwo', 'Adebayo', 'Ibekwe', 'Lawal', 'Obi', 'Afolabi', 'Danjuma', 'Onyeka', 'Salami']
+STORE_WORDS = ['Styles', 'Gadgets', 'Home', 'Glow', 'Pantry', 'Kiddies', 'Sports', 'Reads', 'Hub',
+               'Mart', 'Collection', 'Store', 'Express', 'Plus', 'Corner', 'Place']
+CITIES = ['Lagos', 'Abuja', 'Port Harcourt', 'Ibadan', 'Kano', 'Enugu', 'Benin City', 'Owerri']
+
+
+@dataclass
+class Result:
+    counts: dict
+    elapsed: float
+
+    def __str__(self):
+        counts = ', '.join(f"{count:,} {name}" for name, count in self.counts.items())
+        return f"{counts} in {self.elapsed:.1f}s"
+
+
+class AlreadyGenerated(Exception):
+    pass
+
+
+# ----------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------
+def insert(model, rows, batch_size, log=None):
+    """``bulk_create`` ``rows`` (any iterable), TRANSACTION_ROWS per transaction."""
+    rows = iter(rows)
+    total, started = 0, time.monotonic()
+    while chunk := list(islice(rows, TRANSACTION_ROWS)):
+        with transaction.atomic():
+            model.objects.bulk_create(chunk, batch_size=batch_size)
+        total += len(chunk)
+    if log:
+        elapsed = time.monotonic() - started
+        log(f"{model._meta.verbose_name_plural}: {total:,} in {elapsed:.1f}s ({total / max(elapsed, 1e-6):,.0f} rows/s)")
+    return total
+
+
+def vendor_weights(spec):
+    """Share of products and orders per vendor (sums to 1)."""
+    weights = [1 / (rank + 1) ** spec.skew for rank in range(spec.vendors)]
+    if spec.lead_share and spec.vendors > 1:
+        rest = sum(weights[1:])
+        weights = [spec.lead_share] + [(1 - spec.lead_share) * w / rest for w in weights[1:]]
+    total = sum(weights)
+    return [w / total for w in weights]
+
+
+def apportion(total, weights):
+    """Split ``total`` by ``weights`` into integers that add up to it."""
+    counts = [math.floor(total * w) for w in weights]
+    for index in sorted(range(len(weights)), key=lambda i: -weights[i])[:total - sum(counts)]:
+        counts[index] += 1
+    return counts
+
+
+def price_for(rng, median):
+    """Lognormal price around ``median``, rounded like a shelf price (to ₦50)."""
+    price = max(50, round(rng.lognormvariate(math.log(median), 0.7) / 50) * 50)
+    return Decimal(price)
+
+
+def customer(index):
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    phone = f"+2348{(index * 7919 + 10_000_000) % 1_000_000_000:09d}"
+    return f"{first} {last}", phone, CITIES[index % len(CITIES)]
+
+
+def status_for(rng, age_days):
+    roll = rng.random()
+    if roll < 0.06:
+        return 'cancelled'
+    if age_days > 10:
+        return 'delivered'
+    if age_days > 3:
+        return 'shipped' if roll < 0.5 else 'delivered'
+    return ('pending', 'confirmed', 'shipped')[min(2, int(roll * 3))]
+
+
+# ----------------------------------------------------------------------
+# Generators
+# ----------------------------------------------------------------------
+def create_vendors(spec, rng, log):
+    users = (
+        User(username=f"{USERNAME_PREFIX}{n:06d}", email=f"vendor{n}@example.com", password='!')
+        for n in range(spec.vendors)
+    )
+    insert(User, users, spec.batch_size)
+    user_ids = dict(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('username', 'id'))
+
+    def vendors():
+        for n in range(spec.vendors):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(STORE_WORDS)} {n + 1}"
+            yield Vendor(
+                user_id=user_ids[f"{USERNAME_PREFIX}{n:06d}"],
+                store_name=name,
+                slug=slugify(name),
+                description=f"{name}, trading from {rng.choice(CITIES)}.",
+                phone_number=f"+23480{n:08d}",
+                whatsapp_number=f"23480{n:08d}",
+            )
+
+    insert(Vendor, vendors(), spec.batch_size, log)
+    return list(Vendor.objects.filter(user__username__startswith=USERNAME_PREFIX).order_by('pk').values_list('pk', flat=True))
+
+
+def create_categories(spec, log):
+    """Build the tree level by level; returns ``[(leaf id, department)]``."""
+    root = Category.objects.create(name=ROOT_CATEGORY)
+    level = []
+    for department in DEPARTMENTS:
+        level.append((Category(name=department, parent=root), department))
+    created = len(level) + 1
+    for depth in range(1, spec.depth):
+        with transaction.atomic():
+            Category.objects.bulk_create([category for category, _ in level], batch_size=spec.batch_size)
+        children = []
+        for parent, department in level:
+            if depth == 1:
+                names = DEPARTMENTS[department][1][:max(spec.fanout, 1)]
+            else:
+                names = LEVEL_NAMES[(depth - 2) % len(LEVEL_NAMES)][:spec.fanout]
+            children += [(Category(name=name, parent=parent), department) for name in names]
+        level = children
+        created += len(level)
+    with transaction.atomic():
+        Category.objects.bulk_create([category for category, _ in level], batch_size=spec.batch_size)
+        Category.objects.rebuild()
+    log(f"categories: {created:,}, {spec.depth} levels under {ROOT_CATEGORY!r}")
+    return [(category.pk, department) for category, department in level]
+
+
+def create_products(spec, rng, vendor_ids, leaves, log):
+    counts = apportion(spec.products, vendor_weights(spec))
+    by_department = {}
+    for leaf in leaves:
+        by_department.setdefault(leaf[1], []).append(leaf)
+
+    def products():
+        for rank, (vendor_id, count) in enumerate(zip(vendor_ids, counts)):
+            # A vendor sells in one or two departments
+            shelves = [leaf for department in rng.sample(list(DEPARTMENTS), k=2) for leaf in by_department[department]]
+            for n in range(count):
+                category_id, department = rng.choice(shelves)
+                median, _, nouns = DEPARTMENTS[department]
+                name = f"{rng.choice(ADJECTIVES)} {rng.choice(nouns)} {rng.choice(VARIANTS)}"
+                yield Product(
+                    vendor_id=vendor_id,
+                    category_id=category_id,
+                    sku=f"SY{rank:05d}-{n:07d}",
+                    name=name,
+                    description=f"{name}. {department}, sold by a synthetic vendor.",
+                    price=price_for(rng, median),
+                    stock=0 if rng.random() < 0.1 else int(rng.paretovariate(1.2) * 5),
+                    order_via_whatsapp=rng.random() < 0.3,
+                    is_active=rng.random() < 0.95,
+                )
+
+    return insert(Product, products(), spec.batch_size, log)
+
+
+def product_samples(vendor_ids):
+    """``{vendor id: [(product id, name, price cents)]}``, the oldest active products."""
+    samples = {}
+    for vendor_id in vendor_ids:
+        rows = Product.objects.filter(vendor_id=vendor_id, is_active=True).order_by('pk')\
+            .values_list('id', 'name', 'price')[:SAMPLE_PER_VENDOR]
+        samples[vendor_id] = [(pk, name, int(price * 100)) for pk, name, price in rows]
+    return samples
+
+
+def pick(rng, sample):
+    """A product from ``sample``, skewed towards the first (best sellers)."""
+    return sample[min(len(sample) - 1, int(rng.paretovariate(1.1)) - 1)]
+
+
+def create_carts(spec, rng, vendor_ids, samples, now, log):
+    weights = vendor_weights(spec)
+    carts, items = [], []
+    for n in range(spec.carts):
+        vendor_id = rng.choices(vendor_ids, weights)[0]
+        if not samples[vendor_id]:
+            continue
+        lines = {}
+        for _ in range(rng.randint(1, 3)):
+            product = pick(rng, samples[vendor_id])
+            lines[product] = lines.get(product, 0) + rng.randint(1, 2)
+        cart = Cart(
+            session_key=f"synthetic{n:023d}",
+            vendor_id=vendor_id,
+            created_at=now - timedelta(seconds=rng.randrange(3 * 86400)),
+            item_count=sum(lines.values()),
+            total=sum(Decimal(cents) / 100 * quantity for (_, _, cents), quantity in lines.items()),
+        )
+        carts.append(cart)
+        items.append(lines)
+    insert(Cart, carts, spec.batch_size, log)
+    cart_items = (
+        CartItem(cart_id=cart.pk, product_id=product_id, quantity=quantity)
+        for cart, lines in zip(carts, items)
+        for (product_id, _, _), quantity in lines.items()
+    )
+    insert(CartItem, cart_items, spec.batch_size, log)
+
+
+def create_orders(spec, rng, vendor_ids, samples, end, log):
+    weights = vendor_weights(spec)
+    cumulative = []
+    running = 0
+    for weight in weights:
+        running += weight
+        cumulative.append(running)
+    tz = timezone.get_current_timezone()
+    days = spec.months * 30
+    customers = max(10, spec.orders_per_day * days // 3)   # about three orders per customer
+    total_orders = total_items = 0
+    started = time.monotonic()
+    batch = []
+
+    def flush():
+        nonlocal total_orders, total_items
+        with transaction.atomic():
+            Order.objects.bulk_create([order for order, _ in batch], batch_size=spec.batch_size)
+            items = [
+                OrderItem(order_id=order.pk, product_id=pk, product_name=name,
+                          unit_price_cents=cents, quantity=quantity)
+                for order, lines in batch
+                for (pk, name, cents), quantity in lines.items()
+            ]
+            OrderItem.objects.bulk_create(items, batch_size=spec.batch_size)
+        total_orders += len(batch)
+        total_items += len(items)
+        batch.clear()
+
+    for offset in range(days, -1, -1):
+        day = end - timedelta(days=offset)
+        # Growth over the period, busier weekends, and day-to-day noise
+        trend = 0.6 + 0.4 * (days - offset) / max(days, 1)
+        weekend = 1.3 if day.weekday() >= 5 else 1.0
+        count = max(0, round(spec.orders_per_day * trend * weekend * rng.uniform(0.8, 1.2)))
+        midnight = timezone.make_aware(datetime.combine(day, dt_time.min), tz)
+        for _ in range(count):
+            vendor_id = rng.choices(vendor_ids, cum_weights=cumulative)[0]
+            sample = samples[vendor_id]
+            if not sample:
+                continue
+            lines = {}
+            for _ in range(min(5, int(rng.paretovariate(2.5)) + (rng.random() < 0.4))):
+                product = pick(rng, sample)
+                lines[product] = lines.get(product, 0) + rng.randint(1, 3)
+            name, phone, city = customer(int(rng.paretovariate(0.8)) % customers)
+            batch.append((Order(
+                vendor_id=vendor_id,
+                customer_name=name,
+                customer_phone=phone,
+                customer_address=f"{rng.randint(1, 200)} Market Road, {city}",
+                total_cents=sum(cents * quantity for (_, _, cents), quantity in lines.items()),
+                status=status_for(rng, offset),
+                created_at=midnight + timedelta(seconds=rng.randrange(86400)),
+            ), lines))
+            if len(batch) >= TRANSACTION_ROWS // 2:
+                flush()
+    if batch:
+        flush()
+    elapsed = time.monotonic() - started
+    log(f"orders: {total_orders:,} with {total_items:,} items over {days} days in {elapsed:.1f}s "
+        f"({(total_orders + total_items) / max(elapsed, 1e-6):,.0f} rows/s)")
+    return total_orders, total_items
+
+
+# ----------------------------------------------------------------------
+# Entry point
+# ----------------------------------------------------------------------
+def generate(spec, end=None, log=lambda message: None):
+    """Write the dataset ``spec`` describes, with orders up to ``end`` (a date, default today)."""
+    if Vendor.objects.filter(user__username__startswith=USERNAME_PREFIX).exists() \
+            or Category.objects.filter(name=ROOT_CATEGORY, parent=None).exists():
+        raise AlreadyGenerated("This database already holds synthetic data; use a fresh database.")
+    started = time.monotonic()
+    rng = random.Random(spec.seed)
+    end = end or timezone.localdate()
+    now = timezone.make_aware(datetime.combine(end, dt_time(18, 0)))
+
+    vendor_ids = create_vendors(spec, rng, log)
+    leaves = create_categories(spec, log)
+    products = create_products(spec, rng, vendor_ids, leaves, log)
+    samples = product_samples(vendor_ids)
+    create_carts(spec, rng, vendor_ids, samples, now, log)
+    orders, items = create_orders(spec, rng, vendor_ids, samples, end, log)
+
+    step = time.monotonic()
+    rows = rollups.backfill()
+    log(f"sales rollups: {rows:,} rows in {time.monotonic() - step:.1f}s")
+    if connection.vendor == 'sqlite':
+        step = time.monotonic()
+        with transaction.atomic():
+            if not search.is_available():
+                search.create_index(connection)
+            search.rebuild_index()
+        log(f"search index rebuilt in {time.monotonic() - step:.1f}s")
+    for vendor_id in vendor_ids:
+        catalog.bump(vendor_id)
+    catalog.bump_categories()
+
+    return Result(
+        counts={'vendors': len(vendor_ids), 'products': products, 'orders': orders, 'order items': items},
+        elapsed=time.monotonic() - started,
+    )
+
+
+def spec_for(preset, **overrides):
+    """The preset's Spec with the non-None ``overrides`` applied."""
+    return replace(PRESETS[preset], **{k: v for k, v in overrides.items() if v is not None})
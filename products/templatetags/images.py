@@ -0,0 +1,73 @@
+# products/templatetags/images.py
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from products import proxy
+from products.images import is_current
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(instance, field_name, width, sizes=None, **attrs):
+    """
+    Render ``instance.<field_name>`` for a slot ``width`` CSS pixels wide:
+
+        {% responsive_image product "image" 240 sizes="50vw" alt=product.name class="..." %}
+
+    With current derivatives this is a <picture> offering the WebP set
+    and a JPEG <img> fallback. ``src`` is the smallest JPEG that covers
+    ``width``, and ``srcset``/``sizes`` let the browser pick a larger one
+    for dense screens. Without derivatives it's the original upload.
+    """
+    fieldfile = getattr(instance, field_name)
+    if not fieldfile:
+        return ''
+    manifest = getattr(instance, f'{field_name}_derivatives', None) or {}
+    attrs = {'loading': 'lazy', 'decoding': 'async', **attrs}
+    if not is_current(fieldfile, manifest) or 'jpeg' not in manifest:
+        return format_html('<img src="{}"{}>', fieldfile.url, flatatt(attrs))
+
+    url = fieldfile.storage.url
+
+    def variants(fmt):
+        return sorted((int(w), name) for w, name in manifest.get(fmt, {}).items())
+
+    def srcset(fmt):
+        return ', '.join(f'{url(name)} {w}w' for w, name in variants(fmt))
+
+    jpeg = variants('jpeg')
+    src = next((name for w, name in jpeg if w >= width), jpeg[-1][1])
+    sizes = sizes or f'{width}px'
+    height = round(width * manifest['height'] / manifest['width'])
+
+    webp = ''
+    if manifest.get('webp'):
+        webp = format_html('<source type="image/webp" srcset="{}" sizes="{}">', srcset('webp'), sizes)
+    return format_html(
+        '<picture class="contents">{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{}></picture>',
+        webp, url(src), srcset('jpeg'), sizes, width, height, flatatt(attrs),
+    )
+
+
+@register.simple_tag
+def proxied_image(url, width, sizes=None, **attrs):
+    """
+    Render a remote image URL through the caching image proxy:
+
+        {% proxied_image product.image_url 240 alt=product.name class="..." %}
+
+    ``src`` is the proxy's copy at the smallest configured width covering
+    ``width``; ``srcset`` offers the larger ones for dense screens.
+    """
+    if not url:
+        return ''
+    widths = sorted(proxy.config()['WIDTHS'])
+    src = next((w for w in widths if w >= width), widths[-1])
+    srcset = ', '.join(f'{proxy.proxy_url(url, w)} {w}w' for w in widths)
+    attrs = {'loading': 'lazy', 'decoding': 'async', **attrs}
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}"{}>',
+        proxy.proxy_url(url, src), srcset, sizes or f'{width}px', flatatt(attrs),
+    )
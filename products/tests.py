@@ -1,3 +1,484 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from urllib.parse import quote, unquote
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from PIL import Image
+
+from cart.models import Cart
+from config.testing import QueryBudgetTestCase
+from vendors.models import Vendor
+from orders.models import DailySales, Order
+from . import bulk, proxy, synthetic
+from .models import Category, Product
+from .search import search
+
 
 # Create your tests here.
+class CategorySubtreeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        cls.clothing = Category.objects.create(name='Clothing')
+        cls.men = Category.objects.create(name='Men', parent=cls.clothing)
+        cls.shirts = Category.objects.create(name='Shirts', parent=cls.men)
+        cls.toys = Category.objects.create(name='Toys')
+        cls.shirt = Product.objects.create(vendor=cls.vendor, category=cls.shirts, name='Shirt', price=10)
+        cls.jacket = Product.objects.create(vendor=cls.vendor, category=cls.men, name='Jacket', price=20)
+        cls.ball = Product.objects.create(vendor=cls.vendor, category=cls.toys, name='Ball', price=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def names_in(self, category):
+        return set(Product.objects.in_category(category).values_list('name', flat=True))
+
+    def test_parent_covers_whole_subtree(self):
+        self.assertEqual(self.names_in(self.clothing), {'Shirt', 'Jacket'})
+        self.assertEqual(self.names_in(self.clothing.pk), {'Shirt', 'Jacket'})
+        self.assertEqual(self.names_in(self.shirts), {'Shirt'})
+        self.assertEqual(self.names_in(0), set())
+
+    def test_move_carries_subtree(self):
+        self.men.parent = self.toys
+        self.men.save()
+        self.assertEqual(self.names_in(self.clothing), set())
+        self.assertEqual(self.names_in(self.toys.pk), {'Ball', 'Shirt', 'Jacket'})
+        self.shirts.refresh_from_db()
+        self.assertEqual(self.shirts.depth, 2)
+
+    def test_delete_removes_subtree(self):
+        self.men.delete()
+        self.assertEqual(self.names_in(self.clothing), set())
+        self.assertFalse(Category.objects.filter(pk=self.shirts.pk).exists())
+
+    def test_rebuild_repairs_raw_reparent(self):
+        Category.objects.filter(pk=self.men.pk).update(parent=self.toys)
+        call_command('rebuild_category_tree', stdout=StringIO())
+        self.assertEqual(self.names_in(self.toys), {'Ball', 'Shirt', 'Jacket'})
+        self.assertEqual(Category.objects.rebuild(), 0)
+
+    def test_tree_order_holds_past_seven_digit_ids(self):
+        Category.objects.all().delete()
+        low = Category.objects.create(pk=9_999_999, name='Low')
+        high = Category.objects.create(pk=10_000_000, name='High')
+        child = Category.objects.create(name='Child', parent=low)
+        self.assertEqual(list(Category.objects.tree()), [low, child, high])
+        self.assertEqual(list(Category.objects.subtree(low.pk).tree()), [low, child])
+        with self.assertRaises(ValueError):
+            Category.objects.create(pk=10 ** 10, name='Too wide')
+        self.assertFalse(Category.objects.filter(name='Too wide').exists())
+
+    def test_storefront_filter_includes_children(self):
+        response = self.client.get(
+            reverse('vendors:vendor_store', args=[self.vendor.slug]) + f'?category={self.clothing.pk}',
+            HTTP_HOST=f'{self.vendor.slug}.lvh.me',
+        )
+        names = {p.name for p in response.context['page_obj']}
+        self.assertEqual(names, {'Shirt', 'Jacket'})
+        self.assertIn(self.clothing, response.context['categories'])
+
+    def test_category_page_pages_the_subtree(self):
+        host = f'{self.vendor.slug}.lvh.me'
+        Product.objects.bulk_create([
+            Product(vendor=self.vendor, category=self.shirts, name=f'Tee {i}', price=1) for i in range(24)
+        ])
+        response = self.client.get(reverse('category_view', args=[self.shirts.pk]), HTTP_HOST=host)
+        self.assertEqual([c.name for c in response.context['ancestors']], ['Clothing', 'Men', 'Shirts'])
+        first = response.context['page_obj']
+        self.assertEqual(len(first), 24)
+        self.assertTrue(first.has_next)
+        response = self.client.get(
+            reverse('category_view', args=[self.shirts.pk]), {'cursor': first.next_cursor}, HTTP_HOST=host,
+        )
+        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertFalse(response.context['page_obj'].has_next)
+
+        response = self.client.get(reverse('product_detail', args=[self.jacket.pk]), HTTP_HOST=host)
+        self.assertContains(response, 'Jacket')
+
+    def test_index_is_not_taken_by_the_storefront_route(self):
+        response = self.client.get('/products/', HTTP_HOST='lvh.me')
+        self.assertEqual(response.resolver_match.view_name, 'products_index')
+        self.assertContains(response, 'All products')
+        self.assertContains(response, 'Ball')
+
+
+def jpeg_upload(name, size=(2000, 1500), color='teal'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG', quality=95)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageDerivativeTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        self.product = Product.objects.create(
+            vendor=vendor, name='Shoe', price=10, image=jpeg_upload('shoe.jpg'),
+        )
+
+    def render(self):
+        return Template(
+            '{% load images %}{% responsive_image product "image" 240 alt="Shoe" %}'
+        ).render(Context({'product': self.product}))
+
+    def test_command_builds_resized_copies(self):
+        self.assertIn(f'src="{self.product.image.url}"', self.render())
+
+        call_command('build_image_derivatives', stdout=StringIO())
+        self.product.refresh_from_db()
+        manifest = self.product.image_derivatives
+        self.assertEqual(manifest['source'], self.product.image.name)
+        self.assertEqual(sorted(manifest['webp'], key=int), ['240', '480', '960'])
+        with self.product.image.storage.open(manifest['jpeg']['240']) as f:
+            self.assertEqual(Image.open(f).size, (240, 180))
+
+        html = self.render()
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f'src="/media/{manifest["jpeg"]["240"]}"', html)
+        self.assertIn('960w', html)
+
+        # Already current: nothing to do
+        out = StringIO()
+        call_command('build_image_derivatives', stdout=out)
+        self.assertEqual(out.getvalue(), '')
+
+    def test_replaced_upload_falls_back_until_rebuilt(self):
+        call_command('build_image_derivatives', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.product.image = jpeg_upload('boot.jpg', color='navy')
+        self.product.save()
+        self.assertNotIn('<picture', self.render())
+
+        call_command('build_image_derivatives', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_derivatives['source'], self.product.image.name)
+        self.assertIn('<picture', self.render())
+
+
+class RemoteImageHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for a vendor's image host: /<w>x<h>.jpg, counting hits.
+    /redirect?to=<url> answers 302 with that Location.
+    """
+    hits = []
+    delay = 0
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        time.sleep(self.delay)
+        if self.path == '/missing.jpg':
+            self.send_error(404)
+            return
+        if self.path.startswith('/redirect?to='):
+            self.send_response(302)
+            self.send_header('Location', unquote(self.path.partition('=')[2]))
+            self.end_headers()
+            return
+        width, height = map(int, self.path.strip('/').split('.')[0].split('x'))
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'orange').save(buffer, 'JPEG')
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.end_headers()
+        self.wfile.write(buffer.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageProxyTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), RemoteImageHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.origin = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        RemoteImageHandler.hits = []
+        RemoteImageHandler.delay = 0
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings = override_settings(IMAGE_PROXY={'ROOT': root, 'ALLOW_PRIVATE_HOSTS': True})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, path, **headers):
+        return self.client.get(proxy.proxy_url(f'{self.origin}{path}', 240), headers=headers)
+
+    def test_fetches_once_and_serves_resized_copy(self):
+        response = self.get('/1200x800.jpg', Accept='image/webp,*/*')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('max-age=2592000', response['Cache-Control'])
+        self.assertEqual(Image.open(BytesIO(response.content)).size, (240, 160))
+
+        again = self.get('/1200x800.jpg', Accept='image/webp,*/*')
+        self.assertEqual(again.content, response.content)
+        self.assertEqual(RemoteImageHandler.hits, ['/1200x800.jpg'])
+
+        revalidated = self.get('/1200x800.jpg', Accept='image/webp', If_None_Match=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+        jpeg = self.get('/1200x800.jpg')
+        self.assertEqual(jpeg['Content-Type'], 'image/jpeg')
+
+    def test_rejects_unsigned_urls(self):
+        url = proxy.proxy_url(f'{self.origin}/1200x800.jpg', 240)
+        self.assertEqual(self.client.get(url.replace('w=240', 'w=480')).status_code, 400)
+        self.assertEqual(self.client.get(url.replace('1200x800', '1600x900')).status_code, 400)
+        self.assertEqual(RemoteImageHandler.hits, [])
+
+    def test_refuses_private_hosts_by_default(self):
+        with override_settings(IMAGE_PROXY={'ROOT': proxy.config()['ROOT']}):
+            response = self.get('/1200x800.jpg')
+        self.assertRedirects(response, f'{self.origin}/1200x800.jpg', fetch_redirect_response=False)
+        self.assertEqual(RemoteImageHandler.hits, [])
+
+    def test_follows_redirects_up_to_the_limit(self):
+        response = self.get(f"/redirect?to={quote('/1200x800.jpg')}")
+        self.assertEqual(Image.open(BytesIO(response.content)).size, (240, 160))
+        self.assertEqual(RemoteImageHandler.hits[1:], ['/1200x800.jpg'])
+
+        RemoteImageHandler.hits = []
+        loop = '/redirect?to=' + quote('/redirect?to=' + quote('/redirect?to=' + quote(
+            '/redirect?to=' + quote('/1200x800.jpg'))))
+        response = self.get(loop)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(RemoteImageHandler.hits), 4)
+
+    def test_checks_every_redirect_target(self):
+        port = self.server.server_port
+        with override_settings(IMAGE_PROXY={**proxy.config(), 'ALLOW_PRIVATE_HOSTS': ['127.0.0.1']}):
+            for target in [f'http://localhost:{port}/1200x800.jpg', 'file:///etc/passwd']:
+                RemoteImageHandler.hits = []
+                response = self.get(f'/redirect?to={quote(target)}')
+                self.assertEqual(response.status_code, 302)
+                self.assertEqual(len(RemoteImageHandler.hits), 1)
+
+    def test_failed_fetch_redirects_to_origin_and_is_remembered(self):
+        for _ in range(2):
+            response = self.get('/missing.jpg')
+            self.assertEqual(response['Location'], f'{self.origin}/missing.jpg')
+        self.assertEqual(RemoteImageHandler.hits, ['/missing.jpg'])
+
+    def test_concurrent_misses_share_one_fetch(self):
+        RemoteImageHandler.delay = 0.2
+        url = f'{self.origin}/800x600.jpg'
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: proxy.get_image(url, 240, 'jpeg'), range(8)))
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(RemoteImageHandler.hits, ['/800x600.jpg'])
+
+    def test_evicts_least_recently_used(self):
+        store = proxy.DiskLRU(proxy.config()['ROOT'], max_bytes=250, low_water=1)
+        for key in ('aa1', 'bb2', 'cc3'):
+            store.set(key, b'x' * 100)
+            time.sleep(0.01)
+        self.assertIsNone(store.get('aa1'))
+        self.assertIsNotNone(store.get('bb2'))
+        self.assertIsNotNone(store.get('cc3'))
+
+    def test_storefront_grid_uses_proxy(self):
+        vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        Product.objects.create(vendor=vendor, name='Hat', price=5, image_url=f'{self.origin}/1200x800.jpg')
+        response = self.client.get(
+            reverse('vendors:vendor_store', args=[vendor.slug]), HTTP_HOST=f'{vendor.slug}.lvh.me',
+        )
+        self.assertContains(response, reverse('image_proxy'))
+        self.assertNotContains(response, f'src="{self.origin}')
+
+
+class BulkImportExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        cls.clothing = Category.objects.create(name='Clothing')
+        cls.shirts = Category.objects.create(name='Shirts', parent=cls.clothing)
+
+    def run_import(self, text, fmt='csv', **kwargs):
+        return bulk.import_products(self.vendor, BytesIO(text.encode()), fmt, **kwargs)
+
+    def test_csv_upsert_by_sku(self):
+        Product.objects.create(vendor=self.vendor, sku='TS-1', name='Old tee', price=1, stock=1)
+        result = self.run_import(
+            'sku,name,price,stock,category,is_active\n'
+            'TS-1,Tee,4500.00,12,clothing > shirts,true\n'
+            'TS-2,Polo,6000,,Shirts,0\n'
+            'TS-3,Cap,abc,1,,\n'
+            'TS-4,Scarf,10,1,Toys,\n'
+            ',Nameless,10,1,,\n'
+        )
+        self.assertEqual((result.rows, result.created, result.updated, result.failed), (5, 1, 1, 3))
+        self.assertEqual([line for line, _ in result.errors], [4, 5, 6])
+        self.assertIn('price', result.errors[0][1])
+
+        tee = Product.objects.get(sku='TS-1')
+        self.assertEqual((tee.name, tee.stock, tee.category, tee.is_active), ('Tee', 12, self.shirts, True))
+        polo = Product.objects.get(sku='TS-2')
+        self.assertEqual((polo.stock, polo.category, polo.is_active), (0, self.shirts, False))
+        # Bulk writes skip signals; the import indexes them itself
+        self.assertEqual([p.sku for p in search(Product.objects.all(), 'polo')], ['TS-2'])
+
+    def test_batches_cost_constant_queries(self):
+        def rows(count):
+            return 'sku,name,price\n' + ''.join(f'S{i},Item {i},{i}\n' for i in range(count))
+
+        with CaptureQueriesContext(connection) as small:
+            self.run_import(rows(10), batch_size=50)
+        Product.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            result = self.run_import(rows(200), batch_size=50)
+        self.assertEqual(result.created, 200)
+        # One category read, then the same statements per batch of 50
+        per_batch = len(small) - 1
+        self.assertEqual(len(large), 1 + 4 * per_batch)
+
+    def test_export_round_trips(self):
+        self.run_import(
+            '{"sku": "J-1", "name": "Jacket", "price": 99.5, "category": "Clothing", "order_via_whatsapp": true}\n'
+            'not json\n', fmt='jsonl',
+        )
+        csv_text = ''.join(bulk.export_products(self.vendor, 'csv'))
+        self.assertEqual(
+            csv_text.splitlines()[1],
+            'J-1,Jacket,,99.50,0,Clothing,,true,true',
+        )
+        Product.objects.filter(sku='J-1').update(name='Renamed', category=None)
+        result = self.run_import(csv_text)
+        self.assertEqual((result.created, result.updated, result.failed), (0, 1, 0))
+        jacket = Product.objects.get(sku='J-1')
+        self.assertEqual((jacket.name, jacket.category, jacket.order_via_whatsapp), ('Jacket', self.clothing, True))
+
+        line = json.loads(''.join(bulk.export_products(self.vendor, 'jsonl')))
+        self.assertEqual((line['price'], line['category']), ('99.50', 'Clothing'))
+
+    def test_import_reprices_carts(self):
+        self.run_import('sku,name,price\nH-1,Hat,5.00\nS-1,Shoe,10.00\n')
+        cart = Cart.objects.create(vendor=self.vendor, session_key='s')
+        cart.add_product(Product.objects.get(sku='H-1'), 2)
+        cart.add_product(Product.objects.get(sku='S-1'))
+        self.run_import('sku,name,price\nH-1,Hat,7.50\nN-1,New,1.00\n')
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.total), (3, Decimal('25.00')))
+
+    def test_products_without_sku_round_trip(self):
+        hat = Product.objects.create(vendor=self.vendor, name='Hat', price=5)
+        cap = Product.objects.create(vendor=self.vendor, name='Cap', price=5)
+        Product.objects.create(vendor=self.vendor, sku=f'ID-{cap.pk}', name='Beanie', price=5)
+        csv_text = ''.join(bulk.export_products(self.vendor, 'csv'))
+        self.assertIn(f'ID-{hat.pk},Hat,', csv_text)
+        self.assertIn(',Cap,', csv_text)   # its generated SKU is taken: left blank
+        hat.refresh_from_db()
+        self.assertIsNone(hat.sku)         # the export doesn't write
+
+        result = self.run_import(csv_text.replace('Hat', 'Sun hat'))
+        self.assertEqual((result.created, result.updated, result.failed), (0, 2, 1))
+        hat.refresh_from_db()
+        self.assertEqual((hat.name, hat.sku), ('Sun hat', f'ID-{hat.pk}'))
+        self.assertEqual(Product.objects.filter(vendor=self.vendor).count(), 3)
+
+
+class SyntheticDataTests(TestCase):
+    spec = synthetic.Spec(vendors=3, products=90, depth=3, fanout=2, months=1, orders_per_day=6, carts=4, seed=7)
+    end = date(2026, 3, 31)
+
+    def snapshot(self):
+        return (
+            list(Vendor.objects.order_by('pk').values_list('store_name', 'slug')),
+            list(Category.objects.tree().values_list('name', 'depth')),
+            list(Product.objects.order_by('pk').values_list('sku', 'name', 'price', 'category__name', 'stock')),
+            list(Order.objects.order_by('pk').values_list('customer_name', 'customer_phone', 'total_cents', 'status', 'created_at')),
+        )
+
+    def test_generates_consistent_deterministic_data(self):
+        result = synthetic.generate(self.spec, end=self.end)
+
+        self.assertEqual(Vendor.objects.count(), 3)
+        self.assertEqual(Product.objects.count(), 90)
+        self.assertEqual(result.counts['orders'], Order.objects.count())
+        # Busiest vendor first, and every product on a leaf of the tree
+        counts = [vendor.products.count() for vendor in Vendor.objects.order_by('pk')]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertEqual(Category.objects.order_by('-depth').first().depth, 3)
+        self.assertFalse(Product.objects.filter(category__depth__lt=3).exists())
+        # Orders add up and the derived data was rebuilt
+        for order in Order.objects.prefetch_related('items')[:20]:
+            self.assertEqual(order.total_cents, sum(i.unit_price_cents * i.quantity for i in order.items.all()))
+        self.assertEqual(sum(DailySales.objects.values_list('orders', flat=True)), Order.objects.count())
+        product = Product.objects.filter(is_active=True).first()
+        self.assertIn(product, search(Product.objects.all(), product.name.split()[1]))
+
+        with self.assertRaises(synthetic.AlreadyGenerated):
+            synthetic.generate(self.spec, end=self.end)
+
+        first = self.snapshot()
+        User.objects.filter(username__startswith=synthetic.USERNAME_PREFIX).delete()
+        Category.objects.filter(name=synthetic.ROOT_CATEGORY).delete()
+        synthetic.generate(self.spec, end=self.end)
+        self.assertEqual(self.snapshot(), first)
+
+
+class CatalogQueryBudgetTests(QueryBudgetTestCase):
+    """Catalog pages cost the same for 1, 10 or 100 products."""
+
+    def test_index(self):
+        self.assertBudget(4, lambda shop: shop.client.get(reverse('products_index'), HTTP_HOST='lvh.me'))
+        self.assertBudget(2, lambda shop: shop.shopper.get(reverse('products_index')))
+
+    def test_category_and_detail(self):
+        self.assertBudget(4, lambda shop: shop.shopper.get(reverse('category_view', args=[shop.category.pk])))
+        self.assertBudget(2, lambda shop: shop.shopper.get(reverse('product_detail', args=[shop.product.pk])))
+
+    def test_image_proxy_rejects_without_queries(self):
+        self.assertBudget(0, lambda shop: shop.shopper.get(
+            reverse('image_proxy'), {'url': 'http://example.com/a.jpg', 'w': 200, 's': 'bad'}), status=400)
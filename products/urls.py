@@ -6,4 +6,5 @@ urlpatterns = [
     path("", views.products_index, name="products_index"),
     path("category/<int:pk>/", views.category_view, name="category_view"),
     path("product/<int:pk>/", views.product_detail, name="product_detail"),
+    path("image/", views.image_proxy, name="image_proxy"),
 ]
\ No newline at end of file
@@ -1,7 +1,24 @@
 # products/views.py
+import hashlib
+
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
 from django.shortcuts import render, get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_safe
+from vendors.pagination import KeysetPaginator
+from . import proxy
+from .conditional import catalog_condition
 from .models import Product, Category
 
+PER_PAGE = 24
+
+
+def product_page(request, products):
+    """Newest first, a keyset page at a time; the cards show the vendor's name."""
+    products = products.select_related("vendor")
+    return KeysetPaginator(products, PER_PAGE, "-created_at").get_page(request.GET.get("cursor"))
+
+@catalog_condition
 def products_index(request):
     # if on a vendor subdomain, show only that vendor's products
     vendor = getattr(request, "vendor", None)
@@ -9,21 +26,63 @@ def products_index(request):
         qs = Product.objects.filter(vendor=vendor, is_active=True)
     else:
         qs = Product.objects.filter(is_active=True)
-    return render(request, "products/index.html", {"products": qs, "vendor": vendor})
+    return render(request, "products/index.html", {"page_obj": product_page(request, qs), "vendor": vendor})
 
+@catalog_condition
 def category_view(request, pk):
     category = get_object_or_404(Category, pk=pk)
     vendor = getattr(request, "vendor", None)
+    # Products anywhere under this category, not just directly in it
+    products = Product.objects.in_category(category).filter(is_active=True)
     if vendor:
-        products = category.product_set.filter(vendor=vendor, is_active=True)
-    else:
-        products = category.product_set.filter(is_active=True)
-    return render(request, "products/category.html", {"category": category, "products": products})
+        products = products.filter(vendor=vendor)
+    # Breadcrumbs: the ancestors' ids are in the materialized path
+    ancestors = Category.objects.filter(pk__in=[int(s) for s in category.path.split("/") if s]).tree()
+    return render(request, "products/category.html", {
+        "category": category, "ancestors": ancestors, "page_obj": product_page(request, products), "vendor": vendor,
+    })
+
+def product_shown(request, pk):
+    """product_detail's 404 checks in one query, run before any 304."""
+    products = Product.objects.filter(pk=pk, is_active=True)
+    vendor = getattr(request, "vendor", None)
+    if vendor:
+        products = products.filter(vendor=vendor)
+    return products.exists()
 
+@catalog_condition(exists=product_shown)
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
+    product = get_object_or_404(Product.objects.select_related("vendor", "category"), pk=pk, is_active=True)
     # ensure product belongs to request.vendor when on subdomain
     vendor = getattr(request, "vendor", None)
     if vendor and product.vendor != vendor:
         raise Http404("Product not found on this store")
-    return render(request, "products/detail.html", {"product": product, "vendor": vendor})
\ No newline at end of file
+    return render(request, "products/detail.html", {"product": product, "vendor": vendor})
+
+
+@require_safe
+def image_proxy(request):
+    """A remote image_url resized and served from the local disk cache (see products/proxy.py)."""
+    url = request.GET.get('url', '')
+    try:
+        width = int(request.GET.get('w', ''))
+    except ValueError:
+        return HttpResponseBadRequest()
+    if not proxy.verify(url, width, request.GET.get('s', '')):
+        return HttpResponseBadRequest()
+
+    fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    try:
+        data = proxy.get_image(url, width, fmt)
+    except proxy.ProxyError:
+        # Let the browser try the origin itself
+        response = HttpResponseRedirect(url)
+        patch_cache_control(response, max_age=proxy.config()['FAILURE_TTL'])
+        return response
+
+    etag = f'"{hashlib.sha1(data).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag) or HttpResponse(data, content_type=f'image/{fmt}')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=proxy.config()['MAX_AGE'])
+    patch_vary_headers(response, ['Accept'])
+    return response
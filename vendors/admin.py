@@ -1,6 +1,20 @@
 from django.contrib import admin
-from .models import Vendor
+from .models import Vendor, VendorDomain
+
+
+class VendorDomainInline(admin.TabularInline):
+    model = VendorDomain
+    extra = 0
+
+
 # Register your models here.
 @admin.register(Vendor)
 class VendorAdmin(admin.ModelAdmin):
-    list_display = [field.name for field in Vendor._meta.fields]
\ No newline at end of file
+    list_display = [field.name for field in Vendor._meta.fields]
+    inlines = [VendorDomainInline]
+
+
+@admin.register(VendorDomain)
+class VendorDomainAdmin(admin.ModelAdmin):
+    list_display = ('domain', 'vendor', 'created_at')
+    search_fields = ('domain', 'vendor__store_name')
@@ -1,5 +1,6 @@
 # products/forms.py
 from django import forms
+from orders.models import Order
 from products.models import Product, Category
 
 
@@ -7,8 +8,8 @@ class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
         fields = [
-            'category', 'name', 'description', 'price',
-            'stock', 'image_url', 'order_via_whatsapp', 'is_active'
+            'category', 'sku', 'name', 'description', 'price',
+            'stock', 'image', 'image_url', 'order_via_whatsapp', 'is_active'
         ]
         widgets = {
             'description': forms.Textarea(attrs={'rows': 3}),
@@ -16,6 +17,55 @@ class ProductForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Show indented categories
-        self.fields['category'].queryset = Category.objects.all()
-        self.fields['category'].empty_label = "— Select Category —"
\ No newline at end of file
+        # Show indented categories (whole tree in one query, see Category.path)
+        self.fields['category'].queryset = Category.objects.tree()
+        self.fields['category'].label_from_instance = lambda c: c.get_indented_name
+        self.fields['category'].empty_label = "— Select Category —"
+
+    def clean_sku(self):
+        # vendor isn't a form field, so the model's (vendor, sku) constraint
+        # isn't checked for us; pass instance=Product(vendor=...) to create
+        sku = (self.cleaned_data['sku'] or '').strip() or None
+        vendor_id = self.instance.vendor_id
+        if sku and vendor_id and Product.objects.filter(vendor_id=vendor_id, sku=sku)\
+                .exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("You already have a product with this SKU.")
+        return sku
+
+
+class ProductImportForm(forms.ModelForm):
+    """
+    One row of a bulk import (products/bulk.py). Same field rules as
+    ProductForm; the category is resolved by name beforehand, and SKU
+    clashes are upserts rather than errors.
+    """
+    class Meta:
+        model = Product
+        fields = [
+            'sku', 'name', 'description', 'price',
+            'stock', 'image_url', 'order_via_whatsapp', 'is_active'
+        ]
+
+    def clean_sku(self):
+        sku = (self.cleaned_data['sku'] or '').strip()
+        if not sku:
+            raise forms.ValidationError("A SKU is required to import a product.")
+        return sku
+
+
+class ProductUploadForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row, or JSON Lines (.jsonl)")
+
+
+class OrderFilterForm(forms.Form):
+    status = forms.ChoiceField(choices=[('', 'All statuses')] + Order.STATUS_CHOICES, required=False)
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    customer = forms.CharField(
+        required=False, max_length=200,
+        widget=forms.TextInput(attrs={'placeholder': 'Phone or name starts with…'}),
+    )
+
+    def filters(self):
+        """Keyword arguments for ``Order.objects.filter_by``, once the form is valid."""
+        return {name: value for name, value in self.cleaned_data.items() if value}
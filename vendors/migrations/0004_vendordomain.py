@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0003_rename_phone_vendor_phone_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorDomain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=253, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='domains', to='vendors.vendor')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0004_vendordomain'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vendor',
+            name='logo_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
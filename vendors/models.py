@@ -14,6 +14,8 @@ class Vendor(models.Model):
     instagram = models.URLField(blank=True, null=True)
     facebook = models.URLField(blank=True, null=True)
     logo = models.ImageField(upload_to='vendor_logos/', blank=True, null=True)
+    # Resized copies of ``logo``, see products/images.py
+    logo_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     date_created = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
@@ -28,4 +30,21 @@ class Vendor(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return self.store_name
\ No newline at end of file
+        return self.store_name
+
+class VendorDomain(models.Model):
+    """A custom domain (e.g. shop.example.com) serving a vendor's store."""
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='domains')
+    domain = models.CharField(max_length=253, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def normalize(host):
+        return host.split(':')[0].strip().rstrip('.').lower()
+
+    def save(self, *args, **kwargs):
+        self.domain = self.normalize(self.domain)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.domain
@@ -0,0 +1,98 @@
+# vendors/pagination.py
+"""
+Keyset (cursor) pagination.
+
+``Paginator`` pays a ``COUNT(*)`` per page and an ``OFFSET`` that grows with
+the page number. ``KeysetPaginator`` instead remembers the sort key and id of
+the last row it handed out (in a signed, opaque cursor) and asks for the rows
+after it, so page 500 costs the same indexed range read as page 1. There is
+no page count or "jump to page N" — only "next".
+"""
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'vendors.pagination.cursor'
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``ordering`` — a single model field such as
+    ``'price'`` or ``'-created_at'``. The primary key is appended as a
+    tiebreaker in the same direction so the order is total.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.per_page = per_page
+        self.descending = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+        prefix = '-' if self.descending else ''
+        self.ordering = (ordering, f'{prefix}pk')
+        self.queryset = queryset.order_by(*self.ordering)
+
+    # -------- cursor encoding --------
+    def encode_cursor(self, obj):
+        value = getattr(obj, self.field)
+        return signing.dumps(
+            [self.ordering[0], str(value), obj.pk], salt=CURSOR_SALT, compress=True
+        )
+
+    def decode_cursor(self, cursor):
+        """Return ``(value, pk)`` or None for a missing, stale or tampered cursor."""
+        if not cursor:
+            return None
+        try:
+            ordering, value, pk = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        if ordering != self.ordering[0]:
+            return None
+        model = self.queryset.model
+        try:
+            value = model._meta.get_field(self.field).to_python(value)
+            pk = model._meta.pk.to_python(pk)
+        except Exception:
+            return None
+        if value is None or pk is None:
+            return None
+        return value, pk
+
+    # -------- paging --------
+    def after(self, value, pk):
+        # field <= value AND (field < value OR (field = value AND pk < last))
+        # keeps a plain range on the leading index column.
+        op = 'lt' if self.descending else 'gt'
+        edge = 'lte' if self.descending else 'gte'
+        return self.queryset.filter(
+            Q(**{f'{self.field}__{edge}': value}),
+            Q(**{f'{self.field}__{op}': value}) | Q(**{self.field: value, f'pk__{op}': pk}),
+        )
+
+    def get_page(self, cursor=None):
+        position = self.decode_cursor(cursor)
+        qs = self.queryset if position is None else self.after(*position)
+
+        rows = list(qs[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return CursorPage(rows, next_cursor)
@@ -0,0 +1,274 @@
+# vendors/resolver.py
+"""
+Host → Vendor resolution.
+
+Every storefront request (pages, AJAX filters, cart-count polls) needs the
+vendor behind the Host header, so lookups are answered from a bounded
+in-process LRU with a TTL, optionally backed by a shared Django cache so
+workers warm each other. Entries are keyed by ``slug:<slug>`` for
+``<slug>.lvh.me`` style subdomains and ``domain:<host>`` for custom domains
+(see ``VendorDomain``). Misses are cached too, so unknown hosts don't hit the
+database on every request.
+
+Entries are dropped by the signal handlers in ``vendors.signals`` whenever a
+Vendor or VendorDomain changes. Other worker processes only see that through
+the shared tier, so keep the local TTL short when running several workers.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.http import Http404
+
+from config import metrics
+from .models import Vendor, VendorDomain
+
+DEFAULTS = {
+    'MAX_ENTRIES': 1024,
+    'TTL': 60,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+}
+
+SHARED_PREFIX = 'vendor-host:'
+NOT_FOUND = '!not-found'
+
+
+class LocalCache:
+    """Thread-safe LRU mapping with a per-entry TTL."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_vendor(self, vendor_id):
+        with self._lock:
+            stale = [
+                key for key, (_, value) in self._data.items()
+                if isinstance(value, Vendor) and value.pk == vendor_id
+            ]
+            for key in stale:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'VENDOR_HOST_CACHE', {})}
+
+
+def local_cache():
+    global _local
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                conf = _config()
+                _local = LocalCache(conf['MAX_ENTRIES'], conf['TTL'])
+    return _local
+
+
+def _shared_cache():
+    alias = _config()['SHARED_CACHE']
+    return caches[alias] if alias else None
+
+
+def _reset(**kwargs):
+    global _local
+    if kwargs.get('setting') in ('VENDOR_HOST_CACHE', 'VENDOR_BASE_DOMAINS', 'CACHES'):
+        _local = None
+
+
+setting_changed.connect(_reset)
+
+
+# ----------------------------------------------------------------------
+# Lookups
+# ----------------------------------------------------------------------
+def _lookup(key, load):
+    local = local_cache()
+    value = local.get(key)
+    metrics.cache_lookup('vendor_host_local', value is not None)
+
+    if value is None:
+        shared = _shared_cache()
+        if shared is not None:
+            value = shared.get(SHARED_PREFIX + key)
+            metrics.cache_lookup('vendor_host_shared', value is not None)
+        if value is None:
+            value = load() or NOT_FOUND
+            if shared is not None:
+                shared.set(SHARED_PREFIX + key, value, _config()['SHARED_TTL'])
+        local.set(key, value)
+
+    if value == NOT_FOUND:
+        return None
+    # Hand out a copy so a view mutating request.vendor can't leak the
+    # change into other requests sharing the cached instance.
+    return copy.copy(value)
+
+
+def vendor_for_slug(slug):
+    slug = slug.lower()
+    return _lookup(f'slug:{slug}', lambda: Vendor.objects.filter(slug=slug).first())
+
+
+def vendor_for_domain(domain):
+    domain = VendorDomain.normalize(domain)
+    return _lookup(
+        f'domain:{domain}',
+        lambda: Vendor.objects.filter(domains__domain=domain).first(),
+    )
+
+
+def base_domains():
+    return getattr(settings, 'VENDOR_BASE_DOMAINS', ['lvh.me'])
+
+
+def subdomain_slug(host):
+    """
+    Return the vendor slug for ``<slug>.<base domain>``, '' for a bare base
+    domain and None when the host is not under any base domain.
+    """
+    for base in base_domains():
+        if host == base:
+            return ''
+        if host.endswith('.' + base):
+            return host[:-len(base) - 1].split('.')[-1]
+    return None
+
+
+def resolve_host(host):
+    """
+    Return ``(vendor, is_vendor_subdomain)`` for a request host.
+
+    Raises Http404 for an unknown ``<slug>.<base domain>`` host; any other
+    unknown host is treated as the main site.
+    """
+    host = VendorDomain.normalize(host)
+    slug = subdomain_slug(host)
+    if slug:
+        vendor = vendor_for_slug(slug)
+        if vendor is None:
+            raise Http404("Vendor not found")
+        return vendor, True
+    if slug is None:
+        vendor = vendor_for_domain(host)
+        if vendor is not None:
+            return vendor, True
+    return None, False
+
+
+def get_vendor_or_404(vendor_slug):
+    vendor = vendor_for_slug(vendor_slug)
+    if vendor is None:
+        raise Http404("Vendor not found")
+    return vendor
+
+
+# ----------------------------------------------------------------------
+# Invalidation (called from vendors.signals)
+# ----------------------------------------------------------------------
+def invalidate(keys, vendor_id=None):
+    local = local_cache()
+    for key in keys:
+        local.delete(key)
+    if vendor_id is not None:
+        local.delete_vendor(vendor_id)
+
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([SHARED_PREFIX + key for key in keys])
+
+
+def invalidate_vendor(vendor, *slugs):
+    keys = {f'slug:{s.lower()}' for s in (vendor.slug, *slugs) if s}
+    if vendor.pk is not None:
+        keys.update(
+            f'domain:{d}'
+            for d in VendorDomain.objects.filter(vendor_id=vendor.pk).values_list('domain', flat=True)
+        )
+    invalidate(keys, vendor.pk)
+
+
+def invalidate_domain(*domains):
+    invalidate({f'domain:{VendorDomain.normalize(d)}' for d in domains if d})
+
+
+def clear():
+    local_cache().clear()
+
+
+# ----------------------------------------------------------------------
+# Async variants: answered from the local cache on the event loop, and
+# only fall back to a worker thread for the shared cache / database.
+# ----------------------------------------------------------------------
+def _local_hit(key):
+    value = local_cache().get(key)
+    if value is None:
+        # Counted as a miss by the sync lookup it falls back to
+        return False, None
+    metrics.cache_lookup('vendor_host_local', True)
+    return True, (None if value == NOT_FOUND else copy.copy(value))
+
+
+async def aresolve_host(host):
+    normalized = VendorDomain.normalize(host)
+    slug = subdomain_slug(normalized)
+    key = f'slug:{slug}' if slug else f'domain:{normalized}' if slug is None else None
+    if key is not None:
+        hit, vendor = _local_hit(key)
+        if not hit:
+            return await sync_to_async(resolve_host)(host)
+        if slug and vendor is None:
+            raise Http404("Vendor not found")
+        if vendor is not None:
+            return vendor, True
+    return None, False
+
+
+async def aget_vendor_or_404(vendor_slug):
+    hit, vendor = _local_hit(f'slug:{vendor_slug.lower()}')
+    if not hit:
+        return await sync_to_async(get_vendor_or_404)(vendor_slug)
+    if vendor is None:
+        raise Http404("Vendor not found")
+    return vendor
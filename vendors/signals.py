@@ -0,0 +1,51 @@
+# vendors/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from products import catalog
+from . import resolver
+from .models import Vendor, VendorDomain
+
+
+# ----------------------------------------------------------------------
+# Host → vendor cache invalidation
+# ----------------------------------------------------------------------
+@receiver(pre_save, sender=Vendor)
+def remember_previous_slug(sender, instance, **kwargs):
+    instance._previous_slug = None
+    if instance.pk:
+        instance._previous_slug = (
+            Vendor.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Vendor)
+@receiver(post_delete, sender=Vendor)
+def invalidate_vendor_hosts(sender, instance, **kwargs):
+    resolver.invalidate_vendor(instance, getattr(instance, '_previous_slug', None))
+
+
+@receiver(pre_save, sender=VendorDomain)
+def remember_previous_domain(sender, instance, **kwargs):
+    instance._previous_domain = None
+    if instance.pk:
+        instance._previous_domain = (
+            VendorDomain.objects.filter(pk=instance.pk).values_list('domain', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=VendorDomain)
+@receiver(post_delete, sender=VendorDomain)
+def invalidate_domain_host(sender, instance, **kwargs):
+    resolver.invalidate_domain(instance.domain, getattr(instance, '_previous_domain', None))
+
+
+# ----------------------------------------------------------------------
+# Catalog versions for storefront pages (products/catalog.py)
+# ----------------------------------------------------------------------
+@receiver(post_save, sender=Vendor)
+@receiver(post_delete, sender=Vendor)
+def bump_vendor_catalog(sender, instance, using, **kwargs):
+    # Storefront pages show the store's name and logo, so their validators
+    # and cached fragments have to change with them
+    catalog.bump(instance.pk, using=using)
@@ -1,3 +1,765 @@
-from django.test import TestCase
+import inspect
+import json
+import math
+import re
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cart.models import Cart
+from config import metrics
+from config.middleware.metrics import MetricsMiddleware
+from config.middleware.sql_budget import SQLBudgetMiddleware
+from orders.models import Order, OrderItem
+from orders.services import EmptyCartError, place_order
+from products.models import Category, Product
+from products import bulk, search
+from config.testing import QueryBudgetTestCase
+from . import resolver
+from .models import Vendor, VendorDomain
+from .pagination import CURSOR_SALT
+
 
 # Create your tests here.
+class StorefrontQueryPlanTests(TestCase):
+    """
+    Run EXPLAIN QUERY PLAN over the storefront's hot querysets and fail if
+    SQLite would answer any of them with a full table scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='crescent', password='pw')
+        cls.vendor = Vendor.objects.create(user=cls.user, store_name='Crescent')
+        cls.category = Category.objects.create(name='Shoes')
+        for i in range(5):
+            Product.objects.create(
+                vendor=cls.vendor, category=cls.category, name=f'Shoe {i}', price=10 + i,
+            )
+        Order.objects.create(vendor=cls.vendor, customer_name='Ada', customer_phone='123')
+
+    def setUp(self):
+        # Cached grids would hide the queries whose plans we're checking
+        cache.clear()
+
+    def assertNoTableScan(self, sql, params=()):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN checks are SQLite specific')
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        for step in plan:
+            # "SCAN t" / "SCAN t USING INDEX i" walk every row; SEARCH is a
+            # keyed lookup. FTS5 virtual tables always report SCAN.
+            if re.match(r'SCAN \w+', step) and 'VIRTUAL TABLE' not in step:
+                self.fail(f'Table scan in plan {plan} for:\n{sql}')
+        return plan
+
+    def assertQuerysetUsesIndexes(self, queryset, sorted_by_index=False):
+        plan = self.assertNoTableScan(*queryset.query.sql_with_params())
+        if sorted_by_index:
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, str(queryset.query))
+
+    def assertViewUsesIndexes(self, url, sorted_by_index=False):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_HOST=f'{self.vendor.slug}.lvh.me')
+        self.assertLess(response.status_code, 400, url)
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            plan = self.assertNoTableScan(sql)
+            # A plain listing should come straight off the sort index
+            if sorted_by_index and sql.startswith('SELECT "products_product"."id"'):
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, sql)
+
+    def test_vendor_store_sorts(self):
+        url = reverse('vendors:vendor_store', args=[self.vendor.slug])
+        for params in [
+            '', '?sort=price_asc', '?sort=price_desc', '?sort=name_asc', '?sort=name_desc',
+            '?sort=date_asc', '?ajax=1&cursor=', '?ajax=1&cursor=&sort=price_desc',
+        ]:
+            with self.subTest(params=params):
+                self.assertViewUsesIndexes(url + params, sorted_by_index=True)
+
+    def test_vendor_store_filters(self):
+        url = reverse('vendors:vendor_store', args=[self.vendor.slug])
+        for params in [
+            f'?category={self.category.id}', '?min_price=5&max_price=50', '?q=shoe',
+        ]:
+            with self.subTest(params=params):
+                self.assertViewUsesIndexes(url + params)
+
+    def test_vendor_orders(self):
+        self.assertQuerysetUsesIndexes(
+            self.vendor.orders.all().order_by('-created_at'), sorted_by_index=True,
+        )
+
+    def test_cart_lookups(self):
+        self.assertViewUsesIndexes(reverse('cart:view_cart', args=[self.vendor.slug]))
+        self.assertQuerysetUsesIndexes(
+            Cart.objects.filter(session_key='abc', vendor=self.vendor)
+        )
+        self.assertQuerysetUsesIndexes(
+            Cart.objects.filter(user=self.user, vendor=self.vendor).order_by('pk')[:1],
+            sorted_by_index=True,
+        )
+
+
+class StorefrontCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        cls.shoes = Category.objects.create(name='Shoes')
+        cls.shoe = Product.objects.create(vendor=cls.vendor, category=cls.shoes, name='Red shoe', price=10)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('vendors:vendor_store', args=[self.vendor.slug])
+
+    def get(self, params=''):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url + params, HTTP_HOST=f'{self.vendor.slug}.lvh.me')
+        catalog_queries = [q['sql'] for q in ctx.captured_queries if 'products_' in q['sql']]
+        return response, catalog_queries
+
+    def test_repeat_visit_is_served_from_cache(self):
+        _, queries = self.get('?sort=price_asc')
+        self.assertTrue(queries)
+        response, queries = self.get('?sort=price_asc&utm_source=ad')
+        self.assertEqual(queries, [])
+        self.assertContains(response, 'Red shoe')
+
+        # The shared fragment must not carry anyone's CSRF token
+        response, queries = self.get('?sort=price_asc&ajax=1')
+        self.assertEqual(queries, [])
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_product_change_bumps_version(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shoe.name = 'Blue shoe'
+            self.shoe.save()
+        response, queries = self.get()
+        self.assertTrue(queries)
+        self.assertContains(response, 'Blue shoe')
+
+    def test_category_change_bumps_version(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shoes.name = 'Sneakers'
+            self.shoes.save()
+        response, _ = self.get()
+        self.assertContains(response, 'Sneakers')
+
+
+class StorefrontCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        Product.objects.bulk_create(
+            Product(vendor=cls.vendor, name=f'Shoe {i}', price=10 + i % 4) for i in range(30)
+        )
+        # Groups of five products share a created_at, across page boundaries
+        start = timezone.make_aware(datetime(2026, 3, 1, 9, 0))
+        for i, pk in enumerate(Product.objects.order_by('pk').values_list('pk', flat=True)):
+            Product.objects.filter(pk=pk).update(created_at=start + timedelta(hours=i // 5))
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('vendors:vendor_store', args=[self.vendor.slug])
+
+    def get(self, cursor='', **params):
+        response = self.client.get(
+            self.url, {'ajax': 1, 'cursor': cursor, **params}, HTTP_HOST=f'{self.vendor.slug}.lvh.me',
+        )
+        self.assertEqual(response.status_code, 200)
+        html = response.content.decode()
+        ids = [int(pk) for pk in re.findall(r'data-product-id="(\d+)"', html)]
+        next_cursor = re.search(r'data-next-cursor="([^"]+)"', html)
+        return ids, next_cursor and next_cursor[1]
+
+    def walk(self, **params):
+        seen, cursor = [], ''
+        while True:
+            ids, cursor = self.get(cursor, **params)
+            seen += ids
+            if cursor is None:
+                return seen
+
+    def test_pages_have_no_duplicates_or_gaps(self):
+        products = Product.objects.filter(vendor=self.vendor)
+        self.assertEqual(self.walk(), list(
+            products.order_by('-created_at', '-pk').values_list('pk', flat=True)))
+        self.assertEqual(self.walk(sort='date_asc'), list(
+            products.order_by('created_at', 'pk').values_list('pk', flat=True)))
+        self.assertEqual(self.walk(sort='price_desc'), list(
+            products.order_by('-price', '-pk').values_list('pk', flat=True)))
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        first_page, cursor = self.get()
+        _, price_cursor = self.get(sort='price_asc')
+        for bad in (
+            'garbage',
+            cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B'),   # tampered
+            price_cursor,                                          # another sort's cursor
+            signing.dumps(['-created_at', 'yesterday', 1], salt=CURSOR_SALT, compress=True),
+            signing.dumps(['-created_at', None, 1], salt=CURSOR_SALT, compress=True),
+            signing.dumps('-created_at', salt=CURSOR_SALT),
+        ):
+            with self.subTest(cursor=bad):
+                self.assertEqual(self.get(bad)[0], first_page)
+
+
+class ProductSearchViewTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='crescent')
+        self.vendor = Vendor.objects.create(user=self.owner, store_name='Crescent')
+        Product.objects.create(vendor=self.vendor, name='Blue Shirt', price=10)
+        Product.objects.create(vendor=self.vendor, name='Red Hat', price=5)
+        self.client.force_login(self.owner)
+        cache.clear()
+
+    def names(self, q):
+        store = self.client.get(
+            reverse('vendors:vendor_store', args=[self.vendor.slug]), {'q': q}, HTTP_HOST=f'{self.vendor.slug}.lvh.me',
+        )
+        dashboard = self.client.get(reverse('vendors:vendor_products'), {'q': q})
+        return [p.name for p in store.context['page_obj']], [p.name for p in dashboard.context['products']]
+
+    def test_query_without_words_is_not_ranked(self):
+        # No word tokens, so no FTS match: newest first, unfiltered
+        self.assertEqual(self.names('!!!'), (['Red Hat', 'Blue Shirt'], ['Red Hat', 'Blue Shirt']))
+        self.assertEqual(self.names('shirt'), (['Blue Shirt'], ['Blue Shirt']))
+
+    def test_fallback_without_index(self):
+        search.drop_index(connection)
+        self.addCleanup(search.create_index, connection)
+        self.assertEqual(self.names('shirt'), (['Blue Shirt'], ['Blue Shirt']))
+        self.assertEqual(self.names('!!!'), (['Red Hat', 'Blue Shirt'], ['Red Hat', 'Blue Shirt']))
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        cls.shoe = Product.objects.create(vendor=cls.vendor, name='Red shoe', price=10)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('vendors:vendor_store', args=[self.vendor.slug]) + '?sort=price_asc'
+        self.host = {'HTTP_HOST': f'{self.vendor.slug}.lvh.me'}
+        # First visit hands out the CSRF cookie, which is part of the ETag
+        self.client.get(self.url, **self.host)
+
+    def test_revalidation_is_answered_without_queries(self):
+        response = self.client.get(self.url, **self.host)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.host)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified, **self.host)
+        self.assertEqual(response.status_code, 304)
+
+        # Other parameters are another representation
+        response = self.client.get(self.url + '&page=2', HTTP_IF_NONE_MATCH=etag, **self.host)
+        self.assertEqual(response.status_code, 200)
+
+    def test_catalog_change_invalidates_etag(self):
+        etag = self.client.get(self.url, **self.host)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shoe.price = 12
+            self.shoe.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.host)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_store_change_invalidates_etag(self):
+        etag = self.client.get(self.url, **self.host)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor.store_name = 'Crescent & Co'
+            self.vendor.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.host)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Crescent &amp; Co')
+
+    def test_cart_change_invalidates_etag(self):
+        etag = self.client.get(self.url, **self.host)['ETag']
+        self.client.post(reverse('cart:add_to_cart', args=[self.vendor.slug, self.shoe.id]), **self.host)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.host)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_removed_product_is_not_revalidated(self):
+        url = reverse('product_detail', args=[self.shoe.pk])
+        etag = self.client.get(url, **self.host)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.host)
+        self.assertEqual(response.status_code, 304)
+
+        # A raw update skips the catalog bump; the ETag alone would still match
+        Product.objects.filter(pk=self.shoe.pk).update(is_active=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.host)
+        self.assertEqual(response.status_code, 404)
+
+        # Moving the product bumps only its new vendor's catalog
+        other = Vendor.objects.create(user=User.objects.create_user(username='other'), store_name='Other')
+        Product.objects.filter(pk=self.shoe.pk).update(is_active=True)
+        etag = self.client.get(url, **self.host)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shoe.vendor = other
+            self.shoe.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.host)
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductBulkDashboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='crescent', password='pw')
+        self.vendor = Vendor.objects.create(user=self.user, store_name='Crescent')
+        self.client.force_login(self.user)
+
+    def test_upload_then_export(self):
+        upload = SimpleUploadedFile('catalog.csv', b'sku,name,price\nA-1,Lamp,20\nA-2,Rug,\n')
+        response = self.client.post(reverse('vendors:vendor_product_import'), {'file': upload}, follow=True)
+        self.assertContains(response, '1 created, 0 updated, 1 failed')
+        self.assertContains(response, 'Line 3: price')
+
+        response = self.client.get(reverse('vendors:vendor_product_export') + '?format=csv')
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.splitlines()[1:], ['A-1,Lamp,,20.00,0,,,false,true'])
+
+    def test_manual_form_rejects_duplicate_sku(self):
+        Product.objects.create(vendor=self.vendor, sku='A-1', name='Lamp', price=20)
+        response = self.client.post(reverse('vendors:vendor_product_create'), {
+            'sku': 'A-1', 'name': 'Other lamp', 'price': '5', 'stock': '1', 'is_active': 'on',
+        })
+        self.assertContains(response, 'You already have a product with this SKU.')
+        self.assertEqual(self.vendor.products.count(), 1)
+
+
+class VendorOrderListTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='crescent', password='pw')
+        self.vendor = Vendor.objects.create(user=self.user, store_name='Crescent')
+        self.client.force_login(self.user)
+        self.start = timezone.make_aware(datetime(2026, 3, 1, 9, 0))
+
+    def add_orders(self, count, offset=0):
+        for i in range(offset, offset + count):
+            order = Order.objects.create(
+                vendor=self.vendor,
+                customer_name='Ada Obi' if i % 2 else 'Bola Ade',
+                customer_phone=f'+23480{i:08d}',
+                status='delivered' if i % 3 == 0 else 'pending',
+                created_at=self.start + timedelta(hours=i),
+            )
+            OrderItem.objects.create(order=order, product_name='Shoe', unit_price_cents=1000, quantity=2)
+            OrderItem.objects.create(order=order, product_name='Sock', unit_price_cents=500, quantity=1)
+
+    def ids(self, response):
+        return [order.id for order in response.context['page_obj']]
+
+    def get(self, **params):
+        return self.client.get(reverse('vendors:vendor_orders'), params)
+
+    def test_page_cost_does_not_grow(self):
+        self.add_orders(1)
+        self.get()
+        with CaptureQueriesContext(connection) as one:
+            self.get()
+        self.add_orders(59, offset=1)
+        with CaptureQueriesContext(connection) as sixty:
+            response = self.get()
+        self.assertEqual(len(sixty), len(one))
+        self.assertEqual(len(response.context['page_obj']), 25)
+        self.assertContains(response, '2 × Shoe')
+
+    def test_cursor_walks_every_order_once(self):
+        self.add_orders(60)
+        seen, cursor = [], None
+        while True:
+            response = self.get(**({'cursor': cursor} if cursor else {}))
+            seen += self.ids(response)
+            cursor = response.context['page_obj'].next_cursor
+            if cursor is None:
+                break
+        expected = list(Order.objects.order_by('-created_at').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_filters(self):
+        self.add_orders(12)
+        orders = Order.objects.order_by('-created_at', '-pk')
+
+        self.assertEqual(self.ids(self.get(status='delivered')), list(
+            orders.filter(status='delivered').values_list('id', flat=True)))
+        self.assertEqual(self.ids(self.get(customer='ada')), list(
+            orders.filter(customer_name='Ada Obi').values_list('id', flat=True)))
+        self.assertEqual(self.ids(self.get(customer='+2348000000001')), list(
+            orders.filter(customer_phone__startswith='+2348000000001').values_list('id', flat=True)))
+        self.assertEqual(len(self.ids(self.get(date_from='2026-03-01', date_to='2026-03-01'))), 12)
+        self.assertEqual(self.ids(self.get(date_from='2026-03-02')), [])
+
+        # A bad filter is reported, not dropped
+        response = self.get(date_from='2026-13-45')
+        self.assertContains(response, 'Enter a valid date.', status_code=400)
+        self.assertEqual(self.ids(response), [])
+        export = self.client.get(reverse('vendors:vendor_orders_export'), {'date_from': 'soon'})
+        self.assertEqual(export.status_code, 400)
+
+        # Filters carry over into the next-page and export links
+        response = self.get(status='pending', customer='Ada')
+        self.assertContains(response, 'status=pending&amp;customer=Ada&amp;format=csv')
+
+
+@override_settings(VENDOR_HOST_CACHE={'TTL': 3600})
+class VendorHostResolverTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = Vendor.objects.create(
+            user=User.objects.create_user(username='crescent'), store_name='Crescent',
+        )
+        cls.domain = VendorDomain.objects.create(vendor=cls.vendor, domain='Shop.Crescent.com')
+
+    def setUp(self):
+        resolver.clear()
+        self.addCleanup(resolver.clear)
+
+    def assertResolves(self, host, vendor, queries=1):
+        with self.assertNumQueries(queries):
+            found, is_vendor_host = resolver.resolve_host(host)
+        self.assertEqual((found, is_vendor_host), (vendor, vendor is not None))
+
+    def test_subdomain_and_custom_domain(self):
+        self.assertResolves('crescent.lvh.me:8000', self.vendor)
+        self.assertResolves('crescent.lvh.me', self.vendor, queries=0)
+        # The label right before the base domain is the slug
+        self.assertResolves('www.crescent.lvh.me', self.vendor, queries=0)
+        self.assertResolves('shop.crescent.com.', self.vendor)
+        self.assertResolves('SHOP.crescent.com', self.vendor, queries=0)
+        self.assertResolves('lvh.me', None, queries=0)
+
+    def test_unknown_hosts_are_cached(self):
+        self.assertResolves('elsewhere.example', None)
+        self.assertResolves('elsewhere.example', None, queries=0)
+        for _ in range(2):
+            with self.assertRaises(Http404):
+                resolver.resolve_host('nobody.lvh.me')
+        with self.assertNumQueries(0), self.assertRaises(Http404):
+            resolver.resolve_host('nobody.lvh.me')
+
+    def test_hands_out_copies(self):
+        first, _ = resolver.resolve_host('crescent.lvh.me')
+        first.store_name = 'Mutated'
+        second, _ = resolver.resolve_host('crescent.lvh.me')
+        self.assertEqual(second.store_name, 'Crescent')
+        self.assertIsNot(first, second)
+
+    def test_slug_change_invalidates(self):
+        resolver.resolve_host('crescent.lvh.me')
+        resolver.resolve_host('shop.crescent.com')
+        self.vendor.slug = 'crescent-co'
+        self.vendor.save()
+        with self.assertRaises(Http404):
+            resolver.resolve_host('crescent.lvh.me')
+        self.assertEqual(resolver.resolve_host('crescent-co.lvh.me')[0].slug, 'crescent-co')
+        self.assertEqual(resolver.resolve_host('shop.crescent.com')[0].slug, 'crescent-co')
+
+    def test_domain_change_and_delete_invalidate(self):
+        self.assertResolves('shop.crescent.com', self.vendor)
+        self.domain.domain = 'crescent.shop'
+        self.domain.save()
+        self.assertResolves('shop.crescent.com', None)
+        self.assertResolves('crescent.shop', self.vendor)
+        self.domain.delete()
+        self.assertResolves('crescent.shop', None)
+
+    async def test_async_resolution_uses_the_same_cache(self):
+        self.assertEqual((await resolver.aresolve_host('crescent.lvh.me'))[0].pk, self.vendor.pk)
+        # Warm: answered from the cache (update() sends no signal to drop it)
+        await Vendor.objects.filter(pk=self.vendor.pk).aupdate(store_name='Renamed')
+        vendor, is_vendor_host = await resolver.aresolve_host('crescent.lvh.me')
+        self.assertEqual((vendor.store_name, is_vendor_host), ('Crescent', True))
+        with self.assertRaises(Http404):
+            await resolver.aresolve_host('nobody.lvh.me')
+
+
+class MainSitePageTests(TestCase):
+
+    def test_home_counts_products_in_the_vendor_query(self):
+        def home():
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get('/', HTTP_HOST='lvh.me')
+            return response, len(captured)
+
+        first = Vendor.objects.create(user=User.objects.create_user(username='first'), store_name='First')
+        Product.objects.create(vendor=first, name='Shoe', price=1)
+        Product.objects.create(vendor=first, name='Hat', price=1)
+        response, one_vendor = home()
+        self.assertContains(response, '2 products')
+        for i in range(3):
+            Vendor.objects.create(user=User.objects.create_user(username=f'v{i}'), store_name=f'Vendor {i}')
+        response, four_vendors = home()
+        self.assertContains(response, '0 products', count=3)
+        self.assertEqual(four_vendors, one_vendor)
+
+    def test_profile_update_redirects_to_the_profile(self):
+        owner = User.objects.create_user(username='owner', password='pw')
+        vendor = Vendor.objects.create(user=owner, store_name='Before')
+        self.client.force_login(owner)
+        response = self.client.post(reverse('vendors:vendor_profile'), {'store_name': 'After', 'description': 'New'})
+        self.assertRedirects(response, reverse('vendors:vendor_profile'))
+        vendor.refresh_from_db()
+        self.assertEqual(vendor.store_name, 'After')
+
+
+@override_settings(SQL_BUDGET={'ENABLED': True, 'REPEAT_THRESHOLD': 2, 'MAX_QUERIES': 50})
+class SQLBudgetMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.vendor = Vendor.objects.create(user=User.objects.create_user(username='crescent'), store_name='Crescent')
+        self.products = [Product.objects.create(vendor=self.vendor, name=f'P{i}', price=1) for i in range(4)]
+
+    def test_storefront_request_is_measured(self):
+        with self.assertLogs('config.middleware.sql_budget', 'INFO') as logs:
+            response = self.client.get(
+                reverse('vendors:vendor_store', args=[self.vendor.slug]), HTTP_HOST=f'{self.vendor.slug}.lvh.me',
+            )
+        self.assertRegex(response['Server-Timing'], r'^sql;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+$')
+        record = json.loads(logs.records[0].getMessage().split(' ', 1)[1])
+        self.assertEqual(record['view'], 'vendors:vendor_store')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertEqual(record['repeated'], [])
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+
+    def test_repeated_statement_is_flagged(self):
+        def view(request):
+            # One query per product, with different ids: the same fingerprint
+            for product in self.products:
+                Product.objects.get(pk=product.pk)
+            # IN lists of any length: one fingerprint
+            for ids in ([1], [1, 2], [1, 2, 3]):
+                Product.objects.filter(pk__in=ids).count()
+            return HttpResponse()
+
+        with self.assertLogs('config.middleware.sql_budget', 'INFO') as logs:
+            response = SQLBudgetMiddleware(view)(RequestFactory().get('/'))
+        record = logs.records[0].sql_budget
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertEqual(record['queries'], 7)
+        self.assertEqual([r['count'] for r in record['repeated']], [4, 3])
+        self.assertIn('IN (...)', record['repeated'][1]['sql'])
+        self.assertTrue(record['repeated'][0]['sql'].startswith('SELECT "products_product"."id"'))
+        self.assertIn(f'desc="{record["repeated"][0]["id"]} x4"', response['Server-Timing'])
+
+    def test_disabled_by_default(self):
+        with override_settings(SQL_BUDGET={}):
+            with self.assertRaises(MiddlewareNotUsed):
+                SQLBudgetMiddleware(lambda request: HttpResponse())
+
+
+
+METRICS_ON = {'ENABLED': True}
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.vendor = Vendor.objects.create(user=User.objects.create_user(username='crescent'), store_name='Crescent')
+        self.product = Product.objects.create(vendor=self.vendor, name='Shoe', price=10, stock=5)
+        cache.clear()
+
+    def scrape(self, **extra):
+        response = self.client.get('/-/metrics', **extra)
+        return response, response.content.decode()
+
+    @override_settings(METRICS=METRICS_ON)
+    def test_requests_and_caches_are_exposed(self):
+        for _ in range(2):
+            self.client.get(reverse('vendors:vendor_store', args=[self.vendor.slug]),
+                            HTTP_HOST=f'{self.vendor.slug}.lvh.me')
+        self.client.get('/', HTTP_HOST='lvh.me')
+        response, text = self.scrape()
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        store = 'view="vendors:vendor_store",tier="subdomain"'
+        self.assertIn(f'http_requests_total{{{store},status="2xx"}} 2', text)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{store},le="+Inf"}} 2', text)
+        self.assertIn(f'http_request_duration_seconds_count{{{store}}} 2', text)
+        self.assertIn('http_requests_total{view="vendors:home",tier="main",status="2xx"} 1', text)
+        self.assertRegex(text, r'http_request_db_queries_count\{view="vendors:vendor_store"\} 2\n')
+        # Grid and category fragments: missed by the first request, hit by the second
+        self.assertIn('cache_requests_total{cache="catalog_fragment",result="hit"} 2', text)
+        self.assertIn('cache_requests_total{cache="catalog_fragment",result="miss"} 2', text)
+        self.assertIn('cache_requests_total{cache="vendor_host_local",result="hit"}', text)
+        self.assertIn('# TYPE checkouts_total counter', text)
+        # Scrapes aren't recorded
+        self.assertNotIn('(unresolved)', text)
+
+    @override_settings(METRICS=METRICS_ON)
+    def test_endpoint_is_internal_only(self):
+        response, _ = self.scrape(REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 404)
+        with override_settings(METRICS={**METRICS_ON, 'ALLOWED_IPS': ['10.0.0.0/8']}):
+            # A fresh client, so the middleware is built with the new networks
+            response = Client().get('/-/metrics', REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS=METRICS_ON)
+    def test_checkout_outcomes(self):
+        cart = Cart.objects.create(vendor=self.vendor, session_key='s')
+        with self.assertRaises(EmptyCartError):
+            place_order(cart, customer_name='Ada', customer_phone='123')
+        cart.add_product(self.product, 1)
+        place_order(cart, customer_name='Ada', customer_phone='123')
+        text = metrics.exposition()
+        self.assertIn('checkouts_total{outcome="empty_cart"} 1', text)
+        self.assertIn('checkouts_total{outcome="placed"} 1', text)
+
+    def test_worker_processes_are_summed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(METRICS={**METRICS_ON, 'DIR': directory}):
+            # Another worker's samples, as its flusher writes them
+            other = metrics.Store(directory)
+            other.inc(metrics.CHECKOUTS.key({'outcome': 'placed'}), 2)
+            other.observe(metrics.REQUEST_QUERIES.key({'view': 'v'}), 1, len(metrics.QUERY_BUCKETS) + 1, 1)
+            other.flush()
+
+            metrics.CHECKOUTS.inc(outcome='placed')
+            metrics.REQUEST_QUERIES.observe(7, view='v')
+            text = metrics.exposition()
+            self.assertIn('checkouts_total{outcome="placed"} 3', text)
+            self.assertIn('http_request_db_queries_bucket{view="v",le="1"} 1', text)
+            self.assertIn('http_request_db_queries_bucket{view="v",le="10"} 2', text)
+            self.assertIn('http_request_db_queries_sum{view="v"} 8', text)
+
+            # A forked worker starts from zero rather than copying its parent
+            metrics.store().pid = -1
+            self.assertEqual(metrics.store().samples(), ({}, {}))
+            self.assertIn('checkouts_total{outcome="placed"} 3', metrics.exposition())
+
+    @override_settings(METRICS=METRICS_ON, SQL_BUDGET={'ENABLED': True, 'LOG_ALL': False})
+    def test_asgi_chain_stays_async(self):
+        # A sync-only middleware would wrap everything behind it in SyncToAsync
+        budget = inspect.unwrap(ASGIHandler()._middleware_chain)
+        self.assertIsInstance(budget, SQLBudgetMiddleware)
+        metrics_layer = inspect.unwrap(budget.get_response)
+        self.assertIsInstance(metrics_layer, MetricsMiddleware)
+        self.assertTrue(budget.async_mode and metrics_layer.async_mode)
+
+    @override_settings(METRICS=METRICS_ON)
+    async def test_async_requests_are_recorded(self):
+        response = await AsyncClient().get(reverse('cart:cart_count_api', args=[self.vendor.slug]))
+        self.assertEqual(response.status_code, 200)
+        text = await sync_to_async(metrics.exposition)()
+        self.assertIn('http_requests_total{view="cart:cart_count_api",tier="main",status="2xx"} 1', text)
+        self.assertRegex(text, r'http_request_db_queries_sum\{view="cart:cart_count_api"\} [1-9]')
+
+    def test_disabled(self):
+        with override_settings(METRICS={}):
+            with self.assertRaises(MiddlewareNotUsed):
+                MetricsMiddleware(lambda request: HttpResponse())
+            metrics.CHECKOUTS.inc(outcome='placed')
+            self.assertEqual(metrics.store().samples(), ({}, {}))
+
+
+# ----------------------------------------------------------------------
+# Query budgets
+# ----------------------------------------------------------------------
+class VendorQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_home(self):
+        self.assertBudget(4, lambda shop: shop.client.get('/', HTTP_HOST='lvh.me'))
+
+    def test_signup(self):
+        self.assertBudget(0, lambda shop: Client().get(reverse('vendors:vendor_signup')))
+        self.assertBudget(5, lambda shop: Client().post(reverse('vendors:vendor_signup'), {
+            'username': f'new{shop.key}', 'email': 'new@example.com', 'password': 'pw', 'store_name': f'New {shop.key}',
+        }), status=302)
+
+    def test_login_logout(self):
+        self.assertBudget(0, lambda shop: Client().get(reverse('vendors:vendor_login')))
+        self.assertBudget(9, lambda shop: Client().post(reverse('vendors:vendor_login'), {
+            'username': shop.owner.username, 'password': 'pw',
+        }), status=302)
+        self.assertBudget(4, lambda shop: shop.client.post(reverse('vendors:vendor_logout')), status=302)
+
+    def test_dashboard_pages(self):
+        pages = {'vendor_dashboard': 6, 'vendor_products': 8, 'vendor_orders': 5, 'vendor_profile': 3, 'vendor_product_create': 4}
+        for name, queries in pages.items():
+            with self.subTest(name):
+                self.assertBudget(queries, lambda shop: shop.client.get(reverse(f'vendors:{name}')))
+
+    def test_exports(self):
+        for name, queries in {'vendor_product_export': 6, 'vendor_orders_export': 4}.items():
+            with self.subTest(name):
+                self.assertBudget(queries, lambda shop: shop.client.get(reverse(f'vendors:{name}')))
+
+    def test_import(self):
+        def upload(shop):
+            rows = ''.join(f'S{i},Product {i},,12.00,5,{shop.category.name},,false,true\n' for i in range(shop.size))
+            csv = SimpleUploadedFile('p.csv', (','.join(bulk.COLUMNS) + '\n' + rows).encode())
+            return shop.client.post(reverse('vendors:vendor_product_import'), {'file': csv})
+        # bulk_create splits the upsert at the backend's parameter limit:
+        # one INSERT per batch of rows, never one per row
+        per_insert = connection.ops.bulk_batch_size(
+            [field for field in Product._meta.concrete_fields if not field.primary_key], [])
+        self.assertBudget(lambda size: 11 + math.ceil(size / per_insert), upload, status=302)
+
+    def test_product_forms(self):
+        def data(shop):
+            return {'name': 'Changed', 'price': '12.00', 'stock': 3, 'category': shop.category.pk, 'sku': 'NEW'}
+        self.assertBudget(9, lambda shop: shop.client.post(reverse('vendors:vendor_product_create'), data(shop)), status=302)
+        self.assertBudget(5, lambda shop: shop.client.get(reverse('vendors:vendor_product_update', args=[shop.product.pk])))
+        self.assertBudget(11, lambda shop: shop.client.post(
+            reverse('vendors:vendor_product_update', args=[shop.product.pk]), data(shop)), status=302)
+        self.assertBudget(4, lambda shop: shop.client.get(reverse('vendors:vendor_product_delete', args=[shop.product.pk])))
+        self.assertBudget(10, lambda shop: shop.client.post(reverse('vendors:vendor_product_delete', args=[shop.product.pk])), status=302)
+
+    def test_profile_update(self):
+        self.assertBudget(6, lambda shop: shop.client.post(reverse('vendors:vendor_profile'), {
+            'store_name': f'Renamed {shop.key}', 'description': 'New',
+        }), status=302)
+
+    def test_storefront(self):
+        self.assertBudget(5, lambda shop: shop.shopper.get(reverse('vendors:vendor_store', args=[shop.vendor.slug])))
+
+    def test_process_checkout(self):
+        url = lambda shop: reverse('vendors:process_checkout', args=[shop.vendor.slug])
+        self.assertBudget(2, lambda shop: shop.shopper.get(url(shop)), status=302)
+        self.assertBudget(22, lambda shop: shop.shopper.post(url(shop), {
+            'name': 'Ada', 'phone': '08030000000', 'address': 'Lagos',
+        }), status=302)
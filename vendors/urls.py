@@ -14,7 +14,10 @@ urlpatterns = [
     # Vendor dashboard (main domain)
     path('dashboard/', views.vendor_dashboard, name='vendor_dashboard'),
     path('dashboard/products/', views.vendor_products, name='vendor_products'),
+    path('dashboard/products/import/', views.vendor_product_import, name='vendor_product_import'),
+    path('dashboard/products/export/', views.vendor_product_export, name='vendor_product_export'),
     path('dashboard/orders/', views.vendor_orders, name='vendor_orders'),
+    path('dashboard/orders/export/', views.vendor_orders_export, name='vendor_orders_export'),
     path('dashboard/profile/', views.vendor_profile, name='vendor_profile'),
 
     # Subdomain store
@@ -3,6 +3,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 import re
 from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_POST
 import urllib.parse
 
 from django.contrib.auth import authenticate, login, logout
@@ -10,61 +11,73 @@ from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Vendor
-from .forms import ProductForm
+from .pagination import KeysetPaginator
+from .resolver import get_vendor_or_404
+from .forms import OrderFilterForm, ProductForm, ProductUploadForm
+from products import bulk, catalog
+from products.conditional import catalog_condition
 from products.models import Product , Category
+from products.search import search
 from cart.models import Cart, CartItem
+from orders import export as order_export, rollups
 from orders.models import Order
-from django.http import Http404
+from orders.services import EmptyCartError, OutOfStockError, place_order
+from cart.utils import remember_cart
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.core.paginator import Paginator
 from datetime import datetime
-from django.db.models import Q , Sum
+from django.db.models import Count, Q, Sum
 
 
 # MAIN DOMAIN HOME (marketing / vendor signup links)
 def home_view(request):
-    # show list of vendors on the main site
-    vendors = Vendor.objects.all()
+    # show list of vendors on the main site (product counts in the same query)
+    vendors = Vendor.objects.annotate(product_count=Count("products"))
     return render(request, "home.html", {"vendors": vendors})
 
 
-def vendor_store(request, vendor_slug):
-    # Get vendor by slug
-    vendor = get_object_or_404(Vendor, slug=vendor_slug)
+# Query parameters that change the product grid; anything else (utm_*,
+# ajax, ...) must not split the fragment cache.
+GRID_PARAMS = ('q', 'category', 'min_price', 'max_price', 'sort', 'page', 'cursor')
 
-    # === CART COUNT (for navbar) ===
-    cart_count = 0
-    if 'cart_id' in request.session:
-        try:
-            cart = Cart.objects.get(id=request.session['cart_id'])
-            cart_count = cart.items.aggregate(total=Sum('quantity'))['total'] or 0
-        except Cart.DoesNotExist:
-            pass
 
-    # === BASE QUERY: ONLY THIS VENDOR'S PRODUCTS ===
-    products = Product.objects.filter(vendor=vendor)
+def grid_params(query):
+    params = {}
+    for name in GRID_PARAMS:
+        value = query.get(name, '').strip()
+        # an empty ?cursor= still switches to keyset paging
+        if value or (name == 'cursor' and name in query):
+            params[name] = value
+    return params
 
-    # === SEARCH ===
-    q = request.GET.get('q')
+
+def render_product_grid(vendor, params):
+    """The product grid and pagination HTML for one filter/sort/page combination."""
+    # === BASE QUERY: ONLY THIS VENDOR'S ACTIVE PRODUCTS ===
+    products = Product.objects.filter(vendor=vendor, is_active=True)
+
+    # === SEARCH (FTS5, ranked by BM25) ===
+    q = params.get('q')
     if q:
-        products = products.filter(
-            Q(name__icontains=q) | Q(description__icontains=q)
-        )
+        products = search(products, q, vendor_id=vendor.id)
 
     # === CATEGORY FILTER ===
-    category_id = request.GET.get('category')
+    # (covers the whole subtree: a path range on the category index)
+    category_id = params.get('category')
     if category_id:
-        products = products.filter(category_id=category_id)
+        products = products.in_category(category_id)
 
     # === PRICE RANGE ===
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
+    min_price = params.get('min_price')
+    max_price = params.get('max_price')
     if min_price:
         products = products.filter(price__gte=min_price)
     if max_price:
         products = products.filter(price__lte=max_price)
 
     # === SORTING ===
-    sort = request.GET.get('sort', '-created_at')
+    sort = params.get('sort')
     sort_map = {
         'price_asc': 'price',
         'price_desc': '-price',
@@ -73,28 +86,66 @@ def vendor_store(request, vendor_slug):
         'date_asc': 'created_at',
         'date_desc': '-created_at',
     }
-    products = products.order_by(sort_map.get(sort, '-created_at'))
+    ordering = sort_map.get(sort, '-created_at')
+    ranked = bool(q) and not sort
+    # (search_rank ties, e.g. a query without words, fall back to the sort)
+    products = products.order_by('search_rank', ordering) if ranked else products.order_by(ordering)
 
     # === PAGINATION ===
-    paginator = Paginator(products, 12)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    # Infinite scroll passes ?cursor= (empty for the first batch): keyset
+    # pages never COUNT and cost the same at any depth. Search-ranked
+    # results have no stable key, so they stay on the offset paginator.
+    if 'cursor' in params and not ranked:
+        page_obj = KeysetPaginator(products, 12, ordering).get_page(params['cursor'])
+    else:
+        paginator = Paginator(products, 12)
+        page_obj = paginator.get_page(params.get('page'))
+
+    context = {'page_obj': page_obj, 'params': params}
+    return {
+        'grid': render_to_string('vendors/partials/product_grid.html', context),
+        'pagination': render_to_string('vendors/partials/pagination.html', context),
+    }
+
+
+@catalog_condition
+def vendor_store(request, vendor_slug):
+    # Get vendor by slug
+    vendor = get_vendor_or_404(vendor_slug)
+
+    # === PRODUCT GRID (versioned fragment cache, see products/catalog.py) ===
+    # The rendered grid holds nothing per-visitor, so every shopper asking
+    # for the same filters shares one entry until the catalog changes.
+    params = grid_params(request.GET)
+    grid_key = catalog.cache_key('grid', vendor.id, params.items())
+    fragments = catalog.get_cached(grid_key)
+    if fragments is None:
+        fragments = render_product_grid(vendor, params)
+        catalog.set_cached(grid_key, fragments)
+
+    # === AJAX REQUEST (for infinite scroll / filters) ===
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.GET.get('ajax'):
+        return HttpResponse(fragments['grid'])
 
     # === CATEGORIES FOR FILTER ===
-    categories = Category.objects.filter(product__vendor=vendor).distinct()
+    # (IN-subquery instead of a DISTINCT join so it stays on the
+    # product (vendor, category) index)
+    categories_key = catalog.cache_key('categories', vendor.id)
+    categories = catalog.get_cached(categories_key)
+    if categories is None:
+        categories = list(Category.objects.filter(
+            id__in=Product.objects.filter(vendor=vendor, is_active=True).values('category_id')
+        ).with_ancestors().tree())
+        catalog.set_cached(categories_key, categories)
 
     # === CONTEXT ===
     context = {
         'vendor': vendor,
-        'page_obj': page_obj,
+        'catalog': fragments,
         'categories': categories,
-        'cart_count': cart_count,
         'year': 2025,
     }
 
-    # === AJAX REQUEST (for infinite scroll / filters) ===
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.GET.get('ajax'):
-        return render(request, 'vendors/partials/product_grid.html', context)
-
     # === FULL PAGE ===
     return render(request, 'vendors/vendor_store.html', context)
 # -------- vendor auth on MAIN DOMAIN (signup/login/logout) --------
@@ -169,7 +220,11 @@ def vendor_dashboard(request):
         vendor.save()
         messages.success(request, f"Store live: /{slug}/")
 
-    response = render(request, "vendors/dashboard.html", {"vendor": vendor})
+    # Sales widgets read only the daily rollups, never the orders table
+    response = render(request, "vendors/dashboard.html", {
+        "vendor": vendor,
+        "sales": rollups.dashboard_summary(vendor),
+    })
     response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
     response['Pragma'] = 'no-cache'
     response['Expires'] = '0'
@@ -180,8 +235,41 @@ def vendor_orders(request):
     vendor = getattr(request.user, "vendor", None)
     if not vendor:
         raise Http404("Access denied")
-    orders = vendor.orders.all().order_by("-created_at")
-    return render(request, "vendors/vendor_orders.html", {"vendor": vendor, "orders": orders})
+    # Keyset pages on an indexed range per filter; items in one more query
+    # Invalid filters list nothing (with the errors) rather than every order
+    form = OrderFilterForm(request.GET)
+    valid = form.is_valid()
+    orders = vendor.orders.filter_by(**form.filters()) if valid else vendor.orders.none()
+    orders = orders.prefetch_related("items")
+    page_obj = KeysetPaginator(orders, 25, "-created_at").get_page(request.GET.get("cursor"))
+    filters = request.GET.copy()
+    filters.pop("cursor", None)
+    return render(request, "vendors/vendor_orders.html", {
+        "vendor": vendor,
+        "form": form,
+        "page_obj": page_obj,
+        "filters": filters.urlencode(),
+        "first_page": not request.GET.get("cursor"),
+    }, status=200 if valid else 400)
+
+@login_required
+def vendor_orders_export(request):
+    vendor = getattr(request.user, "vendor", None)
+    if not vendor:
+        raise Http404("Access denied")
+    fmt = request.GET.get("format", "csv")
+    if fmt not in order_export.FORMATS:
+        raise Http404("Unknown export format")
+    form = OrderFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponse(form.errors.as_text(), status=400, content_type="text/plain")
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    response = StreamingHttpResponse(
+        order_export.export_orders(vendor, fmt, **form.filters()),
+        content_type=f"{content_type}; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{vendor.slug}-orders.{fmt}"'
+    return response
 
 @login_required
 def vendor_profile(request):
@@ -193,7 +281,7 @@ def vendor_profile(request):
         vendor.description = request.POST.get("description", vendor.description)
         vendor.save()
         messages.success(request, "Profile updated")
-        return redirect("vendor_profile")
+        return redirect("vendors:vendor_profile")
     return render(request, "vendors/vendor_profile.html", {"vendor": vendor})
     
 # ---------- PRODUCT CRUD (using YOUR form) ----------
@@ -201,11 +289,9 @@ def vendor_profile(request):
 def vendor_product_create(request):
     vendor = request.user.vendor
     if request.method == "POST":
-        form = ProductForm(request.POST, request.FILES)
+        form = ProductForm(request.POST, request.FILES, instance=Product(vendor=vendor))
         if form.is_valid():
-            product = form.save(commit=False)
-            product.vendor = vendor
-            product.save()
+            product = form.save()
             messages.success(request, f"'{product.name}' added!")
             return redirect('vendors:vendor_products')
     else:
@@ -246,22 +332,50 @@ def vendor_product_delete(request, pk):
         return redirect('vendors:vendor_products')
     return render(request, 'vendors/product_delete.html', {'product': product})
     
+@login_required
+@require_POST
+def vendor_product_import(request):
+    vendor = request.user.vendor
+    form = ProductUploadForm(request.POST, request.FILES)
+    if not form.is_valid():
+        messages.error(request, "Choose a CSV or JSONL file to import.")
+        return redirect('vendors:vendor_products')
+    upload = form.cleaned_data['file']
+    result = bulk.import_products(vendor, upload.file, bulk.guess_format(upload.name))
+    messages.success(request, f"Import finished: {result}")
+    for line, message in result.errors[:10]:
+        messages.error(request, f"Line {line}: {message}")
+    if result.failed > 10:
+        messages.error(request, f"... and {result.failed - 10} more rows with errors")
+    return redirect('vendors:vendor_products')
+
+
+@login_required
+def vendor_product_export(request):
+    vendor = request.user.vendor
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in bulk.FORMATS:
+        raise Http404("Unknown export format")
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(bulk.export_products(vendor, fmt), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{vendor.slug}-products.{fmt}"'
+    return response
+
+
 @login_required
 def vendor_products(request):
     vendor = request.user.vendor
-    products = vendor.products.all()
+    products = vendor.products.order_by("-created_at", "-pk")
 
     # Search
     q = request.GET.get('q')
     if q:
-        products = products.filter(
-            Q(name__icontains=q) | Q(description__icontains=q)
-        )
+        products = search(products, q, vendor_id=vendor.id).order_by('search_rank', "-created_at", "-pk")
 
     # Category filter
     category_id = request.GET.get('category')
     if category_id:
-        products = products.filter(category_id=category_id)
+        products = products.in_category(category_id)
 
     # Pagination
     paginator = Paginator(products, 12)
@@ -270,14 +384,16 @@ def vendor_products(request):
     return render(request, "vendors/vendor_products.html", {
         "vendor": vendor,
         "products": page_obj,
-        "categories": Category.objects.filter(product__vendor=vendor).distinct(),
+        "categories": Category.objects.filter(id__in=vendor.products.values('category_id')).with_ancestors().tree(),
     })
 def process_checkout(request, vendor_slug):
-    vendor = get_object_or_404(Vendor, slug=vendor_slug)
+    vendor = get_vendor_or_404(vendor_slug)
     if 'cart_id' not in request.session:
         return redirect('cart:view_cart', vendor_slug)
 
-    cart = Cart.objects.get(id=request.session['cart_id'])
+    cart = Cart.objects.filter(id=request.session['cart_id'], vendor=vendor).first()
+    if cart is None:
+        return redirect('cart:view_cart', vendor_slug)
 
     if request.method == "POST":
         name = request.POST['name']
@@ -285,28 +401,29 @@ def process_checkout(request, vendor_slug):
         address = request.POST['address']
         note = request.POST.get('note', '')
 
-      # Create Order
-        order = Order.objects.create(
-          vendor=vendor,
-          customer_name=name,
-          customer_phone=phone,
-          customer_address=address,
-          note=note,
-          total_price=cart.total_price
-      )
-        for item in cart.items.all():
-            OrderItem.objects.create(
-              order=order,
-              product=item.product,
-              quantity=item.quantity,
-              price=item.product.price
-          )
-
-      # WhatsApp Message
+        # Create Order (+ items, + empty the cart) in one transaction
+        try:
+            order, order_items = place_order(
+                cart,
+                customer_name=name,
+                customer_phone=phone,
+                customer_address=address,
+                customer_email=request.POST.get('email'),
+                notes=note,
+            )
+        except EmptyCartError as exc:
+            messages.info(request, str(exc))
+            return redirect('cart:view_cart', vendor_slug)
+        except OutOfStockError as exc:
+            messages.error(request, str(exc))
+            return redirect('cart:view_cart', vendor_slug)
+        remember_cart(request, cart)
+
+        # WhatsApp Message (built from the rows we just wrote, no re-query)
         items = "\n".join([
-          f"• {i.product.name} × {i.quantity} = ₦{i.total_price}"
-          for i in cart.items.all()
-      ])
+            f"• {i.product_name} × {i.quantity} = ₦{i.subtotal()}"
+            for i in order_items
+        ])
         msg = urllib.parse.quote(f"""
 *New Order!*
 
@@ -318,15 +435,13 @@ def process_checkout(request, vendor_slug):
 *Items:*
 {items}
 
-*Total:* ₦{cart.total_price}
+*Total:* ₦{order.total()}
       """.strip())
 
-        wa_url = f"https://wa.me/{vendor.whatsapp}?text={msg}"
+        wa_url = f"https://wa.me/{vendor.whatsapp_number}?text={msg}"
 
-      # Clear cart
-        cart.items.all().delete()
         messages.success(request, "Order sent! Check WhatsApp.")
 
         return redirect(wa_url)
 
-    return redirect('vendors:checkout', vendor_slug)
\ No newline at end of file
+    return redirect('cart:checkout', vendor_slug)
\ No newline at end of file